@@ -3,206 +3,87 @@
 # This is a python example algorithm using REST API for the RIT ALGO2 Case
 import signal
 import requests
-from time import sleep
 
-# this class definition allows us to print error messages and stop the program when needed
-class ApiException(Exception):
-    pass
+from rit.batch import ActionBatch
+from rit.budget import MessageBudget
+from rit.engine import MultiTickerEngine
+from rit.estimator import Estimator
+from rit.flight import FlightRecorder, NullFlightRecorder
+from rit.gateway import OrderGateway
+from rit.ledger import Ledger
+from rit.lifecycle import CLOSING, TRADING, Flattener, Lifecycle
+from rit.metrics import Metrics, MetricsDumper, NullMetrics, instrument_session
+from rit.orders import OrderTracker
+from rit.positions import PositionCache
+from rit.quoting import QuoteParams
+from rit.ratelimit import RateLimiter, throttle_session
+from rit.recorder import Recorder
+from rit.scheduler import TickScheduler
+from rit.snapshot import SnapshotFetcher
+from rit.static import StaticData
+from rit.tas import FillFeed
+from rit.workers import RiskTable, SharedRiskAggregator, Supervisor
 
 # this signal handler allows for a graceful shutdown when CTRL+C is pressed
 def signal_handler(signum, frame):
     global shutdown
     signal.signal(signal.SIGINT, signal.SIG_DFL)
     shutdown = True
+    # in worker mode, stop every quoting process (and do not restart them)
+    if supervisor is not None:
+        supervisor.request_stop()
 
 # set your API key to authenticate to the RIT client
 API_KEY = {'X-API-Key': 'EZ91106P'}
 shutdown = False
-# other settings for market making algo
-SPREAD = 0.02
-BUY_VOLUME = 500
-SELL_VOLUME = 500
-
-# this helper method returns the current 'tick' of the running case
-def get_tick(session):
-    resp = session.get('http://localhost:9999/v1/case')
-    if resp.status_code == 401:
-        raise ApiException('The API key provided in this Python code must match that in the RIT client (please refer to the API hyperlink in the client toolbar and/or the RIT – User Guide – REST API Documentation.pdf)')
-    case = resp.json()
-    return case['tick']
-
-# this helper method returns the last close price for the given security, one tick ago
-def ticker_close(session, ticker):
-    payload = {'ticker': ticker, 'limit': 1}
-    resp = session.get('http://localhost:9999/v1/securities/history', params=payload)
-    if resp.status_code == 401:
-        raise ApiException('The API key provided in this Python code must match that in the RIT client (please refer to the API hyperlink in the client toolbar and/or the RIT – User Guide – REST API Documentation.pdf)')
-    ticker_history = resp.json()
-    if ticker_history:
-        return ticker_history[0]['close']
-    else:
-        raise ApiException('Response error. Unexpected JSON response.')
-
-# this helper method submits a pair of limit orders to buy and sell VOLUME of each security, at the last price +/- SPREAD
-def buy_sell(session, to_buy, to_sell, last):
-    buy_payload = {'ticker': to_buy, 'type': 'LIMIT', 'quantity': BUY_VOLUME, 'action': 'BUY', 'price': last - SPREAD}
-    sell_payload = {'ticker': to_sell, 'type': 'LIMIT', 'quantity': SELL_VOLUME, 'action': 'SELL', 'price': last + SPREAD}
-    session.post('http://localhost:9999/v1/orders', params=buy_payload)
-    session.post('http://localhost:9999/v1/orders', params=sell_payload)
-
-# this helper method gets all the orders of a given type (OPEN/TRANSACTED/CANCELLED)
-def get_orders(session, status):
-    payload = {'status': status}
-    resp = session.get('http://localhost:9999/v1/orders', params=payload)
-    if resp.status_code == 401:
-        raise ApiException('The API key provided in this Python code must match that in the RIT client (please refer to the API hyperlink in the client toolbar and/or the RIT – User Guide – REST API Documentation.pdf)')
-    orders = resp.json()
-    return orders
-
-def get_order_id(order):
-    if not isinstance(order, dict):
-        return None
-    return order.get('order_id') or order.get('id')
-
-def get_top_of_book(session, ticker):
-    # Common RIT endpoint; adjust if your API differs
-    resp = session.get('http://localhost:9999/v1/securities/book', params={'ticker': ticker})
-    if resp.status_code == 401:
-        raise ApiException("Bad API key.")
-    book = resp.json()
-
-    # These key names sometimes differ across setups—adjust if needed
-    bids = book.get('bids', [])
-    asks = book.get('asks', [])
-
-    best_bid = bids[0]['price'] if bids else None
-    best_ask = asks[0]['price'] if asks else None
-    bid_size = bids[0].get('quantity', 0) if bids else 0
-    ask_size = asks[0].get('quantity', 0) if asks else 0
-    return best_bid, best_ask, bid_size, ask_size
-
-def select_ticker_to_trade(session, tickers, min_spread):
-    best = None
-    for ticker in tickers:
-        best_bid, best_ask, bid_size, ask_size = get_top_of_book(session, ticker)
-        if best_bid is None or best_ask is None or best_ask <= best_bid:
-            continue
-        spread = best_ask - best_bid
-        if spread < min_spread:
-            continue
-        if (best is None) or (spread > best['spread']):
-            best = {
-                'ticker': ticker,
-                'best_bid': best_bid,
-                'best_ask': best_ask,
-                'bid_size': bid_size,
-                'ask_size': ask_size,
-                'spread': spread,
-            }
-    return best
-
-def get_position(session, ticker):
-    # This endpoint/key may differ in your RIT client; adjust if needed.
-    # Some versions: GET /v1/securities?ticker=ALGO returns a list of securities with 'position'.
-    resp = session.get('http://localhost:9999/v1/securities', params={'ticker': ticker})
-    if resp.status_code == 401:
-        raise ApiException("Bad API key.")
-    data = resp.json()
-
-    # Often it's a list with one dict
-    if isinstance(data, list) and len(data) > 0:
-        return data[0].get('position', 0)
-    # Sometimes it's a dict
-    if isinstance(data, dict):
-        return data.get('position', 0)
-
-    return 0
-
-def get_all_positions(session):
-    resp = session.get('http://localhost:9999/v1/securities')
-    if resp.status_code == 401:
-        raise ApiException("Bad API key.")
-    data = resp.json()
-    positions = {}
-    if isinstance(data, list):
-        for item in data:
-            ticker = item.get('ticker')
-            if ticker is not None:
-                positions[ticker] = item.get('position', 0)
-    return positions
-
-def cancel_order(session, order_id):
-    # Some RIT APIs cancel by POST /v1/orders/cancel or DELETE /v1/orders/{id}
-    # Adjust to match your client. This is a common pattern:
-    session.post('http://localhost:9999/v1/commands/cancel', params={'id': order_id})
-
-def place_limit(session, ticker, side, qty, price):
-    payload = {'ticker': ticker, 'type': 'LIMIT', 'quantity': qty, 'action': side, 'price': price}
-    resp = session.post('http://localhost:9999/v1/orders', params=payload)
-    if resp.status_code == 401:
-        raise ApiException("Bad API key.")
-    data = resp.json()
-    if isinstance(data, dict):
-        return data.get('order_id') or data.get('id')
-    return None
-
-def compute_trade_volumes(
-    market_spread,
-    edge,
-    liquidity,
-    pos,
-    max_long,
-    max_short,
-    base_volume,
-    min_volume,
-    max_volume,
-    liquidity_target,
-):
-    # Scale size up with edge and headroom; tilt to reduce inventory risk.
-    if market_spread <= 0:
-        return min_volume, min_volume
-
-    edge_ratio = min(1.0, max(0.0, edge / market_spread))
-    edge_scale = 0.7 + 0.3 * edge_ratio
-    liq_ratio = min(2.0, max(0.0, liquidity / float(liquidity_target))) if liquidity_target > 0 else 1.0
-    liq_scale = 0.7 + 0.3 * liq_ratio
-
-    long_headroom = max(0.0, max_long - pos)
-    short_headroom = max(0.0, max_short + pos)
-    long_scale = min(1.0, long_headroom / float(max_long)) if max_long > 0 else 0.0
-    short_scale = min(1.0, short_headroom / float(max_short)) if max_short > 0 else 0.0
-
-    base = base_volume * edge_scale * liq_scale
-    buy_base = base * (0.5 + 0.5 * long_scale)
-    sell_base = base * (0.5 + 0.5 * short_scale)
-
-    if pos > 0 and max_long > 0:
-        tilt = min(1.0, pos / float(max_long))
-        buy_base *= max(0.2, 1.0 - tilt)
-        sell_base *= 1.0 + 0.3 * tilt
-    elif pos < 0 and max_short > 0:
-        tilt = min(1.0, (-pos) / float(max_short))
-        sell_base *= max(0.2, 1.0 - tilt)
-        buy_base *= 1.0 + 0.3 * tilt
-
-    buy_qty = max(min_volume, min(max_volume, int(buy_base)))
-    sell_qty = max(min_volume, min(max_volume, int(sell_base)))
-    return buy_qty, sell_qty
+supervisor = None
 
 def main():
-    global shutdown
+    global supervisor
 
     TICKERS = ['ALGO']
+    # None: quote every ticker in this process. A list of ticker groups (e.g.
+    # [['CRZY'], ['TAME']]) starts one quoting process per group, sharing the
+    # gross/net limits through a shared-memory risk table.
+    WORKER_GROUPS = None
+
+    if not WORKER_GROUPS:
+        trade(TICKERS)
+        return
+
+    all_tickers = [t for group in WORKER_GROUPS for t in group]
+    table = RiskTable.create(all_tickers)
+    supervisor = Supervisor(trade_worker, WORKER_GROUPS, args=(table.name, all_tickers))
+    try:
+        supervisor.run()
+    finally:
+        table.close()
+        table.unlink()
+
+# body of one quoting process in WORKER_GROUPS mode
+def trade_worker(tickers, stop_event, table_name, all_tickers):
+    table = RiskTable.attach(table_name, all_tickers)
+    try:
+        trade(tickers, table, stop_event)
+    finally:
+        table.close()
+
+# the quoting loop for TICKERS; risk_table/stop_event are set in a worker process
+def trade(TICKERS, risk_table=None, stop_event=None):
+    global shutdown
 
     # --- New risk/quote knobs ---
     MAX_LONG_EXPOSURE = 7500   # hard long inventory limit
     MAX_SHORT_EXPOSURE = 7500  # hard short inventory limit
-    MAX_GROSS_POS = 25000      # sum of absolute positions across tickers
-    MAX_NET_POS = 25000        # signed net position across tickers
+    MAX_GROSS_POS = 25000      # sum of absolute positions across tickers (the case limit replaces it)
+    MAX_NET_POS = 25000        # signed net position across tickers (the case limit replaces it)
     MAX_SINGLE_LONG = 12500    # per-ticker long cap
     MAX_SINGLE_SHORT = 12500   # per-ticker short cap
     BASE_EDGE = 0.01          # your minimum edge per side (like half-spread)
     REQUOTE_TOL = 0.01        # only replace if we're off by >= this much
+    QUOTE_SIZE_TOL = 0.2      # keep a resting quote whose size is within 20% of the target
+    MESSAGES_PER_TICK = 6     # cancels+orders per ticker per tick; None sends every update
+    MESSAGES_PER_TICK_TOTAL = None  # the same across all tickers (None: no overall cap)
     MIN_MARKET_SPREAD = 0.035 # don’t quote if market spread too tiny (edge gone)
     BUY_PREMIUM = 0.002       # small premium to improve buy execution
     SELL_DISCOUNT = 0.002     # small discount to improve sell execution
@@ -212,188 +93,226 @@ def main():
     MIN_TRADE_VOLUME = 2000
     MAX_TRADE_VOLUME = 6000
     LIQUIDITY_TARGET = 3000
-    SLEEP_SEC = 0.25
-    order_ticks = {}
-
-    with requests.Session() as s:
+    VOL_EDGE_K = 1.0          # edge is at least this many per-tick volatilities
+    HISTORY_TICKS = 300       # price history read once per period to seed volatility/drift
+    BOOK_DEPTH = 5            # book entries read per side; sizing uses depth-weighted liquidity
+    SLEEP_SEC = 0.25          # longest wait between polls while the book is moving
+    RECORD_PATH = None        # e.g. 'session.rec' to capture every snapshot for rit.replay
+    METRICS_PATH = None       # e.g. 'metrics.prom' to dump latency/phase metrics every few seconds
+    FLIGHT_PATH = None        # e.g. 'flight.ring': last loops in binary, decode with python -m rit.flight
+    LEDGER_PATH = None        # e.g. 'ledger.json' (or .csv for the fills) written at session end
+    MARKOUT_TICKS = 5         # adverse selection is measured this many ticks after each fill
+    RATE_LIMIT = None         # requests/second; None learns the limit from the first 429
+    POSITION_REFRESH_LOOPS = 20  # full securities read at most this many loops apart
+    ORDER_RECONCILE_LOOPS = 4    # full open-orders read at most this many loops apart
+    OPEN_TICK = 5             # no quoting in the first ticks of a period, while the book forms
+    CLOSE_TICKS = 5           # the last ticks of each period flatten the position instead
+    MAX_HEATS = None          # stop after this many heats; None waits for the next one
+    params = QuoteParams(
+        max_long_exposure=MAX_LONG_EXPOSURE,
+        max_short_exposure=MAX_SHORT_EXPOSURE,
+        max_gross_pos=MAX_GROSS_POS,
+        max_net_pos=MAX_NET_POS,
+        max_single_long=MAX_SINGLE_LONG,
+        max_single_short=MAX_SINGLE_SHORT,
+        base_edge=BASE_EDGE,
+        requote_tol=REQUOTE_TOL,
+        min_market_spread=MIN_MARKET_SPREAD,
+        buy_premium=BUY_PREMIUM,
+        sell_discount=SELL_DISCOUNT,
+        price_cushion=PRICE_CUSHION,
+        order_ttl_ticks=ORDER_TTL_TICKS,
+        base_volume=BASE_VOLUME,
+        min_trade_volume=MIN_TRADE_VOLUME,
+        max_trade_volume=MAX_TRADE_VOLUME,
+        liquidity_target=LIQUIDITY_TARGET,
+        vol_edge_k=VOL_EDGE_K,
+    )
+    # positions come from one bulk securities read, then track our own fills
+    positions = PositionCache(refresh_every=POSITION_REFRESH_LOOPS)
+    # our open orders (and their TTL clocks) are tracked locally
+    # (a worker only tracks orders on its own tickers)
+    tracker = OrderTracker(reconcile_every=ORDER_RECONCILE_LOOPS,
+                           tickers=TICKERS if risk_table is not None else None)
+    # sleeps what is left of SLEEP_SEC and wakes just after each tick boundary
+    scheduler = TickScheduler(poll_interval=SLEEP_SEC)
+    # fills (with size and price) come off the time-and-sales tape each loop;
+    # our orders are only re-read when a print may have been ours
+    fills = FillFeed(TICKERS)
+    # P&L, average cost, edge and markouts per ticker, from those fills and
+    # the books we read anyway; ledger.pnl(ticker) etc. can be used below
+    ledger = Ledger(TICKERS, adverse_ticks=MARKOUT_TICKS)
+    fills.subscribe(ledger.on_fill)
+
+    if risk_table is not None:
+        # one recording/metrics file per worker
+        suffix = '.' + '-'.join(TICKERS)
+        RECORD_PATH = RECORD_PATH and RECORD_PATH + suffix
+        METRICS_PATH = METRICS_PATH and METRICS_PATH + suffix
+        LEDGER_PATH = LEDGER_PATH and LEDGER_PATH + suffix
+        FLIGHT_PATH = FLIGHT_PATH and FLIGHT_PATH + suffix
+    recorder = Recorder(RECORD_PATH) if RECORD_PATH else None
+    # per-endpoint latency, loop phases and status codes; NullMetrics when off
+    metrics = Metrics() if METRICS_PATH else NullMetrics()
+    dumper = MetricsDumper(metrics, METRICS_PATH) if METRICS_PATH else None
+    # book, position, quote, actions and latencies of every loop, per ticker
+    flight = FlightRecorder(FLIGHT_PATH) if FLIGHT_PATH else NullFlightRecorder()
+
+    # caps order messages per tick: REQUOTE_TOL and ORDER_TTL_TICKS widen on a
+    # busy ticker, and the least valuable updates wait for the next tick
+    budget = None
+    if MESSAGES_PER_TICK:
+        budget = MessageBudget(MESSAGES_PER_TICK, MESSAGES_PER_TICK_TOTAL)
+
+    # waits for the case to run, follows its periods and heats
+    lifecycle = Lifecycle(open_tick=OPEN_TICK, close_ticks=CLOSE_TICKS, max_heats=MAX_HEATS)
+
+    def stopping():
+        return shutdown or (stop_event is not None and stop_event.is_set())
+
+    def order_rejected(request, message):
+        # the order never rested: requote it on the next pass
+        metrics.count('orders_rejected_total', ticker=request.ticker)
+        scheduler.force()
+
+    with requests.Session() as s, SnapshotFetcher(s, TICKERS, positions, tracker, recorder,
+                                                    book_depth=BOOK_DEPTH,
+                                                    fill_feed=fills) as fetcher, \
+            OrderGateway(s, tracker, on_reject=order_rejected) as gateway:
         s.headers.update(API_KEY)
-
-        tick = get_tick(s)
-
-        while (not shutdown) and (tick > 5) and (tick < 295):
-            # 1) Decide which ticker to trade (no cycling)
-            choice = select_ticker_to_trade(s, TICKERS, MIN_MARKET_SPREAD)
-            if choice is None:
-                sleep(SLEEP_SEC)
-                tick = get_tick(s)
-                continue
-
-            TICKER = choice['ticker']
-            best_bid = choice['best_bid']
-            best_ask = choice['best_ask']
-            bid_size = choice['bid_size']
-            ask_size = choice['ask_size']
-            market_spread = choice['spread']
-            mid = (best_bid + best_ask) / 2.0
-
-            # Optional: if the market spread is too tight, no room to make edge
-            if market_spread < MIN_MARKET_SPREAD:
-                sleep(SLEEP_SEC)
-                tick = get_tick(s)
-                continue
-
-            # 2) Risk state
-            pos = get_position(s, TICKER)
-            positions = get_all_positions(s)
-            gross_pos = sum(abs(p) for p in positions.values())
-            net_pos = sum(positions.values())
-
-            # If too long/short, stop quoting the side that increases risk
-            allow_buy = (
-                pos < MAX_LONG_EXPOSURE
-                and pos < MAX_SINGLE_LONG
-                and gross_pos < MAX_GROSS_POS
-                and net_pos < MAX_NET_POS
-            )
-            allow_sell = (
-                pos > -MAX_SHORT_EXPOSURE
-                and pos > -MAX_SINGLE_SHORT
-                and gross_pos < MAX_GROSS_POS
-                and net_pos > -MAX_NET_POS
-            )
-
-            # 3) Compute dynamic quotes (simple version)
-            # Edge: at least BASE_EDGE, but also respect a fraction of the market spread
-            edge = max(BASE_EDGE, 0.25 * market_spread)
-
-            # Inventory skew: push quotes to reduce inventory
-            # If long (+pos): push both quotes DOWN to encourage selling / discourage buying
-            # If short (-pos): push both quotes UP to encourage buying / discourage selling
-            k = 0.00001  # tune this (bigger = more aggressive inventory control)
-            skew = k * pos
-
-            desired_bid = (mid - edge) - skew
-            desired_ask = (mid + edge) - skew
-            quote_bid = min(desired_bid + BUY_PREMIUM, best_ask - PRICE_CUSHION)
-            quote_ask = max(desired_ask - SELL_DISCOUNT, best_bid + PRICE_CUSHION)
-
-            if quote_bid >= quote_ask:
-                sleep(SLEEP_SEC)
-                tick = get_tick(s)
-                continue
-
-            top_liquidity = min(bid_size, ask_size)
-            buy_qty, sell_qty = compute_trade_volumes(
-                market_spread,
-                edge,
-                top_liquidity,
-                pos,
-                MAX_LONG_EXPOSURE,
-                MAX_SHORT_EXPOSURE,
-                BASE_VOLUME,
-                MIN_TRADE_VOLUME,
-                MAX_TRADE_VOLUME,
-                LIQUIDITY_TARGET,
-            )
-            if (gross_pos + buy_qty) > MAX_GROSS_POS or (net_pos + buy_qty) > MAX_NET_POS:
-                allow_buy = False
-            if (gross_pos + sell_qty) > MAX_GROSS_POS or (net_pos - sell_qty) < -MAX_NET_POS:
-                allow_sell = False
-
-            # 4) Read your open orders and identify current bid/ask
-            open_orders = get_orders(s, 'OPEN')
-            open_order_ids = {get_order_id(o) for o in open_orders if get_order_id(o) is not None}
-            for oid in list(order_ticks):
-                if oid not in open_order_ids:
-                    order_ticks.pop(oid, None)
-
-            my_bid = None
-            my_ask = None
-            for o in open_orders:
-                order_id = get_order_id(o)
-                if order_id is None:
+        instrument_session(s, metrics)
+        # 429s are retried after Retry-After; orders and cancels go ahead of reads
+        limiter = RateLimiter(RATE_LIMIT, metrics=metrics if metrics.enabled else None)
+        throttle_session(s, limiter)
+
+        def settle():
+            # fold in what the gateway sent (placed orders move from their
+            # client ids to server ids) before the next read, once nothing is
+            # in flight, so that an order we cancelled is never taken for a
+            # fill and one that filled is never booked twice
+            report = gateway.collect(wait=True)
+            cancelled = tracker.apply_batch(report, tick)
+            # a cancelled order may have partly filled first; the fill feed
+            # settles those with its next order read
+            fills.cancelled(cancelled)
+            flight.sent(report, cancelled, gateway.latency)
+            if not report.ok:
+                scheduler.force()
+            # only confirmed cancels: an order whose cancel failed most likely
+            # filled, and its disappearance must be booked as a fill
+            for order_id in report.cancelled:
+                positions.forget(order_id)
+            for placed in report.placed:
+                positions.placed(placed.order_id, placed.ticker, placed.side, placed.quantity)
+
+        # started before the case runs, between periods and between heats:
+        # poll the case (backing off while it is stopped) until it can be quoted
+        case = lifecycle.wait_for_open(s, stopping)
+        while case is not None:
+            if lifecycle.rolled_over():
+                # a new period or heat: limits, tick sizes, fees and max trade
+                # sizes are read once for it; the case's gross/net limits replace
+                # MAX_GROSS_POS/MAX_NET_POS and the caps under them
+                static = StaticData.load(s)
+                case_params = static.apply(params)
+                # volatility, drift and fair value per ticker: seeded from one
+                # history read per ticker, then kept up from every book read
+                estimator = Estimator(TICKERS)
+                estimator.load(s, HISTORY_TICKS, fetcher.executor)
+                # quotes all TICKERS at once under the shared gross/net limits, on
+                # the tick grid and under the max trade size
+                risk = None
+                if risk_table is not None:
+                    risk = SharedRiskAggregator(risk_table, TICKERS, positions,
+                                                case_params.max_gross_pos, case_params.max_net_pos)
+                engine = MultiTickerEngine(case_params, TICKERS, positions, tracker, risk,
+                                           size_tol=QUOTE_SIZE_TOL, depth_levels=BOOK_DEPTH,
+                                           static=static, budget=budget, estimator=estimator,
+                                           metrics=metrics if metrics.enabled else None)
+                # the orders, positions and tape from before no longer hold
+                positions.invalidate()
+                tracker.mark_inconsistent()
+                fills.reset()
+
+            # books, positions, open orders and tick are read concurrently each loop
+            snapshot = fetcher.fetch()
+            tick = scheduler.observe(snapshot.tick, snapshot.started_at)
+            while not stopping() and lifecycle.phase(snapshot.case) == TRADING:
+                metrics.begin_loop()
+                metrics.observe_phase('fetch', snapshot.elapsed)
+                ledger.mark(tick, snapshot.tops)
+                estimator.update(tick, snapshot.tops)
+                flight.begin(snapshot, positions)
+
+                # 0) Only re-run the quoting logic when the tick, the book or our
+                # orders/positions changed since the last pass
+                order_state = tuple((o.order_id, o.filled) for o in tracker.open_orders())
+                changed = scheduler.changed(tick, snapshot.tops, order_state, tuple(positions.positions.items()))
+                metrics.lap('select')
+                if not changed:
+                    scheduler.wait()
+                    metrics.lap('wait')
+                    settle()
+                    metrics.lap('settle')
+                    snapshot = fetcher.fetch()
+                    tick = scheduler.observe(snapshot.tick, snapshot.started_at)
                     continue
-                if o.get('ticker') != TICKER:
-                    cancel_order(s, order_id)
-                    order_ticks.pop(order_id, None)
-                    continue
-                if order_id not in order_ticks:
-                    order_ticks[order_id] = tick
-                if (tick - order_ticks[order_id]) >= ORDER_TTL_TICKS:
-                    cancel_order(s, order_id)
-                    order_ticks.pop(order_id, None)
-                    continue
-                if o.get('action') == 'BUY':
-                    # if multiple, keep the best-priced one and cancel others later
-                    if (my_bid is None) or (o.get('price', -1e9) > my_bid.get('price', -1e9)):
-                        my_bid = o
-                elif o.get('action') == 'SELL':
-                    if (my_ask is None) or (o.get('price', 1e9) < my_ask.get('price', 1e9)):
-                        my_ask = o
 
-            # 5) Clean up extra orders (keep at most one BUY and one SELL)
-            # Cancel any "extra" ALGO orders that are not the chosen my_bid/my_ask
-            for o in open_orders:
-                if o.get('ticker') != TICKER:
-                    continue
-                order_id = get_order_id(o)
-                if order_id is None:
+                # 1-6) Quote every ticker whose spread is wide enough: each keeps its
+                # own bid/ask and TTL state, off-list and expired orders are
+                # cancelled, and only the difference between the quote and our
+                # resting orders is sent (risk-reducing actions first). Gross/net
+                # limits are checked across tickers, counting our working orders.
+                # The engine times its risk, quote and reconcile phases.
+                batch = ActionBatch()
+                quotes = engine.step(snapshot, tick, batch)
+                flight.decided(quotes)
+                if not quotes and not batch:
+                    scheduler.wait()
+                    metrics.lap('wait')
+                    settle()
+                    metrics.lap('settle')
+                    snapshot = fetcher.fetch()
+                    tick = scheduler.observe(snapshot.tick, snapshot.started_at)
                     continue
-                if my_bid and o.get('action') == 'BUY' and order_id != get_order_id(my_bid):
-                    cancel_order(s, order_id)
-                    order_ticks.pop(order_id, None)
-                if my_ask and o.get('action') == 'SELL' and order_id != get_order_id(my_ask):
-                    cancel_order(s, order_id)
-                    order_ticks.pop(order_id, None)
-
-            # 6) Requote logic: only replace if price is stale by REQUOTE_TOL
-            # BUY side
-            if allow_buy:
-                if my_bid is None:
-                    order_id = place_limit(s, TICKER, 'BUY', buy_qty, quote_bid)
-                    if order_id is not None:
-                        order_ticks[order_id] = tick
-                else:
-                    if abs(my_bid.get('price', 0) - quote_bid) >= REQUOTE_TOL:
-                        bid_id = get_order_id(my_bid)
-                        if bid_id is not None:
-                            cancel_order(s, bid_id)
-                            order_ticks.pop(bid_id, None)
-                        order_id = place_limit(s, TICKER, 'BUY', buy_qty, quote_bid)
-                        if order_id is not None:
-                            order_ticks[order_id] = tick
-            else:
-                # If buying not allowed, cancel existing buy
-                if my_bid is not None:
-                    bid_id = get_order_id(my_bid)
-                    if bid_id is not None:
-                        cancel_order(s, bid_id)
-                        order_ticks.pop(bid_id, None)
-
-            # SELL side
-            if allow_sell:
-                if my_ask is None:
-                    order_id = place_limit(s, TICKER, 'SELL', sell_qty, quote_ask)
-                    if order_id is not None:
-                        order_ticks[order_id] = tick
-                else:
-                    if abs(my_ask.get('price', 0) - quote_ask) >= REQUOTE_TOL:
-                        ask_id = get_order_id(my_ask)
-                        if ask_id is not None:
-                            cancel_order(s, ask_id)
-                            order_ticks.pop(ask_id, None)
-                        order_id = place_limit(s, TICKER, 'SELL', sell_qty, quote_ask)
-                        if order_id is not None:
-                            order_ticks[order_id] = tick
-            else:
-                if my_ask is not None:
-                    ask_id = get_order_id(my_ask)
-                    if ask_id is not None:
-                        cancel_order(s, ask_id)
-                        order_ticks.pop(ask_id, None)
 
-            sleep(SLEEP_SEC)
-            tick = get_tick(s)
+                # 7) Send the whole batch without waiting: cancels and both sides of
+                # every quote go out together while we wait for the next tick
+                gateway.send(batch, tick)
+                metrics.lap('requote')
+
+                scheduler.wait()
+                metrics.lap('wait')
+                settle()
+                metrics.lap('settle')
+                snapshot = fetcher.fetch()
+                tick = scheduler.observe(snapshot.tick, snapshot.started_at)
+
+            if stopping():
+                break
+            settle()
+            if lifecycle.phase(snapshot.case) == CLOSING:
+                # the last ticks of the period: cancel everything in one request
+                # and work the inventory out across tickers by the last tick
+                # but one. The cancelled orders may have partly filled first.
+                fills.cancelled(tracker.open_orders())
+                flattener = Flattener(s, TICKERS, fetcher.executor, static,
+                                      cancel_all=risk_table is None, wait=scheduler.wait)
+                flattener.run(snapshot.case.ticks_per_period - 1, stopping)
+                lifecycle.flattened(snapshot.case)
+                # one more read books the flatten's fills and reloads positions
+                positions.invalidate()
+                tracker.mark_inconsistent()
+                snapshot = fetcher.fetch()
+                ledger.mark(snapshot.tick, snapshot.tops)
+            case = lifecycle.wait_for_open(s, stopping)
+
+    if dumper is not None:
+        dumper.close()
+    flight.close()
+    if LEDGER_PATH:
+        ledger.write(LEDGER_PATH)
+    print(ledger)
 
 # this calls the main() method when you type 'python algo2.py' into the command prompt
 if __name__ == '__main__':
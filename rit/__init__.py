@@ -0,0 +1,5 @@
+"""Shared helpers for the RIT ALGO2 market-making scripts.
+
+The scripts in the repository root import from this package directly, so run
+them from the repository directory (``python "TEST CODE ALGO2.py"``).
+"""
@@ -0,0 +1,37 @@
+# shared REST plumbing for the RIT client used by the ALGO2 scripts
+import os
+
+from requests.adapters import HTTPAdapter
+
+# RIT_API_URL points the shared helpers somewhere else, e.g. a stand-in on another port
+API_URL = os.environ.get('RIT_API_URL', 'http://localhost:9999/v1')
+
+BAD_KEY_MESSAGE = (
+    'The API key provided in this Python code must match that in the RIT client '
+    '(please refer to the API hyperlink in the client toolbar and/or the '
+    'RIT – User Guide – REST API Documentation.pdf)'
+)
+
+
+# this class definition allows us to print error messages and stop the program when needed
+class ApiException(Exception):
+    pass
+
+
+def check_auth(resp):
+    """Raise ApiException when the RIT client rejected our API key."""
+    if resp.status_code == 401:
+        raise ApiException(BAD_KEY_MESSAGE)
+    return resp
+
+
+def mount_pool(session, pool_size):
+    """Give the session enough pooled connections for pool_size concurrent calls.
+
+    requests keeps 10 connections per host by default; anything above that is
+    opened and thrown away again, which costs a TCP handshake per request.
+    """
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(10, pool_size))
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
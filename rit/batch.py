@@ -0,0 +1,108 @@
+# per-iteration action batcher for cancels and new limit orders
+#
+# The quoting loop decides its cancels in several places (off-ticker orders,
+# TTL expiry, duplicates, requotes) and its new orders in the requote step.
+# Sending each one as it is decided costs a blocking round trip per action.
+# ActionBatch collects them instead, drops duplicates, and flush() sends all
+# cancels as one bulk cancel where the client supports it (concurrently
+# otherwise) and then fires the new orders concurrently.
+from rit.cancel import default_router
+
+
+class PlaceRequest(object):
+    __slots__ = ('ticker', 'side', 'quantity', 'price', 'order_id', 'part', 'client_id')
+
+    def __init__(self, ticker, side, quantity, price, part=0):
+        self.ticker = ticker
+        self.side = side
+        self.quantity = quantity
+        self.price = price
+        self.order_id = None
+        self.part = part  # index within an order split under the max trade size
+        self.client_id = None  # provisional id while rit.gateway has it in flight
+
+    def key(self):
+        return (self.ticker, self.side, self.quantity, round(self.price, 6), self.part)
+
+    def __repr__(self):
+        return 'PlaceRequest({} {} {} @ {}, order_id={})'.format(
+            self.side, self.quantity, self.ticker, self.price, self.order_id)
+
+
+class BatchReport(object):
+    """What one flush() did: requested vs. confirmed cancels and placements."""
+
+    __slots__ = ('requested_cancels', 'cancelled', 'placed', 'failed_places')
+
+    def __init__(self, requested_cancels, cancelled, placed, failed_places):
+        self.requested_cancels = requested_cancels
+        self.cancelled = cancelled
+        self.placed = placed
+        self.failed_places = failed_places
+
+    @property
+    def failed_cancels(self):
+        done = set(self.cancelled)
+        return [i for i in self.requested_cancels if i not in done]
+
+    @property
+    def ok(self):
+        return not self.failed_places and not self.failed_cancels
+
+    def __repr__(self):
+        return 'BatchReport(cancelled={}/{}, placed={}/{})'.format(
+            len(self.cancelled), len(self.requested_cancels),
+            len(self.placed), len(self.placed) + len(self.failed_places))
+
+
+class ActionBatch(object):
+    """Cancels and placements decided in one iteration, sent together by flush().
+
+    Cancels are deduplicated by order id, placements by (ticker, side, qty,
+    price). Cancels go out before placements so a requote never has both the
+    old and the new order resting at once for longer than one round trip.
+    """
+
+    def __init__(self, router=None):
+        self.router = router if router is not None else default_router
+        self.cancels = {}
+        self.places = {}
+
+    def cancel(self, order_id):
+        if order_id is not None:
+            self.cancels[order_id] = True
+
+    def place(self, ticker, side, quantity, price, part=0):
+        request = PlaceRequest(ticker, side, quantity, price, part)
+        return self.places.setdefault(request.key(), request)
+
+    def __len__(self):
+        return len(self.cancels) + len(self.places)
+
+    def flush(self, session, place, executor=None):
+        """Send everything collected so far and return a BatchReport.
+
+        place(session, ticker, side, qty, price) submits one limit order and
+        returns its order id (or None). With an executor the cancels (when no
+        bulk form exists) and the placements run concurrently.
+        """
+        requested = list(self.cancels)
+        cancelled = self.router.cancel_many(session, requested, executor) if requested else []
+
+        pending = list(self.places.values())
+
+        def send(request):
+            request.order_id = place(session, request.ticker, request.side,
+                                     request.quantity, request.price)
+            return request
+
+        if executor is not None and len(pending) > 1:
+            done = list(executor.map(send, pending))
+        else:
+            done = [send(r) for r in pending]
+        placed = [r for r in done if r.order_id is not None]
+        failed = [r for r in done if r.order_id is None]
+
+        self.cancels = {}
+        self.places = {}
+        return BatchReport(requested, cancelled, placed, failed)
@@ -0,0 +1,356 @@
+# CPU benchmark of the decision kernels, with regression thresholds
+#
+#   python -m rit.bench
+#   python -m rit.bench --recording session.rec --save bench.json
+#   python -m rit.bench --baseline bench.json --tolerance 0.2
+#
+# rit.loadtest measures the loop against the network; this measures what
+# is left once the reads are in: the CPU cost of deciding. Two kernels, each
+# on generated books and (with --recording) on a rit.recorder recording:
+#
+#   decide   rit.kernel.decide(), the single-book decision of New, TEST CODE
+#            ALGO2.py and cancel-test
+#   engine   MultiTickerEngine.step() plus Estimator.update(), the COMP
+#            script's decision, with depth books and a message budget
+#
+# Orders decided are taken as resting (placed, cancelled) before the next
+# snapshot, so every decision runs against a realistic set of our orders.
+# Positions come with the snapshots. For each case it reports:
+#
+#   rate     decisions per second (best of --repeat runs)
+#   us       microseconds per decision at that rate
+#   peak     bytes allocated at the high-water mark of one decision
+#            (tracemalloc, averaged)
+#   kept     memory blocks still allocated per decision after a run, which
+#            stays near zero unless something grows without bound
+#
+# Only the engine cases are gated, since the engine is what the COMP script
+# trades with; decide is reported for the legacy scripts but never fails the
+# run. An engine case fails when its rate drops under FLOORS, peak or kept
+# go over CEILINGS, or, with --baseline (a file written by --save), its rate
+# drops more than --tolerance below the baseline's or peak grows more than
+# that above it. The exit status is 1 when any gated case fails, so the
+# benchmark can gate a change before competition day.
+import argparse
+import gc
+import json
+import random
+import sys
+import time
+import tracemalloc
+
+from rit.batch import ActionBatch
+from rit.book import DEFAULT_LEVELS
+from rit.budget import MessageBudget
+from rit.engine import MultiTickerEngine
+from rit.estimator import Estimator
+from rit.kernel import decide
+from rit.orders import OrderTracker
+from rit.positions import PositionCache
+from rit.quoting import QuoteParams
+from rit.records import decode_book
+from rit.replay import load
+from rit.snapshot import MarketSnapshot, top_of_book
+
+# kernels whose cases can fail the run: the COMP script's decision
+GATED = ('engine',)
+# minimum decisions per second, generous enough for a slow laptop
+FLOORS = {
+    'engine': 1000,
+}
+# most bytes at peak / blocks kept per decision
+CEILINGS = {
+    'peak': 64 * 1024,
+    'kept': 1.0,
+}
+
+
+class SimQuote(object):
+    """An order decide() placed, resting until it decides otherwise."""
+
+    __slots__ = ('order_id', 'ticker', 'side', 'price', 'quantity', 'tick')
+
+    def __init__(self, order_id, ticker, side, price, quantity, tick):
+        self.order_id = order_id
+        self.ticker = ticker
+        self.side = side
+        self.price = price
+        self.quantity = quantity
+        self.tick = tick
+
+
+class BenchSnapshot(object):
+    """One snapshot in both forms: raw JSON books (decide) and records (engine)."""
+
+    __slots__ = ('tick', 'raw', 'tops', 'market', 'positions')
+
+    def __init__(self, tick, raw, positions):
+        self.tick = tick
+        self.raw = raw
+        self.tops = {t: top_of_book(b) for t, b in raw.items()}
+        books = {t: decode_book(t, b) for t, b in raw.items()}
+        self.market = MarketSnapshot(tick, None, books, None, None, None, 0.0, 0.0)
+        self.positions = positions
+
+
+def synthetic(tickers=4, ticks=300, polls_per_tick=4, levels=DEFAULT_LEVELS, seed=1):
+    """Random-walk books and inventories for `tickers` tickers."""
+    rng = random.Random(seed)
+    names = ['T{}'.format(i) for i in range(tickers)]
+    mids = {t: 10.0 + rng.uniform(-2.0, 2.0) for t in names}
+    positions = {t: 0 for t in names}
+    ids = {}  # (ticker, side, price) -> order id, so a level keeps its id
+
+    def level_id(key):
+        if key not in ids:
+            ids[key] = len(ids) + 1
+        return ids[key]
+
+    snapshots = []
+    for n in range(ticks * polls_per_tick):
+        tick = 1 + n // polls_per_tick
+        raw = {}
+        for t in names:
+            mid = mids[t] = mids[t] + rng.gauss(0.0, 0.02)
+            half = 0.01 * rng.randint(1, 6)
+            bid = round(mid - half, 2)
+            ask = round(mid + half, 2)
+            bids = []
+            asks = []
+            for i in range(levels):
+                price = round(bid - 0.01 * i, 2)
+                bids.append({'price': price, 'quantity': rng.randint(100, 3000),
+                             'quantity_filled': 0, 'order_id': level_id((t, 'B', price))})
+                price = round(ask + 0.01 * i, 2)
+                asks.append({'price': price, 'quantity': rng.randint(100, 3000),
+                             'quantity_filled': 0, 'order_id': level_id((t, 'A', price))})
+            raw[t] = {'bids': bids, 'asks': asks}
+            positions[t] = max(-7500, min(7500, positions[t] + rng.choice((-500, 0, 0, 500))))
+        snapshots.append(BenchSnapshot(tick, raw, dict(positions)))
+    return snapshots
+
+
+def recorded(path):
+    """The snapshots of a rit.recorder recording, with its recorded positions."""
+    snapshots = []
+    for record in load(path):
+        positions = {s['ticker']: s.get('position', 0) for s in record.get('securities') or ()
+                     if s.get('ticker') in record['books']}
+        for t in record['books']:
+            positions.setdefault(t, 0)
+        snapshots.append(BenchSnapshot(record['tick'], record['books'], positions))
+    return snapshots
+
+
+class DecideCase(object):
+    """rit.kernel.decide over the snapshots, our decided orders left resting."""
+
+    kernel = 'decide'
+
+    def __init__(self, snapshots, params):
+        self.snapshots = snapshots
+        self.params = params
+        self.resting = {}
+        self.next_id = 1
+
+    def reset(self):
+        self.resting = {}
+        self.next_id = 1
+
+    def run(self):
+        params = self.params
+        resting = self.resting
+        clock = time.perf_counter
+        elapsed = 0.0
+        for snap in self.snapshots:
+            started = clock()
+            decision = decide(params, snap.tick, snap.tops, snap.positions, resting.values(),
+                              books=snap.raw, depth_levels=DEFAULT_LEVELS)
+            elapsed += clock() - started
+            self.apply(decision, snap.tick)
+        return elapsed
+
+    def one(self, snap):
+        return decide(self.params, snap.tick, snap.tops, snap.positions, self.resting.values(),
+                      books=snap.raw, depth_levels=DEFAULT_LEVELS)
+
+    def apply(self, decision, tick):
+        resting = self.resting
+        for order_id in decision.cancels:
+            resting.pop(order_id, None)
+        for p in decision.places:
+            resting[self.next_id] = SimQuote(self.next_id, p.ticker, p.side, p.price, p.quantity,
+                                             tick)
+            self.next_id += 1
+
+
+class EngineCase(object):
+    """MultiTickerEngine.step (and the estimator) over the snapshots."""
+
+    kernel = 'engine'
+
+    def __init__(self, snapshots, params):
+        self.snapshots = snapshots
+        self.params = params
+        self.tickers = sorted(snapshots[0].raw) if snapshots else []
+        self.reset()
+
+    def reset(self):
+        self.positions = PositionCache()
+        self.tracker = OrderTracker()
+        self.estimator = Estimator(self.tickers)
+        self.engine = MultiTickerEngine(self.params, self.tickers, self.positions, self.tracker,
+                                        depth_levels=DEFAULT_LEVELS, budget=MessageBudget(6),
+                                        estimator=self.estimator)
+        self.next_id = 1
+
+    def run(self):
+        clock = time.perf_counter
+        elapsed = 0.0
+        for snap in self.snapshots:
+            started = clock()
+            batch = self.one(snap)
+            elapsed += clock() - started
+            self.apply(batch, snap.tick)
+        return elapsed
+
+    def one(self, snap):
+        batch = ActionBatch()
+        self.positions.positions = dict(snap.positions)
+        self.estimator.update(snap.tick, snap.tops)
+        self.engine.step(snap.market, snap.tick, batch)
+        return batch
+
+    def apply(self, batch, tick):
+        tracker = self.tracker
+        for order_id in batch.cancels:
+            tracker.cancelled(order_id)
+        for p in batch.places.values():
+            tracker.record(self.next_id, p.ticker, p.side, p.quantity, p.price, tick)
+            self.next_id += 1
+
+
+def measure(case, repeat=5, samples=200):
+    """Run a case and return its {rate, us, peak, kept}."""
+    n = len(case.snapshots)
+    if not n:
+        return None
+    best = None
+    for _ in range(repeat):
+        case.reset()
+        gc.collect()
+        elapsed = case.run()
+        best = elapsed if best is None else min(best, elapsed)
+
+    # blocks left allocated by a full run, against the run before it
+    case.reset()
+    case.run()
+    gc.collect()
+    blocks = sys.getallocatedblocks()
+    case.run()
+    gc.collect()
+    kept = max(0, sys.getallocatedblocks() - blocks) / float(n)
+
+    # peak bytes of single decisions, on a sample spread over the run
+    case.reset()
+    step = max(1, n // samples)
+    peaks = []
+    tracemalloc.start()
+    try:
+        for i, snap in enumerate(case.snapshots):
+            if i % step:
+                case.apply(case.one(snap), snap.tick)
+                continue
+            base = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            result = case.one(snap)
+            peaks.append(tracemalloc.get_traced_memory()[1] - base)
+            case.apply(result, snap.tick)
+    finally:
+        tracemalloc.stop()
+
+    rate = n / best if best > 0 else float('inf')
+    return {
+        'decisions': n,
+        'rate': rate,
+        'us': 1e6 / rate,
+        'peak': sum(peaks) / len(peaks),
+        'kept': kept,
+    }
+
+
+def check(name, kernel, result, baseline=None, tolerance=0.2):
+    """The threshold breaches of one result, as messages (none for ungated kernels)."""
+    failures = []
+    if kernel not in GATED:
+        return failures
+    floor = FLOORS.get(kernel)
+    if floor is not None and result['rate'] < floor:
+        failures.append('{}: {:.0f} decisions/s under the floor of {}'.format(
+            name, result['rate'], floor))
+    for metric, ceiling in CEILINGS.items():
+        if result[metric] > ceiling:
+            failures.append('{}: {} {:.1f} over the ceiling of {}'.format(
+                name, metric, result[metric], ceiling))
+    before = (baseline or {}).get(name)
+    if before:
+        if result['rate'] < before['rate'] * (1.0 - tolerance):
+            failures.append('{}: {:.0f} decisions/s, {:.0%} slower than the baseline {:.0f}'.format(
+                name, result['rate'], 1.0 - result['rate'] / before['rate'], before['rate']))
+        if result['peak'] > before['peak'] * (1.0 + tolerance):
+            failures.append('{}: peak {:.0f} bytes, up from {:.0f} in the baseline'.format(
+                name, result['peak'], before['peak']))
+    return failures
+
+
+def run(recording=None, tickers=4, ticks=300, repeat=5, params=None, seed=1):
+    """{case name: result} for every kernel on every snapshot set."""
+    params = params if params is not None else QuoteParams()
+    sets = [('synthetic', synthetic(tickers=tickers, ticks=ticks, seed=seed))]
+    if recording:
+        sets.append(('recorded', recorded(recording)))
+    results = {}
+    for label, snapshots in sets:
+        for case_type in (DecideCase, EngineCase):
+            case = case_type(snapshots, params)
+            result = measure(case, repeat)
+            if result is not None:
+                results['{}/{}'.format(case.kernel, label)] = result
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the quoting decision kernels.')
+    parser.add_argument('--recording', help='also run over this rit.recorder recording')
+    parser.add_argument('--tickers', type=int, default=4, help='tickers in the synthetic books')
+    parser.add_argument('--ticks', type=int, default=300, help='ticks of synthetic books')
+    parser.add_argument('--repeat', type=int, default=5, help='timed runs per case (best kept)')
+    parser.add_argument('--baseline', help='fail on a regression against this --save file')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='allowed slowdown/peak growth against the baseline')
+    parser.add_argument('--save', help='write the results to this file')
+    args = parser.parse_args(argv)
+
+    results = run(args.recording, args.tickers, args.ticks, args.repeat)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    failures = []
+    for name, result in sorted(results.items()):
+        kernel = name.split('/')[0]
+        print('{:20s} {:9.0f} decisions/s  {:8.1f} us  peak {:7.0f} B  kept {:5.2f} blocks'
+              '  ({} decisions){}'.format(name, result['rate'], result['us'], result['peak'],
+                                          result['kept'], result['decisions'],
+                                          '' if kernel in GATED else '  not gated'))
+        failures.extend(check(name, kernel, result, baseline, args.tolerance))
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    for failure in failures:
+        print('REGRESSION', failure)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
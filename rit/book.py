@@ -0,0 +1,160 @@
+# depth-aware book model with liquidity metrics kept up to date between reads
+#
+# get_top_of_book downloaded the whole /v1/securities/book and kept level 0,
+# and compute_trade_volumes sized off min(bid_size, ask_size) at the touch.
+# The book read now asks for a bounded number of entries per side (the
+# 'limit' parameter), and DepthBook keeps, per ticker, the resting
+# quantity at each price. Each read is diffed by order id against the
+# previous one, so only the entries that appeared, traded or left touch
+# the per-price totals. From those it derives:
+#
+#   bid_depth/ask_depth  quantity over the best `levels` prices, level i
+#                        weighted by decay**i (our own orders excluded)
+#   liquidity            min(bid_depth, ask_depth), the sizing input
+#   microprice           touch prices weighted by the opposite touch size
+#   imbalance            (bid_depth - ask_depth) / (bid_depth + ask_depth)
+#   queue_ahead          per order of ours: quantity resting ahead of it at
+#                        its price, in time priority
+DEFAULT_LEVELS = 5
+
+
+def weighted_depth(totals, levels, decay, best_first):
+    """Depth-weighted quantity of a {price: quantity} side."""
+    depth = 0.0
+    weight = 1.0
+    for price in sorted(totals, reverse=best_first)[:levels]:
+        depth += weight * totals[price]
+        weight *= decay
+    return depth
+
+
+def raw_liquidity(book, levels=DEFAULT_LEVELS, decay=0.5):
+    """DepthBook.liquidity for a raw JSON book (as recorded), for rit.replay.
+
+    Recordings do not say which entries were ours, so nothing is excluded.
+    """
+    sides = []
+    for key, best_first in (('bids', True), ('asks', False)):
+        totals = {}
+        for entry in (book.get(key) or ()) if isinstance(book, dict) else ():
+            remaining = (entry.get('quantity', 0) or 0) - (entry.get('quantity_filled', 0) or 0)
+            totals[entry['price']] = totals.get(entry['price'], 0) + remaining
+        sides.append(weighted_depth(totals, levels, decay, best_first))
+    return min(sides)
+
+
+class _Side(object):
+    __slots__ = ('best_first', 'entries', 'totals')
+
+    def __init__(self, best_first):
+        self.best_first = best_first
+        self.entries = {}  # order_id -> (price, remaining), ours excluded
+        self.totals = {}   # price -> remaining
+
+    def apply(self, levels, own_ids):
+        """Fold a fresh list of BookLevels in; returns True when anything changed."""
+        entries = self.entries
+        totals = self.totals
+        seen = set()
+        changed = False
+        for index, level in enumerate(levels):
+            order_id = level.order_id
+            if order_id is None:
+                order_id = (level.price, index)  # a client that sends no ids
+            elif order_id in own_ids:
+                continue
+            seen.add(order_id)
+            now = (level.price, level.remaining)
+            before = entries.get(order_id)
+            if before == now:
+                continue
+            changed = True
+            if before is not None:
+                self._add(before[0], -before[1])
+            entries[order_id] = now
+            self._add(now[0], now[1])
+        for order_id in [i for i in entries if i not in seen]:
+            price, remaining = entries.pop(order_id)
+            self._add(price, -remaining)
+            changed = True
+        return changed
+
+    def _add(self, price, quantity):
+        total = self.totals.get(price, 0) + quantity
+        if total > 0:
+            self.totals[price] = total
+        else:
+            self.totals.pop(price, None)
+
+    def best(self):
+        if not self.totals:
+            return None, 0
+        price = max(self.totals) if self.best_first else min(self.totals)
+        return price, self.totals[price]
+
+
+class DepthBook(object):
+    """Per-ticker book metrics, updated from each rit.records.Book read."""
+
+    def __init__(self, ticker, levels=DEFAULT_LEVELS, decay=0.5):
+        self.ticker = ticker
+        self.levels = levels
+        self.decay = decay
+        self.bids = _Side(best_first=True)
+        self.asks = _Side(best_first=False)
+        self.bid_depth = 0.0
+        self.ask_depth = 0.0
+        self.microprice = None
+        self.imbalance = 0.0
+        self.queue_ahead = {}
+        self.updates = 0
+        self.unchanged = 0
+
+    @property
+    def liquidity(self):
+        return min(self.bid_depth, self.ask_depth)
+
+    def update(self, book, own_ids=frozenset()):
+        """Apply a new read of this ticker's book; own_ids are our order ids."""
+        self.updates += 1
+        bids_changed = self.bids.apply(book.bids, own_ids)
+        asks_changed = self.asks.apply(book.asks, own_ids)
+        if bids_changed:
+            self.bid_depth = weighted_depth(self.bids.totals, self.levels, self.decay, True)
+        if asks_changed:
+            self.ask_depth = weighted_depth(self.asks.totals, self.levels, self.decay, False)
+        if bids_changed or asks_changed:
+            self._touch_metrics()
+        else:
+            self.unchanged += 1
+        self.queue_ahead = self._queue_ahead(book, own_ids) if own_ids else {}
+        return self
+
+    def _touch_metrics(self):
+        bid, bid_size = self.bids.best()
+        ask, ask_size = self.asks.best()
+        if bid is not None and ask is not None and bid_size + ask_size > 0:
+            self.microprice = (bid * ask_size + ask * bid_size) / float(bid_size + ask_size)
+        elif bid is not None and ask is not None:
+            self.microprice = 0.5 * (bid + ask)
+        else:
+            self.microprice = None
+        total = self.bid_depth + self.ask_depth
+        self.imbalance = (self.bid_depth - self.ask_depth) / total if total > 0 else 0.0
+
+    @staticmethod
+    def _queue_ahead(book, own_ids):
+        # book entries are listed in time priority within each price
+        ahead = {}
+        for levels in (book.bids, book.asks):
+            at_price = {}
+            for level in levels:
+                queued = at_price.get(level.price, 0)
+                if level.order_id in own_ids:
+                    ahead[level.order_id] = queued
+                at_price[level.price] = queued + level.remaining
+        return ahead
+
+    def __repr__(self):
+        return 'DepthBook({} depth {:.0f}/{:.0f} micro {} imbalance {:+.2f})'.format(
+            self.ticker, self.bid_depth, self.ask_depth, self.microprice, self.imbalance)
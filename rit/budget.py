@@ -0,0 +1,157 @@
+# per-tick message budget for quote updates
+#
+# The requote rule (a side moves once the target is REQUOTE_TOL away) and the
+# TTL expiry both turn into a cancel plus a place, so a moving mid sent a
+# burst of messages on every ticker at once, with nothing keeping it under
+# the client's order rate. MessageBudget counts the order messages (cancels
+# and placements, split orders counted per part) sent per ticker in each
+# tick and does two things with them:
+#
+#   - select() ranks a pass's pending updates and defers those that do not
+#     fit the ticker's (and the total) budget left in this tick. The update
+#     of one ticker and side (its cancels and placement together) is the
+#     unit. Cancels that pull a side which adds to our inventory always go.
+#     The rest are ranked risk-reducing first, then by expected value per
+#     message: the mispricing the update removes (each cancelled order's
+#     distance from the new price, times its size) plus the edge the new
+#     order offers against mid, times its size.
+#   - requote_tol() and ttl() scale the ticker's REQUOTE_TOL and
+#     ORDER_TTL_TICKS by a factor. The factor grows by `grow` after a tick
+#     that used up the ticker's budget or deferred an update, and shrinks
+#     back towards 1 by `shrink` after a tick that used at most `relax` of
+#     it. A busy ticker then sends fewer, larger updates.
+#
+# A deferred update is decided again on the next pass, against the book of
+# that moment.
+import math
+
+from rit.reconcile import CANCEL, CANCEL_RISKY, PLACE, PLACE_REDUCING
+
+
+class MessageBudget(object):
+    """Order messages per tick: per_ticker for each ticker, total (optional) for all."""
+
+    def __init__(self, per_ticker, total=None, grow=1.5, shrink=0.8, relax=0.5, max_scale=4.0):
+        self.per_ticker = per_ticker
+        self.total = total
+        self.grow = grow
+        self.shrink = shrink
+        self.relax = relax
+        self.max_scale = max_scale
+        self.tick = None
+        self.used = {}      # ticker -> messages in the current tick
+        self.deferred = {}  # ticker -> updates deferred in the current tick
+        self.scale = {}     # ticker -> requote tolerance / TTL factor
+        self.sent = 0
+        self.held = 0
+
+    # -- per-tick accounting -----------------------------------------------------
+
+    def begin(self, tick):
+        """Start a pass; a new tick closes the previous one's accounting."""
+        if tick == self.tick:
+            return
+        if self.tick is not None:
+            self._adapt()
+        self.tick = tick
+        self.used = {}
+        self.deferred = {}
+
+    def _adapt(self):
+        scale = self.scale
+        total_over = self.total is not None and sum(self.used.values()) >= self.total
+        for ticker in set(self.used) | set(self.deferred) | set(scale):
+            used = self.used.get(ticker, 0)
+            factor = scale.get(ticker, 1.0)
+            if self.deferred.get(ticker) or used >= self.per_ticker or (total_over and used):
+                factor = min(self.max_scale, factor * self.grow)
+            elif used <= self.relax * self.per_ticker:
+                factor = max(1.0, factor * self.shrink)
+            if factor == 1.0:
+                scale.pop(ticker, None)
+            else:
+                scale[ticker] = factor
+
+    def spend(self, ticker, messages=1):
+        """Count messages sent outside select() (TTL and off-list cancels)."""
+        self.used[ticker] = self.used.get(ticker, 0) + messages
+        self.sent += messages
+
+    def left(self, ticker):
+        room = self.per_ticker - self.used.get(ticker, 0)
+        if self.total is not None:
+            room = min(room, self.total - sum(self.used.values()))
+        return room
+
+    # -- adaptive thresholds -------------------------------------------------------
+
+    def requote_tol(self, ticker, base):
+        return base * self.scale.get(ticker, 1.0)
+
+    def ttl(self, ticker, base):
+        return int(math.ceil(base * self.scale.get(ticker, 1.0)))
+
+    # -- ranking -------------------------------------------------------------------
+
+    def select(self, queue, mids, split=None):
+        """Drop from queue (an ActionQueue) the updates that do not fit this tick.
+
+        mids is {ticker: mid} of the books quoted; split(ticker, quantity) is
+        how placements are broken up, so each part is counted. Returns the
+        deferred actions.
+        """
+        groups = {}
+        for action in queue.actions():
+            groups.setdefault((action.ticker, action.side), []).append(action)
+        ranked = []
+        for (ticker, _), actions in groups.items():
+            cost = sum(_messages(a, split) for a in actions)
+            if all(a.kind == CANCEL and a.priority == CANCEL_RISKY for a in actions):
+                # pulling a side that adds to our inventory is never held back
+                self.spend(ticker, cost)
+                continue
+            reducing = any(a.priority in (CANCEL_RISKY, PLACE_REDUCING) for a in actions)
+            value = _value(actions, mids.get(ticker))
+            ranked.append((0 if reducing else 1, -value / cost, ticker, cost, actions))
+        ranked.sort(key=lambda item: item[:2])
+        dropped = []
+        for _, _, ticker, cost, actions in ranked:
+            # a ticker's first update of a tick goes even if it alone is over
+            # budget, or that ticker would never be requoted
+            if cost <= self.left(ticker) or not self.used.get(ticker):
+                self.spend(ticker, cost)
+                continue
+            self.deferred[ticker] = self.deferred.get(ticker, 0) + 1
+            self.held += len(actions)
+            dropped.extend(actions)
+        queue.discard(dropped)
+        return dropped
+
+    def __repr__(self):
+        return 'MessageBudget({}/ticker, sent {}, held {}, scale {})'.format(
+            self.per_ticker, self.sent, self.held,
+            {t: round(f, 2) for t, f in sorted(self.scale.items())})
+
+
+def _messages(action, split):
+    if action.kind == PLACE and split is not None:
+        return len(split(action.ticker, action.quantity))
+    return 1
+
+
+def _value(actions, mid):
+    """Mispricing removed plus edge offered by one ticker/side update."""
+    if mid is None:
+        return 0.0
+    target = None
+    for a in actions:
+        if a.kind == PLACE:
+            target = a.price
+    ref = target if target is not None else mid
+    value = 0.0
+    for a in actions:
+        if a.kind == PLACE:
+            value += abs(a.price - mid) * a.quantity
+        else:
+            value += abs(a.price - ref) * a.quantity
+    return value
@@ -0,0 +1,224 @@
+# cancel-endpoint discovery shared by every ALGO2 variant
+#
+# RIT clients differ in how they accept cancels. The old multi-endpoint
+# cancel_order tried POST /commands/cancel, POST /orders/cancel and
+# DELETE /orders/{id} in turn on every call, so a client that only knows the
+# last form paid three round trips per cancel. CancelRouter finds the working
+# form once (lazily, on the first cancel) and sends every later cancel as a
+# single request on that path. When the client accepts the bulk parameters of
+# /commands/cancel (ids, ticker, all, query) several cancels collapse into one
+# request as well.
+#
+# A form is only kept once it has confirmed the order it was sent: a client
+# that lists cancelled_order_ids has to list that id, since a form that takes
+# the request but ignores the id answers 200 as well. A 409/410/422 means
+# the order filled or was already cancelled, so probing stops there.
+import threading
+
+from rit.api import API_URL, check_auth
+from rit.records import order_id_of
+
+OK_STATUS = (200, 201, 204)
+# statuses that mean "this endpoint does not exist here", as opposed to
+# "this particular order could not be cancelled"
+MISSING_STATUS = (404, 405, 501)
+# statuses that mean the form was understood but the order is no longer
+# cancellable (filled or already cancelled)
+GONE_STATUS = (409, 410, 422)
+
+
+def _cancel_command(session, order_id):
+    return session.post(API_URL + '/commands/cancel', params={'id': order_id})
+
+
+def _cancel_orders_endpoint(session, order_id):
+    return session.post(API_URL + '/orders/cancel', params={'id': order_id})
+
+
+def _cancel_delete(session, order_id):
+    return session.delete(API_URL + '/orders/{}'.format(order_id))
+
+
+# single-order cancel forms, in the order they are probed
+SINGLE_FORMS = (
+    ('command', _cancel_command),
+    ('orders', _cancel_orders_endpoint),
+    ('delete', _cancel_delete),
+)
+
+
+def _cancelled_ids(resp, fallback):
+    try:
+        data = resp.json()
+    except ValueError:
+        return None if fallback is None else list(fallback)
+    if isinstance(data, dict) and isinstance(data.get('cancelled_order_ids'), list):
+        return data['cancelled_order_ids']
+    return None if fallback is None else list(fallback)
+
+
+def _confirms(resp, order_id):
+    """Does an accepted cancel response cover this order?
+
+    A client that lists cancelled_order_ids must list it; a form that takes
+    the request but ignores its id answers with a list that does not. A
+    response without such a list is taken at its status.
+    """
+    try:
+        data = resp.json()
+    except ValueError:
+        return True
+    if isinstance(data, dict) and isinstance(data.get('cancelled_order_ids'), list):
+        return str(order_id) in {str(i) for i in data['cancelled_order_ids']}
+    return True
+
+
+def _order_fields(order):
+    """(order id, ticker) of a raw order dict or a rit.records/rit.orders object."""
+    if isinstance(order, dict):
+        return order_id_of(order), order.get('ticker')
+    return getattr(order, 'order_id', None), getattr(order, 'ticker', None)
+
+
+class CancelRouter(object):
+    """Remember which cancel form the RIT client accepts and use only that one.
+
+    single_form is the name of the known-good single-order form (None until
+    discovered). bulk is None until the bulk form has been tried, then True or
+    False. Both are shared by every caller of the router, so one probe covers
+    the whole session.
+    """
+
+    def __init__(self, single_form=None, bulk=None):
+        self.forms = dict(SINGLE_FORMS)
+        self.single_form = single_form
+        self.bulk = bulk
+        self.unsupported = set()
+        self.lock = threading.Lock()
+
+    # -- single cancels --------------------------------------------------------
+
+    def cancel(self, session, order_id):
+        """Cancel one order; returns True when the client accepted the cancel."""
+        if order_id is None:
+            return False
+        form = self.single_form
+        if form is not None:
+            resp = check_auth(self.forms[form](session, order_id))
+            if resp.status_code in OK_STATUS:
+                return _confirms(resp, order_id)
+            if resp.status_code not in MISSING_STATUS:
+                return False
+            # the known-good path vanished (client restarted?); probe again
+            with self.lock:
+                self.unsupported.add(form)
+                if self.single_form == form:
+                    self.single_form = None
+        return self._probe(session, order_id)
+
+    def _probe(self, session, order_id):
+        for name, send in SINGLE_FORMS:
+            if name in self.unsupported:
+                continue
+            resp = check_auth(send(session, order_id))
+            if resp.status_code in OK_STATUS:
+                if not _confirms(resp, order_id):
+                    # accepted without cancelling this order: the form may
+                    # ignore the id, so it is not the one to keep
+                    continue
+                with self.lock:
+                    self.single_form = name
+                return True
+            if resp.status_code in GONE_STATUS:
+                # the order filled or was cancelled already; the other forms
+                # would only say the same
+                return False
+            if resp.status_code in MISSING_STATUS:
+                with self.lock:
+                    self.unsupported.add(name)
+        return False
+
+    # -- bulk cancels ----------------------------------------------------------
+
+    def _bulk(self, session, params):
+        """Send one bulk /commands/cancel; returns the response, or None if unsupported."""
+        if self.bulk is False:
+            return None
+        resp = check_auth(session.post(API_URL + '/commands/cancel', params=params))
+        if resp.status_code in OK_STATUS:
+            if self.bulk is None and _cancelled_ids(resp, None) is None:
+                # accepted, but nothing says the bulk parameters were understood
+                self.bulk = False
+                return None
+            self.bulk = True
+            return resp
+        if resp.status_code in MISSING_STATUS or (self.bulk is None and resp.status_code == 400):
+            # either no /commands/cancel at all or it does not take bulk parameters
+            self.bulk = False
+            return None
+        return resp
+
+    def cancel_many(self, session, order_ids, executor=None):
+        """Cancel several orders, in one request when the client supports it.
+
+        Returns the list of order ids the client reported as cancelled. Without
+        bulk support the ids are cancelled one by one, concurrently when an
+        executor is given.
+        """
+        ids = [i for i in dict.fromkeys(order_ids) if i is not None]
+        if not ids:
+            return []
+        if len(ids) > 1:
+            resp = self._bulk(session, {'ids': ','.join(str(i) for i in ids)})
+            if resp is not None:
+                return _cancelled_ids(resp, ids) if resp.status_code in OK_STATUS else []
+        if executor is not None and len(ids) > 1:
+            results = list(executor.map(lambda i: self.cancel(session, i), ids))
+        else:
+            results = [self.cancel(session, i) for i in ids]
+        return [i for i, ok in zip(ids, results) if ok]
+
+    def cancel_ticker(self, session, ticker, open_orders=None):
+        """Cancel all our open orders on one ticker."""
+        resp = self._bulk(session, {'ticker': ticker})
+        if resp is not None:
+            return _cancelled_ids(resp, [])
+        orders = open_orders if open_orders is not None else self._open_orders(session)
+        ids = []
+        for o in orders:
+            order_id, order_ticker = _order_fields(o)
+            if order_ticker == ticker:
+                ids.append(order_id)
+        return self.cancel_many(session, ids)
+
+    def cancel_all(self, session, open_orders=None):
+        """Cancel every open order we have."""
+        resp = self._bulk(session, {'all': 1})
+        if resp is not None:
+            return _cancelled_ids(resp, [])
+        orders = open_orders if open_orders is not None else self._open_orders(session)
+        return self.cancel_many(session, [_order_fields(o)[0] for o in orders])
+
+    def cancel_query(self, session, query):
+        """Server-side query cancel, e.g. "Price > 10.50 AND Volume < 0".
+
+        Returns None when the client has no query cancel; callers then need
+        to select the orders themselves.
+        """
+        resp = self._bulk(session, {'query': query})
+        if resp is None:
+            return None
+        return _cancelled_ids(resp, [])
+
+    def _open_orders(self, session):
+        resp = check_auth(session.get(API_URL + '/orders', params={'status': 'OPEN'}))
+        data = resp.json()
+        return data if isinstance(data, list) else []
+
+
+# one router per process, so every script variant shares what it has learned
+default_router = CancelRouter()
+
+
+def cancel_order(session, order_id):
+    return default_router.cancel(session, order_id)
@@ -0,0 +1,229 @@
+# simultaneous quoting of every ticker in one loop
+#
+# select_ticker_to_trade keeps only the widest book and main() used to cancel
+# everything resting on the other tickers, so with several tickers the loop
+# churned orders and quoted one book at a time. MultiTickerEngine quotes every
+# ticker whose spread is wide enough on each pass, each with its own bid/ask
+# and TTL state, and routes all of them through one ActionBatch. The books
+# already arrive together from SnapshotFetcher and the batch goes out
+# concurrently, so the loop costs about the same for 1 ticker as for 10.
+# Each ticker's quote comes from rit.kernel.quote_ticker, the pricing and
+# sizing every variant shares, and its orders are brought to that quote by
+# rit.reconcile, which only sends what differs.
+#
+# MAX_GROSS_POS/MAX_NET_POS are portfolio limits, which compute_quote can only
+# check against filled positions. RiskAggregator also counts what our resting
+# and newly decided orders on the other tickers would add if they all filled,
+# and trims a side that would take the portfolio past a limit.
+#
+# With a rit.static.StaticData, quote prices are snapped to each ticker's
+# tick grid before they are reconciled against our orders, and placements
+# are split under the max trade size. With a rit.budget.MessageBudget, each
+# ticker's requote tolerance and TTL follow the budget, and the updates that
+# do not fit this tick's messages are deferred, least valuable first. With a
+# rit.estimator.Estimator, quotes centre on each ticker's fair value and the
+# edge and skew follow its volatility.
+from rit.book import DepthBook
+from rit.kernel import quote_ticker
+from rit.reconcile import ActionQueue, Reconciler
+
+BUY = 'BUY'
+SELL = 'SELL'
+
+
+class RiskAggregator(object):
+    """Portfolio gross/net limits across tickers, including pending orders.
+
+    pending holds, per ticker, the (buy, sell) quantity we have working or
+    are about to place. begin() seeds it from the tracker at the start of a
+    pass; commit() replaces a ticker's entry once its quotes are decided, so
+    tickers quoted later in the pass see them.
+    """
+
+    def __init__(self, positions, max_gross_pos, max_net_pos):
+        self.positions = positions
+        self.max_gross_pos = max_gross_pos
+        self.max_net_pos = max_net_pos
+        self.pending = {}
+        self.pending_buy = 0
+        self.pending_sell = 0
+
+    def begin(self, orders_by_ticker):
+        pending = {}
+        for ticker, orders in orders_by_ticker.items():
+            buy = sum(o.remaining for o in orders if o.side == BUY)
+            sell = sum(o.remaining for o in orders if o.side == SELL)
+            pending[ticker] = (buy, sell)
+        self.pending = pending
+        self.pending_buy = sum(b for b, _ in pending.values())
+        self.pending_sell = sum(s for _, s in pending.values())
+
+    def exposure(self):
+        """(gross, net) filled position of the portfolio."""
+        return self.positions.gross, self.positions.net
+
+    def allow(self, ticker, side, quantity):
+        """Can ticker work `quantity` on side on top of every other ticker's orders?"""
+        own_buy, own_sell = self.pending.get(ticker, (0, 0))
+        other_buy = self.pending_buy - own_buy
+        other_sell = self.pending_sell - own_sell
+        gross, net = self.exposure()
+        if gross + other_buy + other_sell + quantity > self.max_gross_pos:
+            return False
+        if side == BUY:
+            return net + other_buy + quantity <= self.max_net_pos
+        return net - other_sell - quantity >= -self.max_net_pos
+
+    def commit(self, ticker, buy, sell):
+        old_buy, old_sell = self.pending.get(ticker, (0, 0))
+        self.pending[ticker] = (buy, sell)
+        self.pending_buy += buy - old_buy
+        self.pending_sell += sell - old_sell
+
+
+class TickerState(object):
+    """The last quote decided for one ticker and the quantity left working."""
+
+    __slots__ = ('ticker', 'quote', 'working_buy', 'working_sell', 'quoted_tick')
+
+    def __init__(self, ticker):
+        self.ticker = ticker
+        self.quote = None
+        self.working_buy = 0
+        self.working_sell = 0
+        self.quoted_tick = None
+
+
+class MultiTickerEngine(object):
+    """Decide quotes for every ticker of a snapshot into one ActionBatch."""
+
+    def __init__(self, params, tickers, positions, tracker, risk=None, size_tol=0.2,
+                 depth_levels=None, static=None, budget=None, estimator=None, metrics=None):
+        self.params = params
+        self.metrics = metrics  # rit.metrics.Metrics: times the risk/quote/reconcile phases
+        self.static = static
+        self.budget = budget
+        self.estimator = estimator
+        self.tickers = list(tickers)
+        self.positions = positions
+        self.tracker = tracker
+        if risk is None:
+            risk = RiskAggregator(positions, params.max_gross_pos, params.max_net_pos)
+        self.risk = risk
+        self.reconciler = Reconciler(params.requote_tol, size_tol)
+        self.states = {t: TickerState(t) for t in self.tickers}
+        # depth-weighted liquidity for sizing; None sizes off the touch
+        self.books = None
+        if depth_levels:
+            self.books = {t: DepthBook(t, levels=depth_levels) for t in self.tickers}
+
+    def quotable(self, tops):
+        """(spread, ticker, top) for every book wide enough to quote, widest first."""
+        min_spread = self.params.min_market_spread
+        found = []
+        for ticker in self.tickers:
+            top = tops.get(ticker)
+            if top is None:
+                continue
+            best_bid, best_ask = top[0], top[1]
+            if best_bid is None or best_ask is None or best_ask <= best_bid:
+                continue
+            spread = best_ask - best_bid
+            if spread >= min_spread:
+                found.append((spread, ticker, top))
+        # the widest books get first claim on the shared risk limits
+        found.sort(key=lambda item: -item[0])
+        return found
+
+    def step(self, snapshot, tick, batch):
+        """Add this pass's cancels and placements to batch; returns the quotes made."""
+        p = self.params
+        tracker = self.tracker
+        positions = self.positions
+        budget = self.budget
+        if budget is not None:
+            budget.begin(tick)
+
+        for order_id in tracker.expired(tick, p.order_ttl_ticks):
+            if budget is not None:
+                order = tracker.orders[order_id]
+                if tick - order.tick < budget.ttl(order.ticker, p.order_ttl_ticks):
+                    continue
+                budget.spend(order.ticker)
+            batch.cancel(order_id)
+
+        by_ticker = {}
+        for o in tracker.open_orders():
+            if o.order_id in batch.cancels:
+                continue
+            if o.ticker not in self.states:
+                # not one of ours to quote: pull it
+                batch.cancel(o.order_id)
+                if budget is not None:
+                    budget.spend(o.ticker)
+                continue
+            by_ticker.setdefault(o.ticker, []).append(o)
+        self.risk.begin(by_ticker)
+        metrics = self.metrics
+        if metrics is not None:
+            metrics.lap('risk')
+
+        queue = ActionQueue()
+        quotes = []
+        mids = {}
+        for _, ticker, top in self.quotable(snapshot.tops):
+            best_bid, best_ask = top[0], top[1]
+            tracker.check_book(ticker, best_bid, best_ask)
+            liquidity = None
+            if self.books is not None:
+                own = by_ticker.get(ticker, ())
+                depth = self.books[ticker].update(snapshot.books[ticker],
+                                                  frozenset(o.order_id for o in own))
+                liquidity = depth.liquidity
+            estimate = self.estimator.get(ticker) if self.estimator is not None else None
+            gross_pos, net_pos = self.risk.exposure()
+            quote = quote_ticker(p, ticker, top, positions.position(ticker), gross_pos, net_pos,
+                                 liquidity, estimate)
+            if quote is None:
+                continue
+            if self.static is not None:
+                quote.bid = self.static.snap(ticker, quote.bid, BUY)
+                quote.ask = self.static.snap(ticker, quote.ask, SELL)
+            if quote.allow_buy and not self.risk.allow(ticker, BUY, quote.buy_qty):
+                quote.allow_buy = False
+            if quote.allow_sell and not self.risk.allow(ticker, SELL, quote.sell_qty):
+                quote.allow_sell = False
+            self._requote(self.states[ticker], quote, by_ticker.get(ticker, ()), tick, queue)
+            quotes.append(quote)
+            mids[ticker] = 0.5 * (best_bid + best_ask)
+        if metrics is not None:
+            metrics.lap('quote')
+        split = self.static.split if self.static is not None else None
+        if budget is not None:
+            budget.select(queue, mids, split)
+        # risk-reducing actions first
+        queue.drain_into(batch, split)
+        if metrics is not None:
+            metrics.lap('reconcile')
+        return quotes
+
+    def _requote(self, state, quote, orders, tick, queue):
+        """Queue the minimal cancels/placements that turn our orders into quote."""
+        ticker = state.ticker
+        position = self.positions.position(ticker)
+        bids = [o for o in orders if o.side == BUY]
+        asks = [o for o in orders if o.side == SELL]
+        price_tol = None
+        if self.budget is not None:
+            price_tol = self.budget.requote_tol(ticker, self.params.requote_tol)
+        working_buy = self.reconciler.reconcile(
+            ticker, BUY, (quote.bid, quote.buy_qty) if quote.allow_buy else None,
+            bids, position, queue, price_tol)
+        working_sell = self.reconciler.reconcile(
+            ticker, SELL, (quote.ask, quote.sell_qty) if quote.allow_sell else None,
+            asks, position, queue, price_tol)
+        self.risk.commit(ticker, working_buy, working_sell)
+        state.quote = quote
+        state.working_buy = working_buy
+        state.working_sell = working_sell
+        state.quoted_tick = tick
@@ -0,0 +1,211 @@
+# incremental volatility, drift and fair value per ticker
+#
+# The edge was max(BASE_EDGE, 0.25 * spread) and the inventory skew a fixed
+# skew_k * position, whatever the market was doing, and ticker_close() read a
+# single history row and was never called. Estimator reads each ticker's
+# price history once, one request per ticker when it starts, and from then on
+# updates in O(1) per ticker from the book tops the loop reads anyway:
+#
+#   vol       square root of an EWMA (weight `fast`) of squared mid changes,
+#             in price per tick
+#   base_vol  the same with the slow weight `slow`, the level vol is judged by
+#   drift     mean mid change per tick over the last drift_ticks ticks, a
+#             running sum over a ring of those changes
+#   micro     the microprice: the touch prices weighted by the size on the
+#             opposite side, which leans towards the side about to trade
+#   fair      micro + drift * horizon ticks
+#
+# Volatility and drift take one sample per tick; a gap of several ticks is
+# one sample spread over them (weighted by its length in the volatility
+# EWMAs, and its per-tick change pushed once per tick it spans, up to
+# drift_ticks, onto the drift ring). micro and fair follow every book read.
+# The drift ring is a preallocated array overwritten in place, so memory and
+# per-tick cost stay flat however long the session runs.
+#
+# compute_quote() takes an estimate in its choice dict. It then centres the
+# quotes on fair (kept inside the touch), widens the edge to at least
+# vol_edge_k * vol, and scales the inventory skew by vol / base_vol
+# (clamped), so inventory is leaned on harder when the market moves more.
+import math
+from array import array
+
+from rit.api import API_URL, check_auth
+from rit.records import decode_history, parse
+
+MIN_RATIO = 0.5
+MAX_RATIO = 3.0
+# candles of history load() reads per ticker
+HISTORY_LIMIT = 300
+
+
+def read_history(session, ticker, limit=None):
+    params = {'ticker': ticker}
+    if limit:
+        params['limit'] = limit
+    resp = check_auth(session.get(API_URL + '/securities/history', params=params))
+    return decode_history(ticker, parse(resp))
+
+
+class Ring(object):
+    """Fixed-size ring of floats with a running sum."""
+
+    __slots__ = ('values', 'size', 'count', 'next', 'total')
+
+    def __init__(self, size):
+        self.values = array('d', bytes(8 * size))
+        self.size = size
+        self.count = 0
+        self.next = 0
+        self.total = 0.0
+
+    def push(self, value):
+        values = self.values
+        i = self.next
+        if self.count == self.size:
+            self.total -= values[i]
+        else:
+            self.count += 1
+        values[i] = value
+        self.total += value
+        self.next = (i + 1) % self.size
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def __len__(self):
+        return self.count
+
+
+class TickerEstimate(object):
+    """The running estimates of one ticker."""
+
+    __slots__ = ('ticker', 'var', 'base_var', 'samples', 'mid', 'micro', 'fair', 'tick',
+                 'tick_mid', 'changes')
+
+    def __init__(self, ticker, drift_ticks):
+        self.ticker = ticker
+        self.var = None
+        self.base_var = None
+        self.samples = 0
+        self.mid = None
+        self.micro = None
+        self.fair = None
+        self.tick = None      # tick of the last volatility/drift sample
+        self.tick_mid = None  # mid at that tick
+        self.changes = Ring(drift_ticks)
+
+    @property
+    def vol(self):
+        return math.sqrt(self.var) if self.var is not None else 0.0
+
+    @property
+    def base_vol(self):
+        return math.sqrt(self.base_var) if self.base_var is not None else 0.0
+
+    @property
+    def drift(self):
+        return self.changes.mean
+
+    @property
+    def vol_ratio(self):
+        """vol against its slow average, clamped; 1.0 until both are known."""
+        if not self.base_var or self.var is None:
+            return 1.0
+        return min(MAX_RATIO, max(MIN_RATIO, math.sqrt(self.var / self.base_var)))
+
+    def __repr__(self):
+        return 'TickerEstimate({} fair {} vol {:.5f} drift {:+.5f}, {} samples)'.format(
+            self.ticker, self.fair, self.vol, self.drift, self.samples)
+
+
+class Estimator(object):
+    """Per-ticker volatility, drift and fair value, O(1) per ticker and tick.
+
+    fast and slow are the EWMA weights of the volatility and its baseline,
+    drift_ticks the ticks the drift averages over, horizon the ticks of
+    drift added to the microprice, and min_samples the ticks needed before
+    an estimate is ready() to be quoted from.
+    """
+
+    def __init__(self, tickers, fast=0.1, slow=0.01, drift_ticks=10, horizon=2.0, min_samples=10):
+        self.fast = fast
+        self.slow = slow
+        self.drift_ticks = drift_ticks
+        self.horizon = horizon
+        self.min_samples = min_samples
+        self.tickers = {t: TickerEstimate(t, drift_ticks) for t in tickers}
+
+    def load(self, session, limit=HISTORY_LIMIT, executor=None):
+        """Seed every ticker from its price history (one read per ticker)."""
+        if executor is not None:
+            jobs = {t: executor.submit(read_history, session, t, limit) for t in self.tickers}
+            histories = {t: job.result() for t, job in jobs.items()}
+        else:
+            histories = {t: read_history(session, t, limit) for t in self.tickers}
+        for ticker, candles in histories.items():
+            self.seed(ticker, candles)
+        return self
+
+    def seed(self, ticker, candles):
+        """Feed a ticker's candles (oldest first) through the estimates."""
+        state = self.tickers[ticker]
+        prev = None
+        for candle in candles:
+            if prev is not None and candle.tick is not None and prev.tick is not None \
+                    and candle.tick > prev.tick:
+                self._sample(state, candle.close - prev.close, candle.tick - prev.tick)
+            prev = candle
+        # the next book read starts the per-tick samples: a last close is not a mid
+
+    def update(self, tick, tops):
+        """Fold one snapshot's tops in; volatility and drift move once per tick."""
+        horizon = self.horizon
+        for ticker, (best_bid, best_ask, bid_size, ask_size) in tops.items():
+            state = self.tickers.get(ticker)
+            if state is None or best_bid is None or best_ask is None:
+                continue
+            mid = 0.5 * (best_bid + best_ask)
+            size = bid_size + ask_size
+            micro = (best_bid * ask_size + best_ask * bid_size) / size if size > 0 else mid
+            state.mid = mid
+            state.micro = micro
+            if state.tick is None:
+                state.tick = tick
+                state.tick_mid = mid
+            elif tick > state.tick:
+                self._sample(state, mid - state.tick_mid, tick - state.tick)
+                state.tick = tick
+                state.tick_mid = mid
+            elif tick < state.tick:
+                # a new period or heat: its prices do not follow on from ours
+                state.tick = tick
+                state.tick_mid = mid
+            state.fair = micro + state.drift * horizon
+
+    def _sample(self, state, change, ticks):
+        """One mid change over `ticks` ticks, as that many per-tick samples' worth."""
+        per_tick = change / ticks
+        variance = change * change / ticks
+        if state.var is None:
+            state.var = state.base_var = variance
+        else:
+            # weights for `ticks` steps at once, so a gap counts as its length
+            fast = 1.0 - (1.0 - self.fast) ** ticks
+            slow = 1.0 - (1.0 - self.slow) ** ticks
+            state.var += fast * (variance - state.var)
+            state.base_var += slow * (variance - state.base_var)
+        changes = state.changes
+        for _ in range(min(ticks, changes.size)):
+            changes.push(per_tick)
+        state.samples += 1
+
+    def get(self, ticker):
+        """The ticker's estimate when it is ready to be quoted from, else None."""
+        state = self.tickers.get(ticker)
+        if state is None or state.fair is None or state.samples < self.min_samples:
+            return None
+        return state
+
+    def __repr__(self):
+        return 'Estimator({})'.format(', '.join(map(repr, self.tickers.values())))
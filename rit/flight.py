@@ -0,0 +1,251 @@
+# binary flight recorder: a fixed-size record per ticker per loop in an mmap'd ring
+#
+#   python -m rit.flight flight.ring --csv flight.csv
+#
+# When a session went wrong all we had were a few print() lines. The flight
+# recorder keeps the last `capacity` loop records in a memory-mapped file, so
+# they survive a crash or a kill -9 and cost no syscall or formatting to
+# write: each record is one struct.pack_into() into the mapping. Per ticker
+# and loop it holds the tick, the top of book and our position, the quote we
+# decided (prices, sizes, sides allowed), the actions sent for that ticker
+# and the fetch/decide/send latencies of the loop.
+#
+# File layout (little-endian): a 32-byte header
+#
+#   magic b'RITFLT1\0', version u16, record size u16, capacity u32,
+#   next sequence number u64, started (wall clock) f64
+#
+# then `capacity` slots of RECORD. A record starts and ends with its sequence
+# number; the writer is the only one touching the file, and a reader treats a
+# slot whose two copies differ as torn (a crash mid-write) and skips it.
+# read_ring() returns the records oldest first; to_dataframe() needs pandas.
+import argparse
+import csv
+import math
+import mmap
+import os
+import struct
+import sys
+import time
+
+MAGIC = b'RITFLT1\0'
+VERSION = 1
+HEADER = struct.Struct('<8sHHIQd')
+_NEXT_SEQ = struct.Struct('<Q')
+_NEXT_SEQ_OFFSET = 16
+
+# seq, at, tick, ticker, bid, ask, bid_size, ask_size, position, quote_bid,
+# quote_ask, buy_qty, sell_qty, flags, cancels requested (whole loop),
+# cancelled, placed, failed (this ticker), fetch_ms, decide_ms, send_ms, seq
+RECORD = struct.Struct('<QdI8sddiiiddiiBHHHHfffQ')
+FIELDS = ('seq', 'at', 'tick', 'ticker', 'bid', 'ask', 'bid_size', 'ask_size', 'position',
+          'quote_bid', 'quote_ask', 'buy_qty', 'sell_qty', 'flags', 'cancels_requested',
+          'cancelled', 'placed', 'failed', 'fetch_ms', 'decide_ms', 'send_ms')
+
+QUOTED = 1
+ALLOW_BUY = 2
+ALLOW_SELL = 4
+
+NAN = float('nan')
+
+
+class FlightRecorder(object):
+    """Ring of loop records in a memory-mapped file; one writer, no locks.
+
+    Call begin() once per loop with the snapshot, decided() with the quotes
+    engine.step() returned, and sent() with the flush report and the orders
+    OrderTracker.apply_batch() saw cancelled. A loop's records are written by
+    the next begin() (or close()), so loops that skip quoting are recorded
+    with their book and position only.
+    """
+
+    def __init__(self, path, capacity=65536):
+        self.path = path
+        self.capacity = capacity
+        size = HEADER.size + capacity * RECORD.size
+        fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            os.ftruncate(fd, size)
+            self.map = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+        HEADER.pack_into(self.map, 0, MAGIC, VERSION, RECORD.size, capacity, 0, time.time())
+        self.started = time.monotonic()
+        self.seq = 0
+        self.tickers = {}  # ticker -> encoded bytes, so nothing is encoded per record
+        self.snapshot = None
+        self._reset()
+
+    def _reset(self):
+        self.snapshot = None
+        self.positions = None  # ticker -> position when the loop began
+        self.quotes = ()
+        self.report = None
+        self.cancelled = ()
+        self.decide_ms = 0.0
+        self.send_ms = 0.0
+
+    def begin(self, snapshot, positions):
+        """Start a loop (writing the previous one out)."""
+        if self.snapshot is not None:
+            self._write()
+        self.snapshot = snapshot
+        self.positions = {t: positions.position(t) for t in snapshot.tops}
+        self.began_at = self.decided_at = time.perf_counter()
+
+    def decided(self, quotes):
+        now = time.perf_counter()
+        self.quotes = quotes
+        self.decide_ms = (now - self.began_at) * 1000.0
+        self.decided_at = now
+
+    def sent(self, report, cancelled=(), elapsed=None):
+        """elapsed is the send latency in seconds when it was measured elsewhere."""
+        self.report = report
+        self.cancelled = cancelled
+        if elapsed is None:
+            elapsed = time.perf_counter() - self.decided_at
+        self.send_ms = elapsed * 1000.0
+
+    def _write(self):
+        snapshot = self.snapshot
+        report = self.report
+        quotes = {q.ticker: q for q in self.quotes}
+        placed = {}
+        failed = {}
+        cancelled = {}
+        requested = 0
+        if report is not None:
+            requested = len(report.requested_cancels)
+            for r in report.placed:
+                placed[r.ticker] = placed.get(r.ticker, 0) + 1
+            for r in report.failed_places:
+                failed[r.ticker] = failed.get(r.ticker, 0) + 1
+            for o in self.cancelled:
+                if o is not None:
+                    cancelled[o.ticker] = cancelled.get(o.ticker, 0) + 1
+        at = snapshot.started_at - self.started
+        fetch_ms = snapshot.elapsed * 1000.0
+        positions = self.positions
+        pack = RECORD.pack_into
+        buf = self.map
+        capacity = self.capacity
+        for ticker, (bid, ask, bid_size, ask_size) in snapshot.tops.items():
+            name = self.tickers.get(ticker)
+            if name is None:
+                name = self.tickers[ticker] = ticker.encode('utf-8')[:8]
+            quote = quotes.get(ticker)
+            if quote is not None:
+                flags = QUOTED | (ALLOW_BUY if quote.allow_buy else 0) | \
+                    (ALLOW_SELL if quote.allow_sell else 0)
+                quote_bid, quote_ask, buy_qty, sell_qty = quote.bid, quote.ask, quote.buy_qty, \
+                    quote.sell_qty
+            else:
+                flags = 0
+                quote_bid = quote_ask = NAN
+                buy_qty = sell_qty = 0
+            seq = self.seq + 1
+            pack(buf, HEADER.size + (seq % capacity) * RECORD.size, seq, at, snapshot.tick, name,
+                 NAN if bid is None else bid, NAN if ask is None else ask, bid_size, ask_size,
+                 positions[ticker], quote_bid, quote_ask, buy_qty, sell_qty, flags,
+                 min(requested, 0xFFFF), cancelled.get(ticker, 0), placed.get(ticker, 0),
+                 failed.get(ticker, 0), fetch_ms, self.decide_ms, self.send_ms, seq)
+            self.seq = seq
+        _NEXT_SEQ.pack_into(buf, _NEXT_SEQ_OFFSET, self.seq)
+        self._reset()
+
+    def close(self):
+        if self.map.closed:
+            return
+        if self.snapshot is not None:
+            self._write()
+        self.map.flush()
+        self.map.close()
+
+
+class NullFlightRecorder(object):
+    """Drop-in for FlightRecorder when it is off."""
+
+    def begin(self, snapshot, positions):
+        pass
+
+    def decided(self, quotes):
+        pass
+
+    def sent(self, report, cancelled=(), elapsed=None):
+        pass
+
+    def close(self):
+        pass
+
+
+# -- offline decoding ----------------------------------------------------------
+
+def read_ring(path):
+    """The records of a ring file as dicts, oldest first (torn slots skipped)."""
+    with open(path, 'rb') as f:
+        data = f.read()
+    magic, version, record_size, capacity, next_seq, started = HEADER.unpack_from(data, 0)
+    if magic != MAGIC:
+        raise ValueError('{} is not a flight recorder ring'.format(path))
+    if version != VERSION or record_size != RECORD.size:
+        raise ValueError('{} was written by another version (v{}, {}-byte records)'.format(
+            path, version, record_size))
+    records = []
+    for seq in range(max(1, next_seq - capacity + 1), next_seq + 1):
+        values = RECORD.unpack_from(data, HEADER.size + (seq % capacity) * RECORD.size)
+        if values[0] != seq or values[-1] != seq:
+            continue
+        row = dict(zip(FIELDS, values[:-1]))
+        row['ticker'] = row['ticker'].rstrip(b'\0').decode('utf-8')
+        row['time'] = started + row['at']
+        for name in ('bid', 'ask', 'quote_bid', 'quote_ask'):
+            if math.isnan(row[name]):
+                row[name] = None
+        flags = row['flags']
+        row['quoted'] = bool(flags & QUOTED)
+        row['allow_buy'] = bool(flags & ALLOW_BUY)
+        row['allow_sell'] = bool(flags & ALLOW_SELL)
+        records.append(row)
+    return records
+
+
+def to_dataframe(path):
+    """read_ring() as a pandas DataFrame."""
+    try:
+        import pandas as pd
+    except ImportError:
+        raise RuntimeError('to_dataframe() needs pandas; use write_csv() without it')
+    return pd.DataFrame(read_ring(path))
+
+
+def write_csv(path, out):
+    """Decode a ring file into CSV; out is a path or an open text file."""
+    records = read_ring(path)
+    columns = FIELDS[:1] + ('time',) + FIELDS[1:] + ('quoted', 'allow_buy', 'allow_sell')
+    close = False
+    if isinstance(out, str):
+        out = open(out, 'w', newline='')
+        close = True
+    try:
+        writer = csv.DictWriter(out, fieldnames=columns, extrasaction='ignore')
+        writer.writeheader()
+        writer.writerows(records)
+    finally:
+        if close:
+            out.close()
+    return len(records)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Decode a flight recorder ring file.')
+    parser.add_argument('ring', help='ring file written by FlightRecorder')
+    parser.add_argument('--csv', help='write the records here (default: stdout)')
+    args = parser.parse_args(argv)
+    count = write_csv(args.ring, args.csv or sys.stdout)
+    if args.csv:
+        print('{} records -> {}'.format(count, args.csv))
+
+
+if __name__ == '__main__':
+    main()
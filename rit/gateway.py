@@ -0,0 +1,197 @@
+# pipelined order submission: send now, learn the order ids later
+#
+# place_limit blocks on the POST and its response, and ActionBatch.flush()
+# waits for every cancel and placement of a batch, so the loop sat idle for
+# a round trip per requote. OrderGateway.send() hands the batch's cancels
+# and placements to its own thread pool and returns at once: both sides of
+# every quote go out together, while the loop goes back to waiting for the
+# next tick. Each placement is tracked under a provisional client id (a
+# negative number, which RIT never uses) from the moment it is sent, so the
+# next pass sees it as working and does not place it again.
+#
+# collect(), called before the next read, gathers what completed in the
+# meantime into a BatchReport, as flush() returned. It can wait for what is
+# still in flight first, which the loop does before every read: an order we
+# cancelled must not vanish from the open-orders list before we know we
+# cancelled it, and one that filled must not do so before we know its id,
+# or the position cache books it twice. The requests went out while the
+# loop was waiting for the next tick, so this wait is rarely felt. OrderTracker.
+# apply_batch() then moves each placed order from its client id to its
+# server order id, keeping its TTL start, and drops the ones that were
+# rejected; on_reject(request, message) is called for each of those. A
+# cancel decided for an order that has no server id yet is held back and
+# sent as soon as the id is known.
+import itertools
+import threading
+import time
+from collections import deque
+from concurrent import futures
+from concurrent.futures import ThreadPoolExecutor
+
+from rit.api import API_URL, check_auth, mount_pool
+from rit.batch import BatchReport
+from rit.cancel import default_router
+from rit.orders import is_provisional
+from rit.records import order_id_of, parse
+
+
+class OrderRejected(Exception):
+    """The exchange refused an order; the message is the client's reason."""
+
+
+def submit_order(session, ticker, side, quantity, price=None, type_='LIMIT'):
+    """POST one order and return its order id; raises OrderRejected.
+
+    A MARKET order (type_='MARKET') is sent without a price.
+    """
+    payload = {'ticker': ticker, 'type': type_, 'quantity': quantity, 'action': side}
+    if price is not None:
+        payload['price'] = price
+    resp = check_auth(session.post(API_URL + '/orders', params=payload))
+    try:
+        data = parse(resp)
+    except ValueError:
+        data = None
+    order_id = order_id_of(data) if resp.ok else None
+    if order_id is None:
+        message = data.get('message') if isinstance(data, dict) else None
+        raise OrderRejected(message or 'HTTP {}'.format(resp.status_code))
+    return order_id
+
+
+class OrderGateway(object):
+    """Fire-and-forget order sending with asynchronous order-id resolution.
+
+    place(session, ticker, side, qty, price) defaults to submit_order().
+    Use it as a context manager, or call close(), to wait for what is still
+    in flight and release the threads.
+    """
+
+    def __init__(self, session, tracker, place=submit_order, router=None, on_reject=None,
+                 max_workers=8):
+        self.session = session
+        self.tracker = tracker
+        self.place = place
+        self.router = router if router is not None else default_router
+        self.on_reject = on_reject
+        self.client_ids = itertools.count(-1, -1)
+        self.in_flight = {}          # client id -> PlaceRequest not resolved yet
+        self.cancel_on_resolve = set()  # client ids whose cancel waits for the server id
+        self.done = deque()          # (kind, payload) completions, appended by pool threads
+        self.futures = []            # requests in flight
+        self.latency = 0.0           # slowest round trip among the last collect()'s results
+        self.lock = threading.Lock()
+        self.sent = 0
+        self.rejected = 0
+        mount_pool(session, max_workers)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='gateway')
+
+    def send(self, batch, tick):
+        """Send everything in batch without waiting; returns the PlaceRequests sent."""
+        cancels = []
+        for order_id in batch.cancels:
+            if is_provisional(order_id):
+                self.cancel_on_resolve.add(order_id)
+            else:
+                cancels.append(order_id)
+        if cancels:
+            self._submit(self._cancel, cancels)
+        requests = list(batch.places.values())
+        tracker = self.tracker
+        for request in requests:
+            client_id = next(self.client_ids)
+            request.client_id = client_id
+            with self.lock:
+                self.in_flight[client_id] = request
+            tracker.record(client_id, request.ticker, request.side, request.quantity,
+                           request.price, tick)
+            self._submit(self._place, request)
+        batch.cancels = {}
+        batch.places = {}
+        self.sent += len(requests) + len(cancels)
+        return requests
+
+    def _submit(self, fn, arg):
+        self.futures.append(self.executor.submit(fn, arg))
+
+    def _cancel(self, order_ids):
+        started = time.perf_counter()
+        try:
+            cancelled = self.router.cancel_many(self.session, order_ids)
+        except Exception:  # reported as failed cancels, which force a reconcile
+            cancelled = []
+        self.done.append(('cancel', (order_ids, cancelled), time.perf_counter() - started))
+
+    def _place(self, request):
+        started = time.perf_counter()
+        error = None
+        try:
+            request.order_id = self.place(self.session, request.ticker, request.side,
+                                          request.quantity, request.price)
+            if request.order_id is None:
+                error = 'no order id in the response'
+        except OrderRejected as exc:
+            error = str(exc)
+        except Exception as exc:  # a bad key, a dropped connection and the like
+            error = repr(exc)
+        with self.lock:
+            self.in_flight.pop(request.client_id, None)
+        self.done.append(('place', (request, error), time.perf_counter() - started))
+
+    def collect(self, wait=False):
+        """What completed since the last call, as a BatchReport for apply_batch().
+
+        With wait, everything in flight is waited for first, including the
+        cancels of orders whose id only arrived with this call.
+        """
+        report = BatchReport([], [], [], [])
+        self.latency = 0.0
+        while True:
+            if wait and self.futures:
+                futures.wait(self.futures)
+            self.futures = [f for f in self.futures if not f.done()]
+            deferred = self._drain(report)
+            if deferred:
+                self._submit(self._cancel, deferred)
+                self.sent += len(deferred)
+            if not (wait and deferred):
+                return report
+
+    def _drain(self, report):
+        deferred = []
+        done = self.done
+        while done:
+            kind, payload, elapsed = done.popleft()
+            self.latency = max(self.latency, elapsed)
+            if kind == 'cancel':
+                report.requested_cancels.extend(payload[0])
+                report.cancelled.extend(payload[1])
+                continue
+            request, error = payload
+            if error is None:
+                report.placed.append(request)
+                if request.client_id in self.cancel_on_resolve:
+                    self.cancel_on_resolve.discard(request.client_id)
+                    deferred.append(request.order_id)
+                continue
+            self.cancel_on_resolve.discard(request.client_id)
+            report.failed_places.append(request)
+            self.rejected += 1
+            if self.on_reject is not None:
+                self.on_reject(request, error)
+        return deferred
+
+    @property
+    def pending(self):
+        with self.lock:
+            return len(self.in_flight)
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
@@ -0,0 +1,158 @@
+# the quoting decision as a pure function of one snapshot
+#
+# Each ALGO2 variant (the COMP script, New, TEST CODE ALGO2.py and
+# cancel-test) decided its quotes inline in main()'s while body, between the
+# HTTP calls that fed it, so the CPU cost of the strategy could not be told
+# apart from network time. The decision lives here instead, with no I/O and
+# no state of its own:
+#
+#   quote_ticker()  one ticker's Quote from its top of book, its position and
+#                   the portfolio gross/net: the pricing, sizing and limit
+#                   checks every variant shares. MultiTickerEngine.step()
+#                   calls it for each ticker it quotes.
+#   decide()        the single-book loop of New, TEST CODE ALGO2.py and
+#                   cancel-test: quote the widest book and return the
+#                   cancels and placements that bring our open orders to
+#                   that quote (one order per side, TTL expiry, REQUOTE_TOL,
+#                   orders on other tickers pulled). rit.replay backtests
+#                   the COMP script's MultiTickerEngine instead.
+#
+# The scripts keep the reads before it and the sends after it. rit.bench
+# times both kernels on synthetic and recorded snapshots.
+from rit.batch import PlaceRequest
+from rit.book import raw_liquidity
+from rit.quoting import compute_quote
+from rit.reconcile import GRID_EPS
+
+BUY = 'BUY'
+SELL = 'SELL'
+
+
+class Decision(object):
+    """What decide() wants done: order ids to cancel and PlaceRequests to send."""
+
+    __slots__ = ('tick', 'ticker', 'quote', 'cancels', 'places')
+
+    def __init__(self, tick, ticker=None, quote=None):
+        self.tick = tick
+        self.ticker = ticker  # the book quoted, None when none is wide enough
+        self.quote = quote    # None when there was no room to quote it
+        self.cancels = []
+        self.places = []
+
+    def into(self, batch):
+        """Queue the decision on an ActionBatch."""
+        for order_id in self.cancels:
+            batch.cancel(order_id)
+        for p in self.places:
+            batch.place(p.ticker, p.side, p.quantity, p.price)
+        return batch
+
+    def __len__(self):
+        return len(self.cancels) + len(self.places)
+
+    def __repr__(self):
+        return 'Decision(tick={} {} cancel {} place {})'.format(
+            self.tick, self.ticker, self.cancels, self.places)
+
+
+def quote_ticker(params, ticker, top, position, gross_pos, net_pos, liquidity=None,
+                 estimate=None, volume_scale=1.0):
+    """compute_quote() for one book top (best_bid, best_ask, bid_size, ask_size)."""
+    best_bid, best_ask, bid_size, ask_size = top
+    choice = {
+        'ticker': ticker,
+        'best_bid': best_bid,
+        'best_ask': best_ask,
+        'bid_size': bid_size,
+        'ask_size': ask_size,
+        'spread': best_ask - best_bid,
+    }
+    if liquidity is not None:
+        choice['liquidity'] = liquidity
+    if estimate is not None:
+        choice['estimate'] = estimate
+    return compute_quote(params, choice, position, gross_pos, net_pos, volume_scale)
+
+
+def widest(tops, min_spread):
+    """The ticker with the widest book at least min_spread wide, or None."""
+    best = None
+    best_spread = None
+    for ticker, top in tops.items():
+        best_bid, best_ask = top[0], top[1]
+        if best_bid is None or best_ask is None or best_ask <= best_bid:
+            continue
+        spread = best_ask - best_bid
+        if spread >= min_spread and (best is None or spread > best_spread):
+            best = ticker
+            best_spread = spread
+    return best
+
+
+def decide(params, tick, tops, positions, orders, volume_scale=1.0, books=None,
+           depth_levels=None):
+    """Quote the widest book and diff our open orders against it.
+
+    tops maps ticker -> (best_bid, best_ask, bid_size, ask_size), positions
+    ticker -> position, and orders are our open orders as objects with
+    order_id, ticker, side, price and tick (when the order was placed or
+    first seen), such as rit.orders.TrackedOrder. With depth_levels, books
+    (ticker -> raw book JSON) size off depth-weighted liquidity. Nothing
+    passed in is modified.
+    """
+    ticker = widest(tops, params.min_market_spread)
+    if ticker is None:
+        return Decision(tick)
+    liquidity = None
+    if depth_levels and books is not None:
+        liquidity = raw_liquidity(books[ticker], depth_levels)
+    gross = 0
+    net = 0
+    for p in positions.values():
+        gross += abs(p)
+        net += p
+    quote = quote_ticker(params, ticker, tops[ticker], positions.get(ticker, 0), gross, net,
+                         liquidity, volume_scale=volume_scale)
+    decision = Decision(tick, ticker, quote)
+    if quote is None:
+        return decision
+
+    # orders on other tickers and past their TTL go; of the rest, the best
+    # priced order per side is kept and any others are cancelled
+    cancels = decision.cancels
+    ttl = params.order_ttl_ticks
+    bid = None
+    ask = None
+    for o in orders:
+        if o.ticker != ticker or (tick - o.tick) >= ttl:
+            cancels.append(o.order_id)
+        elif o.side == BUY:
+            if bid is None:
+                bid = o
+            elif o.price > bid.price:
+                cancels.append(bid.order_id)
+                bid = o
+            else:
+                cancels.append(o.order_id)
+        else:
+            if ask is None:
+                ask = o
+            elif o.price < ask.price:
+                cancels.append(ask.order_id)
+                ask = o
+            else:
+                cancels.append(o.order_id)
+
+    # replace a side only once its price is REQUOTE_TOL off the quote
+    places = decision.places
+    for side, current, allowed, price, quantity in (
+            (BUY, bid, quote.allow_buy, quote.bid, quote.buy_qty),
+            (SELL, ask, quote.allow_sell, quote.ask, quote.sell_qty)):
+        if current is not None:
+            if allowed and abs(current.price - price) < params.requote_tol - GRID_EPS:
+                continue
+            cancels.append(current.order_id)
+        if allowed:
+            places.append(PlaceRequest(ticker, side, quantity, price))
+    return decision
@@ -0,0 +1,225 @@
+# in-process P&L, inventory and fill-quality ledger
+#
+# Nothing in the scripts knew how a session was going: realized and
+# unrealized P&L, average entry price and spread captured were only visible
+# in the RIT UI afterwards. Ledger is fed the fills rit.tas.FillFeed finds
+# (subscribe ledger.on_fill) and the top of book of every snapshot
+# (ledger.mark), so it needs no API calls of its own. Per ticker it keeps:
+#
+#   position, avg_cost   average-cost inventory; a fill that reduces the
+#                        position realizes (price - avg_cost) on the part it
+#                        closes, one that flips it starts a new average
+#   realized/unrealized  unrealized is marked to the latest mid
+#   edge                 quantity-weighted (mid - price) for buys and
+#                        (price - mid) for sells, mid being the last mark
+#                        before the fill, i.e. the book our quote rested in
+#   adverse              how far the mid moved against each fill
+#                        adverse_ticks ticks later, quantity-weighted
+#
+# on_fill() and the per-ticker queries are O(1); mark() is O(1) per ticker
+# plus the fills whose markout falls due. P&L is before fees and rebates.
+import csv
+import json
+import os
+from collections import deque
+
+BUY = 'BUY'
+
+
+class TickerLedger(object):
+    __slots__ = ('ticker', 'position', 'avg_cost', 'realized', 'mid', 'bought', 'sold',
+                 'edge_value', 'adverse_value', 'adverse_qty', 'pending')
+
+    def __init__(self, ticker):
+        self.ticker = ticker
+        self.position = 0
+        self.avg_cost = 0.0
+        self.realized = 0.0
+        self.mid = None
+        self.bought = 0
+        self.sold = 0
+        self.edge_value = 0.0     # sum of edge * quantity
+        self.adverse_value = 0.0  # sum of adverse move * quantity, over matured fills
+        self.adverse_qty = 0
+        self.pending = deque()    # fill rows waiting for their markout, due tick order
+
+    def fill(self, sign, quantity, price):
+        """Fold a fill into the average-cost inventory; sign is +1 buy, -1 sell."""
+        position = self.position
+        if position == 0 or (position > 0) == (sign > 0):
+            size = abs(position)
+            self.avg_cost = (self.avg_cost * size + price * quantity) / (size + quantity)
+            self.position = position + sign * quantity
+            return
+        closed = min(quantity, abs(position))
+        # long positions gain when sold above cost, shorts when bought below it
+        self.realized += (price - self.avg_cost) * closed * (1 if position > 0 else -1)
+        self.position = position + sign * quantity
+        if quantity > closed:
+            self.avg_cost = price  # flipped through zero
+        elif self.position == 0:
+            self.avg_cost = 0.0
+
+    @property
+    def unrealized(self):
+        if not self.position or self.mid is None:
+            return 0.0
+        return (self.mid - self.avg_cost) * self.position
+
+    @property
+    def pnl(self):
+        return self.realized + self.unrealized
+
+    @property
+    def volume(self):
+        return self.bought + self.sold
+
+    @property
+    def edge(self):
+        """Average edge per share captured against mid at fill time."""
+        return self.edge_value / self.volume if self.volume else 0.0
+
+    @property
+    def adverse(self):
+        """Average mid move against our fills, per share, once they matured."""
+        return self.adverse_value / self.adverse_qty if self.adverse_qty else 0.0
+
+    def to_json(self):
+        return {
+            'ticker': self.ticker,
+            'position': self.position,
+            'avg_cost': round(self.avg_cost, 6),
+            'realized': round(self.realized, 2),
+            'unrealized': round(self.unrealized, 2),
+            'pnl': round(self.pnl, 2),
+            'mid': self.mid,
+            'bought': self.bought,
+            'sold': self.sold,
+            'edge': round(self.edge, 6),
+            'adverse': round(self.adverse, 6),
+        }
+
+
+class Ledger(object):
+    """Per-ticker P&L and fill quality, updated from fills and snapshot marks.
+
+    adverse_ticks is how many ticks after a fill its markout is taken. Every
+    fill is also kept as a row (with edge and markout) for export.
+    """
+
+    FILL_FIELDS = ('order_id', 'ticker', 'side', 'quantity', 'price', 'tick', 'mid',
+                   'edge', 'markout_mid', 'adverse')
+
+    def __init__(self, tickers=(), adverse_ticks=5):
+        self.adverse_ticks = adverse_ticks
+        self.tickers = {t: TickerLedger(t) for t in tickers}
+        self.rows = []
+        self.tick = 0
+
+    def _ticker(self, ticker):
+        state = self.tickers.get(ticker)
+        if state is None:
+            state = self.tickers[ticker] = TickerLedger(ticker)
+        return state
+
+    # -- updates ---------------------------------------------------------------
+
+    def on_fill(self, fill):
+        """FillFeed subscriber: book one rit.tas.Fill."""
+        state = self._ticker(fill.ticker)
+        sign = 1 if fill.side == BUY else -1
+        quantity = fill.quantity
+        price = fill.price
+        state.fill(sign, quantity, price)
+        if sign > 0:
+            state.bought += quantity
+        else:
+            state.sold += quantity
+        mid = state.mid
+        edge = None
+        if mid is not None:
+            edge = (mid - price) * sign
+            state.edge_value += edge * quantity
+        row = {'order_id': fill.order_id, 'ticker': fill.ticker, 'side': fill.side,
+               'quantity': quantity, 'price': price, 'tick': fill.tick, 'mid': mid,
+               'edge': edge, 'markout_mid': None, 'adverse': None}
+        self.rows.append(row)
+        if mid is not None:
+            state.pending.append((fill.tick + self.adverse_ticks, sign, row))
+
+    def mark(self, tick, tops):
+        """Mark every ticker to its mid from a snapshot's tops and mature markouts."""
+        self.tick = tick
+        for ticker, (best_bid, best_ask, _, _) in tops.items():
+            if best_bid is None or best_ask is None:
+                continue
+            state = self._ticker(ticker)
+            mid = 0.5 * (best_bid + best_ask)
+            state.mid = mid
+            pending = state.pending
+            while pending and pending[0][0] <= tick:
+                _, sign, row = pending.popleft()
+                adverse = (row['mid'] - mid) * sign  # mid moved against the side we took
+                row['markout_mid'] = mid
+                row['adverse'] = adverse
+                state.adverse_value += adverse * row['quantity']
+                state.adverse_qty += row['quantity']
+
+    # -- queries ---------------------------------------------------------------
+
+    def position(self, ticker):
+        state = self.tickers.get(ticker)
+        return state.position if state is not None else 0
+
+    def avg_cost(self, ticker):
+        state = self.tickers.get(ticker)
+        return state.avg_cost if state is not None else 0.0
+
+    def pnl(self, ticker=None):
+        """Realized plus unrealized P&L of one ticker, or of all of them."""
+        if ticker is not None:
+            state = self.tickers.get(ticker)
+            return state.pnl if state is not None else 0.0
+        return sum(state.pnl for state in self.tickers.values())
+
+    def realized(self, ticker=None):
+        if ticker is not None:
+            state = self.tickers.get(ticker)
+            return state.realized if state is not None else 0.0
+        return sum(state.realized for state in self.tickers.values())
+
+    def unrealized(self, ticker=None):
+        if ticker is not None:
+            state = self.tickers.get(ticker)
+            return state.unrealized if state is not None else 0.0
+        return sum(state.unrealized for state in self.tickers.values())
+
+    def summary(self):
+        """{ticker: per-ticker figures} plus a 'total' entry."""
+        result = {t: state.to_json() for t, state in sorted(self.tickers.items())}
+        result['total'] = {
+            'realized': round(self.realized(), 2),
+            'unrealized': round(self.unrealized(), 2),
+            'pnl': round(self.pnl(), 2),
+            'fills': len(self.rows),
+        }
+        return result
+
+    # -- export ----------------------------------------------------------------
+
+    def write(self, path):
+        """Write the summary and every fill as JSON (or the fills as CSV for a .csv path)."""
+        tmp = path + '.tmp'
+        with open(tmp, 'w', newline='') as f:
+            if path.endswith('.csv'):
+                writer = csv.DictWriter(f, fieldnames=self.FILL_FIELDS)
+                writer.writeheader()
+                writer.writerows(self.rows)
+            else:
+                json.dump({'tick': self.tick, 'summary': self.summary(), 'fills': self.rows},
+                          f, indent=1)
+        os.replace(tmp, path)
+
+    def __repr__(self):
+        return 'Ledger(pnl={:.2f}, realized={:.2f}, fills={})'.format(
+            self.pnl(), self.realized(), len(self.rows))
@@ -0,0 +1,210 @@
+# session lifecycle: waiting for the case, periods and heats, the closing flatten
+#
+# main() read the tick once and returned unless it was past 5, so a script
+# started before the case ran did nothing, and a running one stopped quoting
+# at tick 295 with its inventory and resting orders left to the close-out.
+# Lifecycle follows /v1/case instead:
+#
+#   wait_for_open()  polls the case until there is something to quote,
+#                    backing off up to max_backoff seconds while the client
+#                    is unreachable or the case is stopped or paused, and up
+#                    to max_poll while it runs (the first ticks, or the rest
+#                    of a period already flattened)
+#   phase(case)      WAITING, TRADING or CLOSING; the first open_tick ticks
+#                    of a period are WAITING, the last close_ticks CLOSING
+#   rolled_over()    True once after every new period or heat (the case
+#                    stopped and started again, or its clock went back), when
+#                    nothing cached from before holds any more
+#
+# Flattener works the inventory out in the closing ticks. One cancel clears
+# our resting orders (a bulk cancel-all, or one per ticker for a worker that
+# shares the case). Then each tick costs one case and positions read, issued
+# concurrently. Every ticker that is not flat gets market orders for an even
+# share of what is left over the ticks remaining, or everything on the last
+# tick. All tickers and all max-trade-size slices are sent concurrently.
+import time
+
+import requests
+
+from rit.cancel import default_router
+from rit.gateway import OrderRejected, submit_order
+from rit.snapshot import read_case, read_securities
+
+ACTIVE = 'ACTIVE'
+PAUSED = 'PAUSED'
+BUY = 'BUY'
+SELL = 'SELL'
+MARKET = 'MARKET'
+
+WAITING = 'WAITING'
+TRADING = 'TRADING'
+CLOSING = 'CLOSING'
+
+
+def running(case):
+    # a client that does not report a status is taken to be running
+    return case.status in (ACTIVE, None)
+
+
+class Lifecycle(object):
+    """Where the case is in its heats and periods, and whether to quote.
+
+    max_heats stops the session after that many heats (None: wait for the
+    next heat until stopped).
+    """
+
+    def __init__(self, open_tick=5, close_ticks=5, max_heats=None, min_backoff=0.05,
+                 max_backoff=2.0, max_poll=0.5):
+        self.open_tick = open_tick
+        self.close_ticks = close_ticks
+        self.max_heats = max_heats
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.max_poll = max(min_backoff, max_poll)
+        self.heat = 0
+        self.period = None
+        self.tick = None
+        self.interrupted = False  # the case was seen stopped since it last ran
+        self.rolled = False
+        self.closed = None        # (heat, period) already flattened
+        self.done = False
+        self.waits = 0
+
+    def observe(self, case):
+        """Follow the case clock; returns True when a new period or heat began."""
+        if not running(case):
+            if case.status != PAUSED:
+                self.interrupted = True
+            return False
+        new = False
+        if (self.period is None or self.interrupted or case.period < self.period
+                or (case.period == self.period and case.tick < self.tick)):
+            self.heat += 1
+            new = True
+        elif case.period > self.period:
+            new = True
+        self.interrupted = False
+        self.period = case.period
+        self.tick = case.tick
+        if new:
+            self.rolled = True
+        return new
+
+    def rolled_over(self):
+        """True once after each new period or heat observed."""
+        rolled = self.rolled
+        self.rolled = False
+        return rolled
+
+    def phase(self, case):
+        self.observe(case)
+        if not running(case) or case.tick <= self.open_tick:
+            return WAITING
+        if self.closed == (self.heat, case.period):
+            return WAITING
+        if case.ticks_per_period and case.tick >= case.ticks_per_period - self.close_ticks:
+            return CLOSING
+        return TRADING
+
+    def flattened(self, case):
+        """The period of this case state has been closed out."""
+        self.closed = (self.heat, case.period)
+        last_period = not case.total_periods or case.period >= case.total_periods
+        if last_period and self.max_heats is not None and self.heat >= self.max_heats:
+            self.done = True
+
+    def wait_for_open(self, session, stopping=None):
+        """Poll the case until it is TRADING; returns that CaseState.
+
+        Returns None when stopping() turns true or the last heat is over.
+        """
+        delay = self.min_backoff
+        while not self.done and not (stopping is not None and stopping()):
+            try:
+                case = read_case(session)
+            except requests.RequestException:
+                case = None  # the RIT client is not up yet
+            if case is not None:
+                if self.phase(case) == TRADING:
+                    return case
+                if (self.interrupted and self.max_heats is not None
+                        and self.heat >= self.max_heats):
+                    break  # the last heat ended before we could flatten it
+            self.waits += 1
+            time.sleep(delay)
+            cap = self.max_poll if case is not None and running(case) else self.max_backoff
+            delay = min(delay * 2, cap)
+        return None
+
+
+class Flattener(object):
+    """Close out our positions in the last ticks of a period.
+
+    With cancel_all every open order is cancelled in one request (the
+    process owns every ticker); otherwise only the orders on tickers are.
+    static (rit.static.StaticData) splits orders under the max trade size.
+    wait() is called between ticks.
+    """
+
+    def __init__(self, session, tickers, executor, static=None, router=None, cancel_all=True,
+                 wait=None, poll=0.1):
+        self.session = session
+        self.tickers = list(tickers)
+        self.executor = executor
+        self.static = static
+        self.router = router if router is not None else default_router
+        self.cancel_all = cancel_all
+        self.wait = wait if wait is not None else (lambda: time.sleep(poll))
+        self.orders = 0
+        self.rejected = 0
+
+    def cancel(self):
+        session = self.session
+        if self.cancel_all:
+            return self.router.cancel_all(session)
+        jobs = [self.executor.submit(self.router.cancel_ticker, session, t) for t in self.tickers]
+        return [order_id for job in jobs for order_id in job.result()]
+
+    def run(self, deadline, stopping=None):
+        """Flatten by tick `deadline` of the current period.
+
+        Returns {ticker: position} of what is left (empty when flat), which
+        is not empty only when the period ended or stopping() turned true.
+        """
+        self.cancel()
+        session = self.session
+        submit = self.executor.submit
+        period = None
+        sent_at = None
+        while True:
+            case_job = submit(read_case, session)
+            securities = submit(read_securities, session).result()
+            case = case_job.result()
+            left = {s.ticker: s.position for s in securities
+                    if s.position and s.ticker in self.tickers}
+            if period is None:
+                period = case.period
+            if (not left or not running(case) or case.period != period
+                    or (stopping is not None and stopping())):
+                return left
+            if case.tick != sent_at:
+                # positions read in the tick we sent in may predate our fills
+                self._send(left, max(1, deadline - case.tick + 1))
+                sent_at = case.tick
+            self.wait()
+
+    def _send(self, left, ticks):
+        jobs = []
+        for ticker, position in left.items():
+            quantity = -(-abs(position) // ticks)
+            side = SELL if position > 0 else BUY
+            sizes = self.static.split(ticker, quantity) if self.static is not None else [quantity]
+            for size in sizes:
+                jobs.append(self.executor.submit(submit_order, self.session, ticker, side, size,
+                                                  type_=MARKET))
+        for job in jobs:
+            try:
+                job.result()
+                self.orders += 1
+            except (OrderRejected, requests.RequestException):
+                self.rejected += 1  # the next tick sends what is left again
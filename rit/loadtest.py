@@ -0,0 +1,104 @@
+# loop latency / throughput benchmark against the offline RIT stand-in
+#
+#   python -m rit.loadtest --latency-ms 5 --tickers ALGO,BETA --loops 200
+#
+# Starts an in-process stand-in on the port that rit.api.API_URL points at
+# (9999 unless RIT_API_URL says otherwise) and reports:
+#   * serial vs. concurrent snapshot reads (ms per iteration)
+#   * order placement + cancel throughput through ActionBatch
+import argparse
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import requests
+
+from rit.api import API_URL, check_auth
+from rit.batch import ActionBatch
+from rit.server import DEFAULT_API_KEY, StandIn, serve, stop
+from rit.snapshot import SnapshotFetcher, read_book, read_case, read_orders, read_securities
+
+
+def place_limit(session, ticker, side, qty, price):
+    payload = {'ticker': ticker, 'type': 'LIMIT', 'quantity': qty, 'action': side, 'price': price}
+    data = check_auth(session.post(API_URL + '/orders', params=payload)).json()
+    return data.get('order_id') if isinstance(data, dict) else None
+
+
+def _summary(samples):
+    samples = sorted(samples)
+    p95 = samples[min(len(samples) - 1, int(0.95 * len(samples)))]
+    return 'mean {:7.2f} ms   p50 {:7.2f} ms   p95 {:7.2f} ms'.format(
+        1000 * statistics.mean(samples), 1000 * statistics.median(samples), 1000 * p95)
+
+
+def bench_reads(session, tickers, loops):
+    serial = []
+    for _ in range(loops):
+        started = time.perf_counter()
+        for ticker in tickers:
+            read_book(session, ticker)
+        read_securities(session)
+        read_orders(session, 'OPEN')
+        read_case(session)
+        serial.append(time.perf_counter() - started)
+
+    concurrent = []
+    with SnapshotFetcher(session, tickers) as fetcher:
+        for _ in range(loops):
+            started = time.perf_counter()
+            fetcher.fetch()
+            concurrent.append(time.perf_counter() - started)
+    return serial, concurrent
+
+
+def bench_orders(session, ticker, loops, executor):
+    elapsed = []
+    messages = 0
+    live = []
+    for i in range(loops):
+        batch = ActionBatch()
+        for order_id in live:
+            batch.cancel(order_id)
+        batch.place(ticker, 'BUY', 100, 9.0 - 0.01 * (i % 10))
+        batch.place(ticker, 'SELL', 100, 11.0 + 0.01 * (i % 10))
+        messages += len(batch)
+        started = time.perf_counter()
+        report = batch.flush(session, place_limit, executor)
+        elapsed.append(time.perf_counter() - started)
+        live = [p.order_id for p in report.placed]
+    return elapsed, messages
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the ALGO2 loop against the RIT stand-in.')
+    parser.add_argument('--tickers', default='ALGO')
+    parser.add_argument('--loops', type=int, default=100)
+    parser.add_argument('--latency-ms', type=float, default=2.0)
+    parser.add_argument('--jitter-ms', type=float, default=0.0)
+    args = parser.parse_args(argv)
+
+    tickers = [t.strip() for t in args.tickers.split(',') if t.strip()]
+    url = urlsplit(API_URL)
+    standin = StandIn(tickers=tickers, latency=args.latency_ms / 1000.0,
+                      jitter=args.jitter_ms / 1000.0, seed=1)
+    server = serve(standin, url.hostname, url.port or 80, run_clock=False)
+    try:
+        with requests.Session() as session, ThreadPoolExecutor(max_workers=8) as executor:
+            session.headers.update({'X-API-Key': DEFAULT_API_KEY})
+            serial, concurrent = bench_reads(session, tickers, args.loops)
+            print('snapshot reads, {} ticker(s), {} loops'.format(len(tickers), args.loops))
+            print('  serial     ' + _summary(serial))
+            print('  concurrent ' + _summary(concurrent))
+            elapsed, messages = bench_orders(session, tickers[0], args.loops, executor)
+            total = sum(elapsed)
+            print('order batches (cancel previous pair + place new pair)')
+            print('  per batch  ' + _summary(elapsed))
+            print('  throughput {:7.1f} messages/s'.format(messages / total if total else 0.0))
+    finally:
+        stop(server)
+
+
+if __name__ == '__main__':
+    main()
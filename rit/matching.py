@@ -0,0 +1,290 @@
+# price-time-priority limit order book used by the offline RIT stand-in
+#
+# This is deliberately small: one book per ticker, LIMIT and MARKET orders,
+# partial fills, cancels, and per-trader position/cash accounting good enough
+# to fill in the fields of /v1/securities that the ALGO2 scripts read.
+import bisect
+import itertools
+from collections import deque
+
+BUY = 'BUY'
+SELL = 'SELL'
+LIMIT = 'LIMIT'
+MARKET = 'MARKET'
+
+OPEN = 'OPEN'
+TRANSACTED = 'TRANSACTED'
+CANCELLED = 'CANCELLED'
+
+
+class SimOrder(object):
+    __slots__ = ('order_id', 'period', 'tick', 'trader_id', 'ticker', 'type', 'quantity',
+                 'action', 'price', 'quantity_filled', 'notional', 'status')
+
+    def __init__(self, order_id, period, tick, trader_id, ticker, type_, quantity, action, price):
+        self.order_id = order_id
+        self.period = period
+        self.tick = tick
+        self.trader_id = trader_id
+        self.ticker = ticker
+        self.type = type_
+        self.quantity = quantity
+        self.action = action
+        self.price = price
+        self.quantity_filled = 0
+        self.notional = 0.0
+        self.status = OPEN
+
+    @property
+    def remaining(self):
+        return self.quantity - self.quantity_filled
+
+    def to_json(self):
+        filled = self.quantity_filled
+        return {
+            'order_id': self.order_id,
+            'period': self.period,
+            'tick': self.tick,
+            'trader_id': self.trader_id,
+            'ticker': self.ticker,
+            'type': self.type,
+            'quantity': self.quantity,
+            'action': self.action,
+            'price': self.price,
+            'quantity_filled': filled,
+            'vwap': (self.notional / filled) if filled else None,
+            'status': self.status,
+        }
+
+
+class Fill(object):
+    __slots__ = ('fill_id', 'period', 'tick', 'ticker', 'price', 'quantity', 'buy', 'sell')
+
+    def __init__(self, fill_id, period, tick, ticker, price, quantity, buy, sell):
+        self.fill_id = fill_id
+        self.period = period
+        self.tick = tick
+        self.ticker = ticker
+        self.price = price
+        self.quantity = quantity
+        self.buy = buy    # resting or incoming buy order
+        self.sell = sell
+
+    def to_json(self):
+        return {'id': self.fill_id, 'period': self.period, 'tick': self.tick,
+                'price': self.price, 'quantity': self.quantity}
+
+
+class OrderBook(object):
+    """Resting orders for one ticker, best price first and FIFO within a price.
+
+    Bid prices are stored negated so both sides keep an ascending price list
+    for bisect.
+    """
+
+    def __init__(self, ticker):
+        self.ticker = ticker
+        self.levels = {BUY: {}, SELL: {}}   # side -> key -> deque of orders
+        self.keys = {BUY: [], SELL: []}     # side -> sorted keys, best first
+
+    @staticmethod
+    def _key(side, price):
+        return -price if side == BUY else price
+
+    def rest(self, order):
+        side = order.action
+        key = self._key(side, order.price)
+        level = self.levels[side].get(key)
+        if level is None:
+            level = self.levels[side][key] = deque()
+            bisect.insort(self.keys[side], key)
+        level.append(order)
+
+    def remove(self, order):
+        side = order.action
+        key = self._key(side, order.price)
+        level = self.levels[side].get(key)
+        if level is None:
+            return False
+        try:
+            level.remove(order)
+        except ValueError:
+            return False
+        if not level:
+            self._drop_level(side, key)
+        return True
+
+    def _drop_level(self, side, key):
+        del self.levels[side][key]
+        keys = self.keys[side]
+        keys.pop(bisect.bisect_left(keys, key))
+
+    def best(self, side):
+        keys = self.keys[side]
+        if not keys:
+            return None
+        return self.levels[side][keys[0]][0]
+
+    def best_price(self, side):
+        order = self.best(side)
+        return order.price if order is not None else None
+
+    def orders(self, side, limit=None):
+        """Resting orders on one side in priority order."""
+        result = []
+        for key in self.keys[side]:
+            for order in self.levels[side][key]:
+                result.append(order)
+                if limit is not None and len(result) >= limit:
+                    return result
+        return result
+
+    def match(self, incoming, on_fill):
+        """Match an incoming order against the opposite side.
+
+        on_fill(resting, price, quantity) is called for every execution; the
+        resting order's price is the execution price.
+        """
+        side = SELL if incoming.action == BUY else BUY
+        keys = self.keys[side]
+        levels = self.levels[side]
+        while incoming.remaining > 0 and keys:
+            key = keys[0]
+            level = levels[key]
+            resting = level[0]
+            if incoming.type == LIMIT:
+                if incoming.action == BUY and resting.price > incoming.price:
+                    break
+                if incoming.action == SELL and resting.price < incoming.price:
+                    break
+            quantity = min(incoming.remaining, resting.remaining)
+            on_fill(resting, resting.price, quantity)
+            if resting.remaining <= 0:
+                level.popleft()
+                if not level:
+                    self._drop_level(side, key)
+
+
+class Account(object):
+    __slots__ = ('positions', 'cash', 'fees', 'volume')
+
+    def __init__(self):
+        self.positions = {}
+        self.cash = 0.0
+        self.fees = 0.0
+        self.volume = {}
+
+
+class MatchingEngine(object):
+    """All books of the stand-in plus per-trader accounts and the tape.
+
+    Prices are snapped to price_increment on entry, which is what the real
+    client does with quoted_decimals.
+    """
+
+    def __init__(self, tickers, price_increment=0.01, trading_fee=0.0, limit_order_rebate=0.0):
+        self.books = {t: OrderBook(t) for t in tickers}
+        self.orders = {}
+        self.resting = {}  # trader_id -> {order_id: order} for orders on a book
+        self.accounts = {}
+        self.fills = []
+        self.last = {t: None for t in tickers}
+        self.price_increment = price_increment
+        self.trading_fee = trading_fee
+        self.limit_order_rebate = limit_order_rebate
+        self.period = 1
+        self.tick = 0
+        self._ids = itertools.count(1)
+        self._fill_ids = itertools.count(1)
+
+    def account(self, trader_id):
+        account = self.accounts.get(trader_id)
+        if account is None:
+            account = self.accounts[trader_id] = Account()
+        return account
+
+    def snap(self, price):
+        inc = self.price_increment
+        return round(round(price / inc) * inc, 10)
+
+    def submit(self, trader_id, ticker, action, type_, quantity, price=None):
+        """Enter an order; returns the SimOrder (status shows what became of it)."""
+        if ticker not in self.books:
+            raise ValueError('Unknown ticker {}'.format(ticker))
+        if action not in (BUY, SELL):
+            raise ValueError('Invalid action {}'.format(action))
+        if type_ not in (LIMIT, MARKET):
+            raise ValueError('Invalid order type {}'.format(type_))
+        quantity = int(quantity)
+        if quantity <= 0:
+            raise ValueError('Quantity must be positive')
+        if type_ == LIMIT:
+            if price is None:
+                raise ValueError('LIMIT orders need a price')
+            price = self.snap(float(price))
+        order = SimOrder(next(self._ids), self.period, self.tick, trader_id, ticker,
+                         type_, quantity, action, price)
+        self.orders[order.order_id] = order
+        book = self.books[ticker]
+
+        def on_fill(resting, fill_price, fill_quantity):
+            self._execute(order, resting, fill_price, fill_quantity)
+
+        book.match(order, on_fill)
+        if order.remaining <= 0:
+            order.status = TRANSACTED
+        elif type_ == LIMIT:
+            book.rest(order)
+            self.resting.setdefault(trader_id, {})[order.order_id] = order
+        else:
+            # a market order never rests; whatever did not trade is cancelled
+            order.status = CANCELLED if order.quantity_filled == 0 else TRANSACTED
+        return order
+
+    def _execute(self, incoming, resting, price, quantity):
+        for order in (incoming, resting):
+            order.quantity_filled += quantity
+            order.notional += price * quantity
+            if order.remaining <= 0:
+                order.status = TRANSACTED
+                self.resting.get(order.trader_id, {}).pop(order.order_id, None)
+            account = self.account(order.trader_id)
+            signed = quantity if order.action == BUY else -quantity
+            account.positions[order.ticker] = account.positions.get(order.ticker, 0) + signed
+            account.cash -= signed * price
+            account.volume[order.ticker] = account.volume.get(order.ticker, 0) + quantity
+            fee = (self.trading_fee * quantity if order is incoming
+                   else -self.limit_order_rebate * quantity)
+            account.fees += fee
+            account.cash -= fee
+        buy, sell = (incoming, resting) if incoming.action == BUY else (resting, incoming)
+        self.fills.append(Fill(next(self._fill_ids), self.period, self.tick, incoming.ticker,
+                               price, quantity, buy, sell))
+        self.last[incoming.ticker] = price
+
+    def cancel(self, order_id, trader_id=None):
+        order = self.orders.get(order_id)
+        if order is None or order.status != OPEN:
+            return False
+        if trader_id is not None and order.trader_id != trader_id:
+            return False
+        self.books[order.ticker].remove(order)
+        self.resting.get(order.trader_id, {}).pop(order_id, None)
+        order.status = CANCELLED
+        return True
+
+    def open_orders(self, trader_id, ticker=None):
+        return [o for o in self.resting.get(trader_id, {}).values()
+                if ticker is None or o.ticker == ticker]
+
+    def orders_for(self, trader_id, status=None):
+        return [o for o in self.orders.values()
+                if o.trader_id == trader_id and (status is None or o.status == status)]
+
+    def mid(self, ticker):
+        book = self.books[ticker]
+        bid = book.best_price(BUY)
+        ask = book.best_price(SELL)
+        if bid is not None and ask is not None:
+            return 0.5 * (bid + ask)
+        return self.last[ticker]
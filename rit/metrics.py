@@ -0,0 +1,253 @@
+# per-endpoint latency and loop-phase instrumentation
+#
+# Metrics keeps a small rolling window of samples per timer (percentiles are
+# only computed when someone asks for them), cumulative counts/sums, and
+# plain counters for request/error/status codes. instrument_session() wraps a
+# requests.Session so every REST call is timed by endpoint. The loop marks its
+# phases with begin_loop()/lap(), which also yields requests per loop.
+#
+# NullMetrics has the same interface and does nothing, so the instrumented
+# loop costs a few no-op method calls when metrics are off.
+#
+# Output is Prometheus text format, either written to a file periodically
+# (MetricsDumper) or served on http://host:port/metrics (serve_metrics).
+import os
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+_ID_SEGMENT = re.compile(r'/\d+(?=/|$)')
+
+
+def endpoint_name(method, url):
+    """'GET', 'http://host/v1/orders/123' -> 'GET /v1/orders/{id}'."""
+    return '{} {}'.format(method.upper(), _ID_SEGMENT.sub('/{id}', urlsplit(url).path))
+
+
+class RollingHistogram(object):
+    """The last `size` samples plus lifetime count and sum."""
+
+    __slots__ = ('samples', 'size', 'index', 'count', 'total')
+
+    def __init__(self, size=2048):
+        self.samples = [0.0] * size
+        self.size = size
+        self.index = 0
+        self.count = 0
+        self.total = 0.0
+
+    def record(self, value):
+        self.samples[self.index] = value
+        self.index = (self.index + 1) % self.size
+        self.count += 1
+        self.total += value
+
+    def window(self):
+        return self.samples[:self.count] if self.count < self.size else list(self.samples)
+
+    def percentiles(self, qs=(0.5, 0.95, 0.99)):
+        data = sorted(self.window())
+        if not data:
+            return {q: 0.0 for q in qs}
+        last = len(data) - 1
+        return {q: data[min(last, int(round(q * last)))] for q in qs}
+
+
+class Metrics(object):
+    """Timers (rolling histograms) and counters keyed by (name, labels)."""
+
+    enabled = True
+
+    def __init__(self, window=2048):
+        self.window = window
+        self.timers = {}
+        self.counters = {}
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.loop_started = None
+        self.lap_started = None
+        self.loop_requests = 0
+
+    # -- primitives ---------------------------------------------------------------
+
+    def observe(self, name, seconds, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        hist = self.timers.get(key)
+        if hist is None:
+            with self.lock:
+                hist = self.timers.setdefault(key, RollingHistogram(self.window))
+        hist.record(seconds)
+
+    def count(self, name, n=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + n
+
+    # -- REST calls ----------------------------------------------------------------
+
+    def record_request(self, endpoint, seconds, status=None, error=None):
+        with self.lock:
+            self.requests += 1
+        self.observe('request_seconds', seconds, endpoint=endpoint)
+        if error is not None:
+            self.count('request_errors_total', endpoint=endpoint, error=error)
+        elif status is not None:
+            self.count('responses_total', endpoint=endpoint, code=str(status))
+
+    # -- loop phases -----------------------------------------------------------------
+
+    def begin_loop(self):
+        now = time.perf_counter()
+        if self.loop_started is not None:
+            self.observe('loop_seconds', now - self.loop_started)
+            self.observe('requests_per_loop', self.requests - self.loop_requests)
+        self.loop_started = now
+        self.lap_started = now
+        self.loop_requests = self.requests
+
+    def lap(self, phase):
+        now = time.perf_counter()
+        if self.lap_started is not None:
+            self.observe('phase_seconds', now - self.lap_started, phase=phase)
+        self.lap_started = now
+
+    def observe_phase(self, phase, seconds):
+        self.observe('phase_seconds', seconds, phase=phase)
+
+    # -- export -----------------------------------------------------------------------
+
+    def render(self, prefix='rit_'):
+        """Prometheus text exposition of everything recorded so far."""
+        lines = []
+        with self.lock:
+            timers = sorted(self.timers.items())
+            counters = sorted(self.counters.items())
+        typed = set()
+        for (name, labels), hist in timers:
+            metric = prefix + name
+            if metric not in typed:
+                lines.append('# TYPE {} summary'.format(metric))
+                typed.add(metric)
+            for q, value in sorted(hist.percentiles().items()):
+                lines.append('{}{} {:.6g}'.format(metric, _labels(labels + (('quantile', str(q)),)), value))
+            lines.append('{}_count{} {}'.format(metric, _labels(labels), hist.count))
+            lines.append('{}_sum{} {:.6g}'.format(metric, _labels(labels), hist.total))
+        for (name, labels), value in counters:
+            metric = prefix + name
+            if metric not in typed:
+                lines.append('# TYPE {} counter'.format(metric))
+                typed.add(metric)
+            lines.append('{}{} {}'.format(metric, _labels(labels), value))
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path):
+        tmp = path + '.tmp'
+        with open(tmp, 'w') as f:
+            f.write(self.render())
+        # replace in one step so a reader never sees a half-written file
+        os.replace(tmp, path)
+
+
+class NullMetrics(object):
+    """Drop-in for Metrics when instrumentation is off."""
+
+    enabled = False
+
+    def observe(self, name, seconds, **labels):
+        pass
+
+    def count(self, name, n=1, **labels):
+        pass
+
+    def record_request(self, endpoint, seconds, status=None, error=None):
+        pass
+
+    def begin_loop(self):
+        pass
+
+    def lap(self, phase):
+        pass
+
+    def observe_phase(self, phase, seconds):
+        pass
+
+    def render(self, prefix='rit_'):
+        return ''
+
+    def write(self, path):
+        pass
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join('{}="{}"'.format(k, str(v).replace('"', '\\"')) for k, v in labels) + '}'
+
+
+def instrument_session(session, metrics):
+    """Time every request made through session; a no-op for NullMetrics."""
+    if not metrics.enabled:
+        return session
+    request = session.request
+    clock = time.perf_counter
+
+    def timed_request(method, url, *args, **kwargs):
+        started = clock()
+        try:
+            resp = request(method, url, *args, **kwargs)
+        except Exception as exc:
+            metrics.record_request(endpoint_name(method, url), clock() - started,
+                                   error=type(exc).__name__)
+            raise
+        metrics.record_request(endpoint_name(method, url), clock() - started, resp.status_code)
+        return resp
+
+    session.request = timed_request
+    return session
+
+
+class MetricsDumper(object):
+    """Write metrics.render() to path every `interval` seconds on a daemon thread."""
+
+    def __init__(self, metrics, path, interval=5.0):
+        self.metrics = metrics
+        self.path = path
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, name='metrics-dump', daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while not self.stopped.wait(self.interval):
+            self.metrics.write(self.path)
+
+    def close(self):
+        self.stopped.set()
+        self.thread.join()
+        self.metrics.write(self.path)
+
+
+def serve_metrics(metrics, host='localhost', port=9108):
+    """Serve metrics.render() at http://host:port/metrics; returns the server."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.rstrip('/') != '/metrics':
+                self.send_error(404)
+                return
+            body = metrics.render().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True).start()
+    return server
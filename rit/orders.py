@@ -0,0 +1,248 @@
+# local shadow of our open orders, reconciled with the server only now and then
+#
+# The quoting loop used to download GET /v1/orders?status=OPEN every iteration
+# and rebuild order_ticks from it. OrderTracker records each order when we
+# place it, moves it through OPEN -> PARTIALLY_FILLED -> FILLED/CANCELLED from
+# what we observe, and asks for a server reconcile only every few iterations
+# or when something looks inconsistent (a cancel that failed, a book that has
+# traded through one of our quotes). TTL expiry is a queue ordered by
+# placement tick, so finding expired orders never scans the whole book.
+# Orders sent through rit.gateway are tracked under a provisional (negative)
+# client id until their order id comes back.
+from collections import deque
+
+OPEN = 'OPEN'
+PARTIALLY_FILLED = 'PARTIALLY_FILLED'
+FILLED = 'FILLED'
+CANCELLED = 'CANCELLED'
+
+LIVE_STATES = (OPEN, PARTIALLY_FILLED)
+
+
+def is_provisional(order_id):
+    """A client id given to an order still in flight (RIT ids are positive)."""
+    return isinstance(order_id, int) and order_id < 0
+
+
+class TrackedOrder(object):
+    __slots__ = ('order_id', 'ticker', 'side', 'price', 'quantity', 'filled', 'tick', 'state')
+
+    def __init__(self, order_id, ticker, side, price, quantity, tick, filled=0):
+        self.order_id = order_id
+        self.ticker = ticker
+        self.side = side
+        self.price = price
+        self.quantity = quantity
+        self.filled = filled
+        self.tick = tick
+        self.state = PARTIALLY_FILLED if filled else OPEN
+
+    @property
+    def remaining(self):
+        return self.quantity - self.filled
+
+    @property
+    def live(self):
+        return self.state in LIVE_STATES
+
+    def __repr__(self):
+        return 'TrackedOrder({} {} {}/{} {} @ {}, tick={}, {})'.format(
+            self.order_id, self.side, self.filled, self.quantity, self.ticker,
+            self.price, self.tick, self.state)
+
+
+class OrderTracker(object):
+    """Our live orders as we believe them to be, keyed by order id.
+
+    reconcile_every is the number of iterations between full open-orders
+    downloads when nothing looks wrong; mark_inconsistent() (or a failed
+    cancel, or check_book() spotting a trade-through) brings the next one
+    forward. With tickers given, server orders on any other ticker are
+    ignored, so several trackers (one per worker) can share one account.
+    """
+
+    def __init__(self, reconcile_every=4, tickers=None):
+        self.reconcile_every = reconcile_every
+        self.tickers = frozenset(tickers) if tickers is not None else None
+        self.orders = {}
+        self.expiry = deque()  # (placement tick, TrackedOrder), oldest first
+        self.since_reconcile = 0
+        self.inconsistent = True  # nothing known yet
+        self.reconciles = 0
+        self.last_tick = None  # tick of the last expired() call
+
+    # -- local updates ---------------------------------------------------------
+
+    def record(self, order_id, ticker, side, quantity, price, tick):
+        """Track an order we just placed."""
+        if order_id is None:
+            return None
+        order = TrackedOrder(order_id, ticker, side, price, quantity, tick)
+        self.orders[order_id] = order
+        self.expiry.append((tick, order))
+        return order
+
+    def resolve(self, client_id, order_id):
+        """Move an order from its provisional client id to its server id."""
+        order = self.orders.pop(client_id, None)
+        if order is None or order_id is None:
+            return None
+        adopted = self.orders.get(order_id)
+        if adopted is not None:
+            # a reconcile adopted it already: keep our placement tick, its fills
+            order.filled = max(order.filled, adopted.filled)
+            order.state = adopted.state
+        order.order_id = order_id
+        self.orders[order_id] = order
+        return order
+
+    def apply_fill(self, order_id, quantity):
+        order = self.orders.get(order_id)
+        if order is None or quantity <= 0:
+            return None
+        order.filled = min(order.quantity, order.filled + quantity)
+        if order.filled >= order.quantity:
+            order.state = FILLED
+            del self.orders[order_id]
+        else:
+            order.state = PARTIALLY_FILLED
+        return order
+
+    def cancelled(self, order_id):
+        order = self.orders.pop(order_id, None)
+        if order is not None:
+            order.state = CANCELLED
+        return order
+
+    def cancel_failed(self, order_id):
+        # most likely filled (or already gone) before the cancel arrived
+        if order_id in self.orders:
+            self.inconsistent = True
+
+    def apply_batch(self, report, tick):
+        """Fold an ActionBatch report into the tracked state.
+
+        Returns the TrackedOrders whose cancel was confirmed. Placements
+        made through rit.gateway are moved to their server id, or dropped
+        when they were rejected.
+        """
+        # placements first: a cancel may be for an order that just got its id
+        for placed in report.placed:
+            if placed.client_id is not None:
+                self.resolve(placed.client_id, placed.order_id)
+            else:
+                self.record(placed.order_id, placed.ticker, placed.side, placed.quantity,
+                            placed.price, tick)
+        for failed in report.failed_places:
+            if failed.client_id is not None:
+                self.orders.pop(failed.client_id, None)
+        done = set(report.cancelled)
+        cancelled = []
+        for order_id in report.requested_cancels:
+            if order_id in done:
+                cancelled.append(self.cancelled(order_id))
+            else:
+                self.cancel_failed(order_id)
+        return cancelled
+
+    def mark_inconsistent(self):
+        self.inconsistent = True
+
+    def check_book(self, ticker, best_bid, best_ask):
+        """Flag a reconcile when the market has traded through one of our quotes."""
+        for order in self.orders.values():
+            if order.ticker != ticker:
+                continue
+            if order.side == 'BUY' and best_ask is not None and best_ask <= order.price:
+                self.inconsistent = True
+                return
+            if order.side == 'SELL' and best_bid is not None and best_bid >= order.price:
+                self.inconsistent = True
+                return
+
+    # -- server reconcile ------------------------------------------------------
+
+    def needs_reconcile(self):
+        return self.inconsistent or self.since_reconcile >= self.reconcile_every
+
+    def note_iteration(self):
+        """Count an iteration that ran on local state only."""
+        self.since_reconcile += 1
+
+    def reconcile(self, server_orders, tick):
+        """Bring local state in line with our open orders (rit.records.Order).
+
+        Orders we track that the server no longer lists are treated as filled;
+        open orders we did not know about are adopted with the current tick as
+        their TTL start, which is what order_ticks used to do.
+        """
+        seen = set()
+        for o in server_orders:
+            order_id = o.order_id
+            if self.tickers is not None and o.ticker not in self.tickers:
+                continue
+            seen.add(order_id)
+            filled = o.quantity_filled
+            order = self.orders.get(order_id)
+            if order is None:
+                order = TrackedOrder(order_id, o.ticker, o.action, o.price, o.quantity, tick,
+                                     filled)
+                self.orders[order_id] = order
+                self.expiry.append((tick, order))
+                continue
+            if o.price is not None:
+                order.price = o.price
+            order.quantity = o.quantity or order.quantity
+            if filled > order.filled:
+                order.filled = filled
+                order.state = PARTIALLY_FILLED
+        for order_id in list(self.orders):
+            # an order still in flight cannot be listed yet
+            if order_id not in seen and not is_provisional(order_id):
+                self.orders.pop(order_id).state = FILLED
+        self.since_reconcile = 0
+        self.inconsistent = False
+        self.reconciles += 1
+
+    # -- queries ---------------------------------------------------------------
+
+    def open_orders(self, ticker=None):
+        if ticker is None:
+            return list(self.orders.values())
+        return [o for o in self.orders.values() if o.ticker == ticker]
+
+    def expired(self, tick, ttl_ticks):
+        """Live orders that have rested for ttl_ticks or more, oldest first.
+
+        Within a period placement ticks only grow, so the queue is in expiry
+        order: dead entries are dropped from the front and the walk stops at
+        the first order that is still within its TTL. When the tick goes
+        back (a new period or heat) the queue is rebased first.
+        """
+        if self.last_tick is not None and tick < self.last_tick:
+            self._rebase(tick)
+        self.last_tick = tick
+        queue = self.expiry
+        orders = self.orders
+        while queue and orders.get(queue[0][1].order_id) is not queue[0][1]:
+            queue.popleft()
+        result = []
+        for placed_tick, order in queue:
+            if tick - placed_tick < ttl_ticks:
+                break
+            if orders.get(order.order_id) is order and order.tick == placed_tick:
+                result.append(order.order_id)
+        return result
+
+    def _rebase(self, tick):
+        """Restart the TTL clock of orders from before the clock went back.
+
+        Their placement ticks belong to the old period and would keep them
+        from expiring until the new one reaches them again, so they count
+        from `tick`, as an adopted order does.
+        """
+        live = sorted(self.orders.values(), key=lambda o: min(o.tick, tick))
+        for order in live:
+            if order.tick > tick:
+                order.tick = tick
+        self.expiry = deque((order.tick, order) for order in live)
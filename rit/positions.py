@@ -0,0 +1,129 @@
+# position/risk cache filled from one bulk securities read
+#
+# GET /v1/securities already carries every ticker's position, so the per-ticker
+# GET /v1/securities?ticker=... is never needed. Between full refreshes the
+# cache keeps itself current from the fills it sees on our own open orders,
+# which lets most iterations skip the securities read altogether.
+
+
+class PositionCache(object):
+    """Per-ticker positions plus the gross/net exposure used by allow_buy/allow_sell.
+
+    load() replaces everything from a decoded /v1/securities read (a list of
+    rit.records.Security). observe_orders()
+    applies fills seen on our open orders since the previous call: growth in
+    quantity_filled is booked as a partial fill, and an order that disappears
+    without us having cancelled it is booked as filled for its remaining size.
+    A full refresh is requested every refresh_every iterations (or sooner when
+    invalidate() is called) to correct any drift.
+    """
+
+    def __init__(self, refresh_every=20):
+        self.refresh_every = refresh_every
+        self.positions = {}
+        self.tracked = {}       # order_id -> (ticker, action, quantity, quantity_filled)
+        self.cancelled = set()  # order ids we cancelled ourselves
+        self.since_refresh = 0
+        self.stale = True
+
+    # -- refresh ---------------------------------------------------------------
+
+    def needs_refresh(self):
+        return self.stale or self.since_refresh >= self.refresh_every
+
+    def invalidate(self):
+        self.stale = True
+
+    def load(self, securities, orders=None):
+        """Replace positions from a bulk securities read.
+
+        Pass the open orders read at the same moment so that fills already
+        included in these positions are not booked a second time.
+        """
+        self.positions = {s.ticker: s.position for s in securities}
+        self.tracked = {}
+        self.cancelled.clear()
+        if orders:
+            self._track(orders)
+        self.since_refresh = 0
+        self.stale = False
+
+    # -- incremental updates ---------------------------------------------------
+
+    def apply_fill(self, ticker, action, quantity):
+        if quantity <= 0:
+            return
+        signed = quantity if action == 'BUY' else -quantity
+        self.positions[ticker] = self.positions.get(ticker, 0) + signed
+
+    def book_fill(self, order_id, ticker, action, quantity, order_quantity):
+        """Apply a fill reported for one of our orders (rit.tas), so that the
+        next observe_orders() does not book it a second time."""
+        self.apply_fill(ticker, action, quantity)
+        prev = self.tracked.get(order_id)
+        filled = (prev[3] if prev is not None else 0) + quantity
+        self.tracked[order_id] = (ticker, action, order_quantity, filled)
+
+    def placed(self, order_id, ticker, action, quantity):
+        """Start tracking an order we just sent, so a fill before the next read counts."""
+        if order_id is not None:
+            self.tracked[order_id] = (ticker, action, quantity, 0)
+
+    def forget(self, order_id):
+        """Mark an order as cancelled by us so its disappearance is not a fill."""
+        if order_id is not None:
+            self.cancelled.add(order_id)
+
+    def note_iteration(self):
+        """Count an iteration that did not read our orders."""
+        self.since_refresh += 1
+
+    def observe_orders(self, orders):
+        """Book the fills implied by a fresh open-orders list (rit.records.Order)."""
+        self.since_refresh += 1
+        seen = set()
+        for o in orders:
+            order_id = o.order_id
+            seen.add(order_id)
+            prev = self.tracked.get(order_id)
+            filled = o.quantity_filled
+            if prev is not None and filled > prev[3]:
+                self.apply_fill(prev[0], prev[1], filled - prev[3])
+            elif prev is None and filled > 0:
+                # placed and partly filled since the last observation
+                self.apply_fill(o.ticker, o.action, filled)
+        for order_id in list(self.tracked):
+            if order_id in seen:
+                continue
+            ticker, action, quantity, filled = self.tracked.pop(order_id)
+            if order_id not in self.cancelled:
+                self.apply_fill(ticker, action, quantity - filled)
+        self.cancelled &= seen
+        self._track(orders)
+
+    def _track(self, orders):
+        tracked = self.tracked
+        for o in orders:
+            filled = o.quantity_filled
+            prev = tracked.get(o.order_id)
+            if prev is not None and prev[3] > filled:
+                # book_fill() saw a later state of this order in another view
+                filled = prev[3]
+            tracked[o.order_id] = (o.ticker, o.action, o.quantity, filled)
+
+    # -- queries ---------------------------------------------------------------
+
+    def position(self, ticker):
+        return self.positions.get(ticker, 0)
+
+    @property
+    def gross(self):
+        return sum(abs(p) for p in self.positions.values())
+
+    @property
+    def net(self):
+        return sum(self.positions.values())
+
+    def exposure(self, ticker):
+        """Return (position, gross, net) for the allow_buy/allow_sell checks."""
+        return self.position(ticker), self.gross, self.net
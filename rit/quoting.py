@@ -0,0 +1,226 @@
+# quote and size model of the ALGO2 COMP script, free of any HTTP calls
+#
+# main() and the replay/backtest tools both call compute_quote(), so a change
+# to the edge, the inventory skew or the sizing is tested against exactly the
+# code that trades.
+
+
+class QuoteParams(object):
+    """The risk/quote knobs of main(); defaults are the COMP script's values."""
+
+    __slots__ = (
+        'max_long_exposure', 'max_short_exposure', 'max_gross_pos', 'max_net_pos',
+        'max_single_long', 'max_single_short', 'base_edge', 'requote_tol',
+        'min_market_spread', 'buy_premium', 'sell_discount', 'price_cushion',
+        'order_ttl_ticks', 'base_volume', 'min_trade_volume', 'max_trade_volume',
+        'liquidity_target', 'skew_k', 'vol_edge_k', 'size_floor', 'liquidity_cap',
+    )
+
+    DEFAULTS = {
+        'max_long_exposure': 7500,
+        'max_short_exposure': 7500,
+        'max_gross_pos': 25000,
+        'max_net_pos': 25000,
+        'max_single_long': 12500,
+        'max_single_short': 12500,
+        'base_edge': 0.01,
+        'requote_tol': 0.01,
+        'min_market_spread': 0.035,
+        'buy_premium': 0.002,
+        'sell_discount': 0.002,
+        'price_cushion': 0.001,
+        'order_ttl_ticks': 4,
+        'base_volume': 3500,
+        'min_trade_volume': 2000,
+        'max_trade_volume': 6000,
+        'liquidity_target': 3000,
+        'skew_k': 0.00001,
+        'vol_edge_k': 1.0,
+        'size_floor': 0.7,
+        'liquidity_cap': 2.0,
+    }
+
+    def __init__(self, **overrides):
+        unknown = set(overrides) - set(self.DEFAULTS)
+        if unknown:
+            raise TypeError('Unknown quote parameter(s): {}'.format(', '.join(sorted(unknown))))
+        for name, value in self.DEFAULTS.items():
+            setattr(self, name, overrides.get(name, value))
+
+    def replace(self, **overrides):
+        values = self.as_dict()
+        values.update(overrides)
+        return QuoteParams(**values)
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __repr__(self):
+        changed = {k: v for k, v in self.as_dict().items() if v != self.DEFAULTS[k]}
+        return 'QuoteParams({})'.format(', '.join('{}={!r}'.format(k, v) for k, v in sorted(changed.items())))
+
+
+class Quote(object):
+    __slots__ = ('ticker', 'bid', 'ask', 'buy_qty', 'sell_qty', 'allow_buy', 'allow_sell',
+                 'mid', 'spread', 'edge', 'skew')
+
+    def __init__(self, ticker, bid, ask, buy_qty, sell_qty, allow_buy, allow_sell,
+                 mid, spread, edge, skew):
+        self.ticker = ticker
+        self.bid = bid
+        self.ask = ask
+        self.buy_qty = buy_qty
+        self.sell_qty = sell_qty
+        self.allow_buy = allow_buy
+        self.allow_sell = allow_sell
+        self.mid = mid
+        self.spread = spread
+        self.edge = edge
+        self.skew = skew
+
+    def __repr__(self):
+        return 'Quote({} bid {:.4f}x{}{} ask {:.4f}x{}{})'.format(
+            self.ticker, self.bid, self.buy_qty, '' if self.allow_buy else ' (off)',
+            self.ask, self.sell_qty, '' if self.allow_sell else ' (off)')
+
+
+def compute_trade_volumes(
+    market_spread,
+    edge,
+    liquidity,
+    pos,
+    max_long,
+    max_short,
+    base_volume,
+    min_volume,
+    max_volume,
+    liquidity_target,
+    size_floor=0.7,
+    liquidity_cap=2.0,
+):
+    # Scale size up with edge and headroom; tilt to reduce inventory risk.
+    # size_floor is the share of base_volume kept at no edge / no liquidity
+    # (New and cancel-test size with 0.5 and a liquidity cap of 1.0).
+    if market_spread <= 0:
+        return min_volume, min_volume
+
+    edge_ratio = min(1.0, max(0.0, edge / market_spread))
+    edge_scale = size_floor + (1.0 - size_floor) * edge_ratio
+    liq_ratio = min(liquidity_cap, max(0.0, liquidity / float(liquidity_target))) if liquidity_target > 0 else 1.0
+    liq_scale = size_floor + (1.0 - size_floor) * liq_ratio
+
+    long_headroom = max(0.0, max_long - pos)
+    short_headroom = max(0.0, max_short + pos)
+    long_scale = min(1.0, long_headroom / float(max_long)) if max_long > 0 else 0.0
+    short_scale = min(1.0, short_headroom / float(max_short)) if max_short > 0 else 0.0
+
+    base = base_volume * edge_scale * liq_scale
+    buy_base = base * (0.5 + 0.5 * long_scale)
+    sell_base = base * (0.5 + 0.5 * short_scale)
+
+    if pos > 0 and max_long > 0:
+        tilt = min(1.0, pos / float(max_long))
+        buy_base *= max(0.2, 1.0 - tilt)
+        sell_base *= 1.0 + 0.3 * tilt
+    elif pos < 0 and max_short > 0:
+        tilt = min(1.0, (-pos) / float(max_short))
+        sell_base *= max(0.2, 1.0 - tilt)
+        buy_base *= 1.0 + 0.3 * tilt
+
+    buy_qty = max(min_volume, min(max_volume, int(buy_base)))
+    sell_qty = max(min_volume, min(max_volume, int(sell_base)))
+    return buy_qty, sell_qty
+
+
+def compute_quote(params, choice, pos, gross_pos, net_pos, volume_scale=1.0):
+    """Quote prices, sizes and allowed sides for the ticker picked by select_ticker.
+
+    choice is the dict returned by select_ticker/select_ticker_to_trade; an
+    optional 'liquidity' entry (depth-weighted, see rit.book) replaces the
+    touch sizes as the sizing input, and an optional 'estimate' (a ready
+    rit.estimator.TickerEstimate) centres the quotes on its fair value, keeps
+    the edge at least vol_edge_k times its volatility and scales the skew by
+    its volatility ratio. volume_scale shrinks the whole size range (as TEST
+    CODE ALGO2.py does while it warms up). Returns None when there is no room
+    to quote (spread too tight, or the skewed quotes would cross).
+    """
+    p = params
+    best_bid = choice['best_bid']
+    best_ask = choice['best_ask']
+    market_spread = choice['spread']
+    mid = (best_bid + best_ask) / 2.0
+    estimate = choice.get('estimate')
+    center = mid
+    if estimate is not None:
+        center = min(best_ask, max(best_bid, estimate.fair))
+
+    # Optional: if the market spread is too tight, no room to make edge
+    if market_spread < p.min_market_spread:
+        return None
+
+    # If too long/short, stop quoting the side that increases risk
+    allow_buy = (
+        pos < p.max_long_exposure
+        and pos < p.max_single_long
+        and gross_pos < p.max_gross_pos
+        and net_pos < p.max_net_pos
+    )
+    allow_sell = (
+        pos > -p.max_short_exposure
+        and pos > -p.max_single_short
+        and gross_pos < p.max_gross_pos
+        and net_pos > -p.max_net_pos
+    )
+
+    # Edge: at least base_edge, but also respect a fraction of the market spread
+    edge = max(p.base_edge, 0.25 * market_spread)
+    if estimate is not None:
+        edge = max(edge, p.vol_edge_k * estimate.vol)
+
+    # Inventory skew: push quotes to reduce inventory
+    # If long (+pos): push both quotes DOWN to encourage selling / discourage buying
+    # If short (-pos): push both quotes UP to encourage buying / discourage selling
+    skew = p.skew_k * pos
+    if estimate is not None:
+        # lean on inventory harder while the market moves more than usual
+        skew *= estimate.vol_ratio
+
+    desired_bid = (center - edge) - skew
+    desired_ask = (center + edge) - skew
+    quote_bid = min(desired_bid + p.buy_premium, best_ask - p.price_cushion)
+    quote_ask = max(desired_ask - p.sell_discount, best_bid + p.price_cushion)
+
+    if quote_bid >= quote_ask:
+        return None
+
+    top_liquidity = choice.get('liquidity')
+    if top_liquidity is None:
+        top_liquidity = min(choice['bid_size'], choice['ask_size'])
+    base_volume = p.base_volume
+    min_volume = p.min_trade_volume
+    max_volume = p.max_trade_volume
+    if volume_scale != 1.0:
+        base_volume = max(1, int(base_volume * volume_scale))
+        min_volume = max(1, int(min_volume * volume_scale))
+        max_volume = max(min_volume, int(max_volume * volume_scale))
+    buy_qty, sell_qty = compute_trade_volumes(
+        market_spread,
+        edge,
+        top_liquidity,
+        pos,
+        p.max_long_exposure,
+        p.max_short_exposure,
+        base_volume,
+        min_volume,
+        max_volume,
+        p.liquidity_target,
+        p.size_floor,
+        p.liquidity_cap,
+    )
+    if (gross_pos + buy_qty) > p.max_gross_pos or (net_pos + buy_qty) > p.max_net_pos:
+        allow_buy = False
+    if (gross_pos + sell_qty) > p.max_gross_pos or (net_pos - sell_qty) < -p.max_net_pos:
+        allow_sell = False
+
+    return Quote(choice['ticker'], quote_bid, quote_ask, buy_qty, sell_qty, allow_buy,
+                 allow_sell, mid, market_spread, edge, skew)
@@ -0,0 +1,215 @@
+# client-side rate limiting in front of the requests.Session
+#
+# When the RIT client throttles us it answers 429 with a Retry-After header
+# and a 'wait' field (seconds) in the body. Nothing used to look at that:
+# place_limit parsed the 429 body as an order, the order was lost, and the
+# loop carried on at full speed. throttle_session() puts a RateLimiter in
+# front of session.request:
+#
+#   - a token bucket paces requests once a rate is known, either configured
+#     (then it covers every request) or learned from the rate we were sending
+#     at when a 429 arrived (then it covers the class that was throttled:
+#     RIT usually limits order messages, not reads);
+#   - a 429 pauses the throttled priority class, and informational reads,
+#     for the advertised wait, and the request is retried, which is safe
+#     because a throttled request was not processed;
+#   - waiting callers are served by priority: order placements and cancels
+#     first, then the reads the loop needs (book, case, orders, securities),
+#     then informational reads such as history, which also leave a reserve
+#     of tokens untouched for orders.
+#
+# Counters of throttled, deferred, retried and dropped calls are kept on the
+# limiter and, when a rit.metrics.Metrics is given, exported there too.
+import heapq
+import itertools
+import threading
+import time
+from collections import deque
+from urllib.parse import urlsplit
+
+ORDER = 0
+STATE = 1
+INFO = 2
+PRIORITY_NAMES = ('order', 'state', 'info')
+
+INFO_PATHS = ('/history', '/tas', '/news')
+
+
+def classify(method, url):
+    """Priority class of a request: ORDER, STATE or INFO."""
+    if method.upper() != 'GET':
+        return ORDER
+    path = urlsplit(url).path.rstrip('/')
+    if path.endswith(INFO_PATHS):
+        return INFO
+    return STATE
+
+
+def retry_after(resp, default=1.0):
+    """Seconds the server asked us to wait, from Retry-After or the body's 'wait'."""
+    header = resp.headers.get('Retry-After')
+    if header is not None:
+        try:
+            return max(0.0, float(header))
+        except ValueError:
+            pass
+    try:
+        body = resp.json()
+    except ValueError:
+        return default
+    if isinstance(body, dict) and body.get('wait') is not None:
+        try:
+            return max(0.0, float(body['wait']))
+        except (TypeError, ValueError):
+            pass
+    return default
+
+
+class RateLimiter(object):
+    """Token bucket shared by every thread using the session, served by priority.
+
+    rate is requests per second (None: unlimited until the first 429, which
+    sets it to `backoff` times the rate that class was sending at). burst is
+    the bucket size. info_reserve tokens are kept back from INFO requests.
+    """
+
+    def __init__(self, rate=None, burst=10, info_reserve=2, backoff=0.8, min_rate=1.0,
+                 metrics=None):
+        self.rate = rate
+        self.burst = burst
+        self.info_reserve = info_reserve
+        self.backoff = backoff
+        self.min_rate = min_rate
+        self.metrics = metrics
+        self.tokens = float(burst)
+        self.refilled_at = time.monotonic()
+        # classes the bucket applies to: all when a rate is configured,
+        # otherwise the ones that have been throttled
+        self.metered = set((ORDER, STATE, INFO)) if rate is not None else set()
+        self.paused_until = [0.0, 0.0, 0.0]  # per priority class
+        self.recent = (deque(), deque(), deque())  # send times over the last second, per class
+        self.cond = threading.Condition()
+        self.waiters = []
+        self.sequence = itertools.count()
+        self.requests = 0
+        self.throttled = 0
+        self.deferred = 0
+        self.retried = 0
+        self.dropped = 0
+        self.waited = 0.0
+
+    def _refill(self, now):
+        if self.rate is not None:
+            self.tokens = min(self.burst, self.tokens + (now - self.refilled_at) * self.rate)
+        self.refilled_at = now
+
+    def _sent_last_second(self, priority, now):
+        recent = self.recent[priority]
+        while recent and now - recent[0] >= 1.0:
+            recent.popleft()
+        return len(recent)
+
+    def _ready_in(self, priority, now):
+        """Seconds until a request of this class may go (0 when it may go now)."""
+        delay = self.paused_until[priority] - now
+        if priority in self.metered:
+            need = 1.0 + (self.info_reserve if priority == INFO else 0)
+            if self.tokens < need:
+                delay = max(delay, (need - self.tokens) / self.rate)
+        return max(0.0, delay)
+
+    def acquire(self, priority=STATE):
+        """Block until a request of this class may be sent; returns the seconds waited."""
+        started = time.monotonic()
+        with self.cond:
+            entry = (priority, next(self.sequence))
+            heapq.heappush(self.waiters, entry)
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._refill(now)
+                    delay = self._ready_in(priority, now)
+                    if self.waiters[0] is entry and delay <= 0:
+                        break
+                    # the head of the queue wakes itself; everyone else waits for it
+                    self.cond.wait(delay if self.waiters[0] is entry else None)
+                if priority in self.metered:
+                    self.tokens -= 1
+                self.requests += 1
+                self.recent[priority].append(now)
+                self._sent_last_second(priority, now)
+            finally:
+                self.waiters.remove(entry)
+                heapq.heapify(self.waiters)
+                self.cond.notify_all()
+        waited = time.monotonic() - started
+        if waited > 0.001:
+            self.note('deferred', priority, waited)
+        return waited
+
+    def throttle(self, priority, wait):
+        """A request of this class came back 429: pause it (and INFO reads) and meter it."""
+        with self.cond:
+            now = time.monotonic()
+            until = now + wait
+            for p in {priority, INFO}:
+                self.paused_until[p] = max(self.paused_until[p], until)
+            self.metered.add(priority)
+            if self.recent[priority]:
+                self.recent[priority].pop()  # this request was not accepted
+            sending_at = float(sum(self._sent_last_second(p, now) for p in self.metered))
+            learned = max(self.min_rate, self.backoff * sending_at)
+            self.rate = learned if self.rate is None else max(self.min_rate,
+                                                              min(self.rate, learned))
+            # a full bucket plus a second of refill must fit in the server's
+            # one-second window, so the burst is the headroom left by backoff
+            self.burst = min(self.burst, max(1.0, self.rate * (1.0 - self.backoff)))
+            self.tokens = min(self.tokens, 0.0)
+            self.cond.notify_all()
+        self.note('throttled', priority)
+
+    def note(self, what, priority, waited=0.0):
+        """Bump one of the throttled/deferred/retried/dropped counters."""
+        with self.cond:
+            setattr(self, what, getattr(self, what) + 1)
+            self.waited += waited
+        if self.metrics is not None:
+            self.metrics.count('ratelimit_{}_total'.format(what), priority=PRIORITY_NAMES[priority])
+
+    def counters(self):
+        return {
+            'requests': self.requests,
+            'throttled': self.throttled,
+            'deferred': self.deferred,
+            'retried': self.retried,
+            'dropped': self.dropped,
+            'waited_seconds': round(self.waited, 3),
+            'rate': self.rate,
+        }
+
+    def __repr__(self):
+        return 'RateLimiter({})'.format(', '.join(
+            '{}={}'.format(k, v) for k, v in self.counters().items()))
+
+
+def throttle_session(session, limiter, max_retries=3):
+    """Send every request made through session via limiter; 429s are retried."""
+    request = session.request
+
+    def limited_request(method, url, *args, **kwargs):
+        priority = classify(method, url)
+        attempt = 0
+        while True:
+            limiter.acquire(priority)
+            resp = request(method, url, *args, **kwargs)
+            if resp.status_code != 429:
+                return resp
+            limiter.throttle(priority, retry_after(resp))
+            if attempt >= max_retries:
+                limiter.note('dropped', priority)
+                return resp
+            attempt += 1
+            limiter.note('retried', priority)
+
+    session.request = limited_request
+    return session
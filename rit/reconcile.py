@@ -0,0 +1,172 @@
+# minimal-diff reconciliation of desired quotes against our live orders
+#
+# The requote step used to cancel and re-place a side whenever its price
+# moved by REQUOTE_TOL, and re-place it when only the size differed, which
+# throws away queue priority and costs two messages per side. Reconciler
+# compares what we want resting, one (price, quantity) per ticker and side,
+# with the orders we have there and emits only the difference:
+#
+#   - orders at the desired price (within price_tol) are kept, oldest first,
+#     as long as they do not add up to more than the target allows;
+#   - a level that is short by more than size_tol (say after partial fills)
+#     is topped up with a new order for the missing quantity at the same
+#     price, since RIT has no amend and the resting part keeps its place;
+#   - a level that is long is trimmed by cancelling its youngest orders;
+#   - everything else on that ticker and side is cancelled.
+#
+# Actions go through an ActionQueue, a heap that releases risk-reducing
+# actions first, so anything cut short (a failed flush, a rate limit) cuts
+# the risk-increasing end.
+import heapq
+import itertools
+
+CANCEL = 'CANCEL'
+PLACE = 'PLACE'
+
+BUY = 'BUY'
+SELL = 'SELL'
+
+# prices on the tick grid differ by float noise (25.01 - 25.00 is
+# 0.009999999999999787, 10.01 - 10.00 is 0.010000000000000009), so a move of
+# exactly the tolerance counts as off by it at every price level
+GRID_EPS = 1e-9
+
+# lower goes first
+CANCEL_RISKY = 0    # cancel on the side that grows our inventory
+PLACE_REDUCING = 1  # new order on the side that shrinks our inventory
+CANCEL_OTHER = 2
+PLACE_OTHER = 3
+
+
+def _risky_side(position):
+    if position > 0:
+        return BUY
+    if position < 0:
+        return SELL
+    return None
+
+
+class Action(object):
+    __slots__ = ('kind', 'ticker', 'side', 'quantity', 'price', 'order_id', 'priority')
+
+    def __init__(self, kind, ticker, side, quantity, price, order_id, priority):
+        self.kind = kind
+        self.ticker = ticker
+        self.side = side
+        self.quantity = quantity
+        self.price = price
+        self.order_id = order_id
+        self.priority = priority
+
+    def __repr__(self):
+        if self.kind == CANCEL:
+            return 'Action(CANCEL {} {} #{}, p{})'.format(self.ticker, self.side, self.order_id,
+                                                          self.priority)
+        return 'Action(PLACE {} {} {} @ {}, p{})'.format(self.side, self.quantity, self.ticker,
+                                                         self.price, self.priority)
+
+
+class ActionQueue(object):
+    """Heap of Actions: lowest priority value first, then larger inventory first."""
+
+    def __init__(self):
+        self.heap = []
+        self.sequence = itertools.count()
+
+    def push(self, action, position=0):
+        heapq.heappush(self.heap, (action.priority, -abs(position), next(self.sequence), action))
+
+    def __len__(self):
+        return len(self.heap)
+
+    def actions(self):
+        """The queued actions, in no particular order."""
+        return [entry[-1] for entry in self.heap]
+
+    def discard(self, actions):
+        """Take these queued actions out again (say, deferred by a message budget)."""
+        if not actions:
+            return
+        dropped = set(actions)
+        self.heap = [entry for entry in self.heap if entry[-1] not in dropped]
+        heapq.heapify(self.heap)
+
+    def drain(self):
+        heap = self.heap
+        while heap:
+            yield heapq.heappop(heap)[-1]
+
+    def drain_into(self, batch, split=None):
+        """Move every action into an ActionBatch, in priority order.
+
+        split(ticker, quantity), when given, breaks a placement into orders
+        the exchange accepts (see rit.static.StaticData.split).
+        """
+        for action in self.drain():
+            if action.kind == CANCEL:
+                batch.cancel(action.order_id)
+            elif split is None:
+                batch.place(action.ticker, action.side, action.quantity, action.price)
+            else:
+                for part, quantity in enumerate(split(action.ticker, action.quantity)):
+                    batch.place(action.ticker, action.side, quantity, action.price, part)
+
+
+class Reconciler(object):
+    """Diff one ticker/side's target quote against its live orders.
+
+    price_tol is REQUOTE_TOL: orders closer than that to the target price
+    (less GRID_EPS) are kept. size_tol is the fraction of the target quantity the working
+    quantity may be off by before it is topped up or trimmed.
+    """
+
+    def __init__(self, price_tol, size_tol=0.2):
+        self.price_tol = price_tol
+        self.size_tol = size_tol
+
+    def reconcile(self, ticker, side, target, orders, position, queue, price_tol=None):
+        """Push the actions that turn orders into target onto queue.
+
+        target is (price, quantity), or None to have nothing resting on this
+        side. orders are the live TrackedOrders on this ticker and side.
+        price_tol overrides the reconciler's for this call. Returns the
+        quantity left working once the actions are done.
+        """
+        if price_tol is None:
+            price_tol = self.price_tol
+        risky = _risky_side(position)
+        reducing = risky is not None and side != risky
+        # pulling a side we may no longer quote is always a risk decision
+        if target is None or side == risky:
+            cancel_priority = CANCEL_RISKY
+        else:
+            cancel_priority = CANCEL_OTHER
+        if target is None:
+            for o in orders:
+                queue.push(Action(CANCEL, ticker, side, o.remaining, o.price, o.order_id,
+                                  cancel_priority), position)
+            return 0
+
+        price, quantity = target
+        low = quantity * (1.0 - self.size_tol)
+        high = quantity * (1.0 + self.size_tol)
+        kept = 0
+        kept_price = price
+        # oldest first: they hold the best queue positions
+        for o in sorted(orders, key=lambda o: o.tick):
+            if abs(o.price - price) < price_tol - GRID_EPS and kept + o.remaining <= high:
+                if not kept:
+                    kept_price = o.price
+                kept += o.remaining
+                continue
+            queue.push(Action(CANCEL, ticker, side, o.remaining, o.price, o.order_id,
+                              cancel_priority), position)
+
+        if kept < low:
+            # RIT cannot amend, so a short level gets a top-up order for the
+            # missing quantity at the kept level's price; with nothing kept
+            # this is simply the new quote
+            queue.push(Action(PLACE, ticker, side, quantity - kept, kept_price, None,
+                              PLACE_REDUCING if reducing else PLACE_OTHER), position)
+            return quantity
+        return kept
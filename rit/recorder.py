@@ -0,0 +1,102 @@
+# append-only capture of every snapshot main() sees, for rit.replay
+#
+# File layout: the 7-byte magic b'RITREC1', one codec byte (b'M' msgpack,
+# b'J' JSON), then records of a 4-byte little-endian length followed by the
+# encoded record. msgpack is used when it is installed; JSON otherwise. A
+# record is a dict:
+#
+#   {'at': seconds since recording started, 'tick': ..., 'case': {...},
+#    'books': {ticker: book}, 'securities': [...] or None,
+#    'orders': [...] or None}
+#
+# securities/orders are None on iterations where the caches skipped the read,
+# exactly as in the live loop.
+import json
+import struct
+import time
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - depends on the environment
+    msgpack = None
+
+MAGIC = b'RITREC1'
+_LENGTH = struct.Struct('<I')
+
+
+def _encoder(codec):
+    if codec == b'M':
+        return msgpack.packb
+    return lambda record: json.dumps(record, separators=(',', ':')).encode('utf-8')
+
+
+def _decoder(codec):
+    if codec == b'M':
+        if msgpack is None:
+            raise RuntimeError('This recording uses msgpack; install msgpack to read it')
+        return lambda payload: msgpack.unpackb(payload, raw=False, strict_map_key=False)
+    return lambda payload: json.loads(payload.decode('utf-8'))
+
+
+def _to_json(records):
+    return None if records is None else [r.to_json() for r in records]
+
+
+class Recorder(object):
+    """Append snapshots to a recording file."""
+
+    def __init__(self, path, use_msgpack=None):
+        if use_msgpack is None:
+            use_msgpack = msgpack is not None
+        self.codec = b'M' if use_msgpack else b'J'
+        self.encode = _encoder(self.codec)
+        self.file = open(path, 'wb')
+        self.file.write(MAGIC + self.codec)
+        self.started = time.monotonic()
+        self.records = 0
+
+    def write(self, record):
+        payload = self.encode(record)
+        self.file.write(_LENGTH.pack(len(payload)))
+        self.file.write(payload)
+        self.records += 1
+
+    def record_snapshot(self, snapshot):
+        self.write({
+            'at': snapshot.started_at - self.started,
+            'tick': snapshot.tick,
+            'case': snapshot.case.to_json(),
+            'books': {t: book.to_json() for t, book in snapshot.books.items()},
+            'securities': _to_json(snapshot.securities),
+            'orders': _to_json(snapshot.orders),
+        })
+
+    def close(self):
+        if not self.file.closed:
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+def read_records(path):
+    """Yield the records of a recording file in order."""
+    with open(path, 'rb') as f:
+        header = f.read(len(MAGIC) + 1)
+        if header[:len(MAGIC)] != MAGIC:
+            raise ValueError('{} is not a RIT recording'.format(path))
+        decode = _decoder(header[len(MAGIC):])
+        read = f.read
+        while True:
+            head = read(_LENGTH.size)
+            if len(head) < _LENGTH.size:
+                return  # end of file, or a record cut short by a crash
+            (length,) = _LENGTH.unpack(head)
+            payload = read(length)
+            if len(payload) < length:
+                return
+            yield decode(payload)
@@ -0,0 +1,353 @@
+# typed records for RIT REST responses, decoded once per response
+#
+# The helpers used to pass raw JSON dicts around and call .get() on them
+# wherever a field was needed; order ids in particular were looked up as
+# order.get('order_id') or order.get('id') in several places per loop. Here
+# each response is parsed once, with orjson or ujson when installed and the
+# stdlib json otherwise, and turned into small __slots__ records:
+#
+#   CaseState  /v1/case
+#   Security   /v1/securities
+#   Book       /v1/securities/book, holding BookLevel entries
+#   Order      /v1/orders, with order_id normalised from 'order_id' or 'id'
+#   Print      /v1/securities/tas
+#   Candle     /v1/securities/history
+#   Limit      /v1/limits
+#
+# Everything past decoding works on attributes. to_json() gives back the
+# fields a record was built from, which is what rit.recorder stores.
+import json
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+try:
+    import ujson
+except ImportError:  # pragma: no cover - depends on the environment
+    ujson = None
+
+if orjson is not None:
+    loads = orjson.loads
+    PARSER = 'orjson'
+elif ujson is not None:
+    loads = ujson.loads
+    PARSER = 'ujson'
+else:
+    loads = json.loads
+    PARSER = 'json'
+
+
+def order_id_of(order):
+    """The id of an order dict, whichever of 'order_id'/'id' the client uses."""
+    if not isinstance(order, dict):
+        return None
+    return order.get('order_id') or order.get('id')
+
+
+def parse(resp):
+    """Decode a requests.Response body with the fastest parser available."""
+    return loads(resp.content)
+
+
+class CaseState(object):
+    __slots__ = ('name', 'period', 'tick', 'ticks_per_period', 'total_periods', 'status')
+
+    def __init__(self, name, period, tick, ticks_per_period, total_periods, status):
+        self.name = name
+        self.period = period
+        self.tick = tick
+        self.ticks_per_period = ticks_per_period
+        self.total_periods = total_periods
+        self.status = status
+
+    @classmethod
+    def from_json(cls, d):
+        get = d.get
+        return cls(get('name'), get('period', 1), get('tick', 0), get('ticks_per_period'),
+                   get('total_periods'), get('status'))
+
+    def to_json(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __repr__(self):
+        return 'CaseState(period={}, tick={}, status={})'.format(self.period, self.tick, self.status)
+
+
+class Security(object):
+    __slots__ = ('ticker', 'position', 'last', 'bid', 'ask', 'bid_size', 'ask_size',
+                 'quoted_decimals', 'trading_fee', 'limit_order_rebate', 'max_trade_size')
+
+    def __init__(self, ticker, position=0, last=None, bid=None, ask=None, bid_size=0,
+                 ask_size=0, quoted_decimals=2, trading_fee=0.0, limit_order_rebate=0.0,
+                 max_trade_size=None):
+        self.ticker = ticker
+        self.position = position
+        self.last = last
+        self.bid = bid
+        self.ask = ask
+        self.bid_size = bid_size
+        self.ask_size = ask_size
+        self.quoted_decimals = quoted_decimals
+        self.trading_fee = trading_fee
+        self.limit_order_rebate = limit_order_rebate
+        self.max_trade_size = max_trade_size
+
+    @classmethod
+    def from_json(cls, d):
+        get = d.get
+        return cls(get('ticker'), get('position', 0) or 0, get('last'), get('bid'), get('ask'),
+                   get('bid_size', 0) or 0, get('ask_size', 0) or 0, get('quoted_decimals', 2),
+                   get('trading_fee', 0.0) or 0.0, get('limit_order_rebate', 0.0) or 0.0,
+                   get('max_trade_size'))
+
+    def to_json(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __repr__(self):
+        return 'Security({} position={})'.format(self.ticker, self.position)
+
+
+class Order(object):
+    __slots__ = ('order_id', 'ticker', 'action', 'type', 'quantity', 'quantity_filled',
+                 'price', 'status', 'tick', 'trader_id', 'vwap')
+
+    def __init__(self, order_id, ticker, action, type_, quantity, quantity_filled, price,
+                 status, tick, trader_id=None, vwap=None):
+        self.order_id = order_id
+        self.ticker = ticker
+        self.action = action
+        self.type = type_
+        self.quantity = quantity
+        self.quantity_filled = quantity_filled
+        self.price = price
+        self.status = status
+        self.tick = tick
+        self.trader_id = trader_id
+        self.vwap = vwap  # average fill price, None until something filled
+
+    @classmethod
+    def from_json(cls, d):
+        get = d.get
+        return cls(get('order_id') or get('id'), get('ticker'), get('action'), get('type'),
+                   get('quantity', 0) or 0, get('quantity_filled', 0) or 0, get('price'),
+                   get('status'), get('tick'), get('trader_id'), get('vwap'))
+
+    @property
+    def remaining(self):
+        return self.quantity - self.quantity_filled
+
+    def to_json(self):
+        return {
+            'order_id': self.order_id, 'ticker': self.ticker, 'action': self.action,
+            'type': self.type, 'quantity': self.quantity,
+            'quantity_filled': self.quantity_filled, 'price': self.price,
+            'status': self.status, 'tick': self.tick, 'trader_id': self.trader_id,
+            'vwap': self.vwap,
+        }
+
+    def __repr__(self):
+        return 'Order({} {} {}/{} {} @ {}, {})'.format(
+            self.order_id, self.action, self.quantity_filled, self.quantity, self.ticker,
+            self.price, self.status)
+
+
+class Print(object):
+    """One trade on the tape (no trader ids: anyone's trade)."""
+
+    __slots__ = ('print_id', 'ticker', 'period', 'tick', 'price', 'quantity')
+
+    def __init__(self, print_id, ticker, period, tick, price, quantity):
+        self.print_id = print_id
+        self.ticker = ticker
+        self.period = period
+        self.tick = tick
+        self.price = price
+        self.quantity = quantity
+
+    @classmethod
+    def from_json(cls, ticker, d):
+        get = d.get
+        return cls(get('id'), ticker, get('period'), get('tick'), get('price'),
+                   get('quantity', 0) or 0)
+
+    def to_json(self):
+        return {'id': self.print_id, 'period': self.period, 'tick': self.tick,
+                'price': self.price, 'quantity': self.quantity}
+
+    def __repr__(self):
+        return 'Print(#{} {} {} @ {}, tick={})'.format(self.print_id, self.ticker, self.quantity,
+                                                       self.price, self.tick)
+
+
+class Candle(object):
+    """One tick of a ticker's price history."""
+
+    __slots__ = ('ticker', 'tick', 'open', 'high', 'low', 'close')
+
+    def __init__(self, ticker, tick, open, high, low, close):
+        self.ticker = ticker
+        self.tick = tick
+        self.open = open
+        self.high = high
+        self.low = low
+        self.close = close
+
+    @classmethod
+    def from_json(cls, ticker, d):
+        get = d.get
+        return cls(ticker, get('tick'), get('open'), get('high'), get('low'), get('close'))
+
+    def to_json(self):
+        return {'tick': self.tick, 'open': self.open, 'high': self.high, 'low': self.low,
+                'close': self.close}
+
+    def __repr__(self):
+        return 'Candle({} tick {} close {})'.format(self.ticker, self.tick, self.close)
+
+
+class Limit(object):
+    """One trading limit of the case (gross/net position caps and usage)."""
+
+    __slots__ = ('name', 'gross', 'net', 'gross_limit', 'net_limit')
+
+    def __init__(self, name, gross, net, gross_limit, net_limit):
+        self.name = name
+        self.gross = gross
+        self.net = net
+        self.gross_limit = gross_limit
+        self.net_limit = net_limit
+
+    @classmethod
+    def from_json(cls, d):
+        get = d.get
+        return cls(get('name'), get('gross', 0) or 0, get('net', 0) or 0, get('gross_limit'),
+                   get('net_limit'))
+
+    def to_json(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __repr__(self):
+        return 'Limit({} gross {}/{} net {}/{})'.format(self.name, self.gross, self.gross_limit,
+                                                        self.net, self.net_limit)
+
+
+class BookLevel(object):
+    """One resting order in the book."""
+
+    __slots__ = ('price', 'quantity', 'quantity_filled', 'trader_id', 'order_id')
+
+    def __init__(self, price, quantity, quantity_filled=0, trader_id=None, order_id=None):
+        self.price = price
+        self.quantity = quantity
+        self.quantity_filled = quantity_filled
+        self.trader_id = trader_id
+        self.order_id = order_id
+
+    @classmethod
+    def from_json(cls, d):
+        get = d.get
+        return cls(d['price'], get('quantity', 0) or 0, get('quantity_filled', 0) or 0,
+                   get('trader_id'), get('order_id') or get('id'))
+
+    @property
+    def remaining(self):
+        return self.quantity - self.quantity_filled
+
+    def to_json(self):
+        return {'price': self.price, 'quantity': self.quantity,
+                'quantity_filled': self.quantity_filled, 'trader_id': self.trader_id,
+                'order_id': self.order_id}
+
+    def __repr__(self):
+        return 'BookLevel({} x {})'.format(self.price, self.remaining)
+
+
+class Book(object):
+    """Bids (best first) and asks (best first) for one ticker."""
+
+    __slots__ = ('ticker', 'bids', 'asks')
+
+    def __init__(self, ticker, bids, asks):
+        self.ticker = ticker
+        self.bids = bids
+        self.asks = asks
+
+    @classmethod
+    def from_json(cls, ticker, d):
+        if not isinstance(d, dict):
+            return cls(ticker, [], [])
+        level = BookLevel.from_json
+        return cls(ticker, [level(x) for x in d.get('bids') or ()],
+                   [level(x) for x in d.get('asks') or ()])
+
+    def top(self):
+        """(best_bid, best_ask, bid_size, ask_size), as top_of_book() returns it."""
+        bids = self.bids
+        asks = self.asks
+        if bids:
+            best_bid, bid_size = bids[0].price, bids[0].quantity
+        else:
+            best_bid, bid_size = None, 0
+        if asks:
+            best_ask, ask_size = asks[0].price, asks[0].quantity
+        else:
+            best_ask, ask_size = None, 0
+        return best_bid, best_ask, bid_size, ask_size
+
+    def to_json(self):
+        return {'bids': [x.to_json() for x in self.bids],
+                'asks': [x.to_json() for x in self.asks]}
+
+    def __repr__(self):
+        return 'Book({} bids={} asks={})'.format(self.ticker, len(self.bids), len(self.asks))
+
+
+def decode_case(payload):
+    return CaseState.from_json(payload if isinstance(payload, dict) else {})
+
+
+def decode_securities(payload):
+    if isinstance(payload, dict):
+        payload = [payload]
+    if not isinstance(payload, list):
+        return []
+    return [Security.from_json(d) for d in payload if d.get('ticker') is not None]
+
+
+def decode_orders(payload):
+    if not isinstance(payload, list):
+        return []
+    return [o for o in map(Order.from_json, payload) if o.order_id is not None]
+
+
+def decode_book(ticker, payload):
+    return Book.from_json(ticker, payload)
+
+
+def decode_limits(payload):
+    if isinstance(payload, dict):
+        payload = [payload]
+    if not isinstance(payload, list):
+        return []
+    return [Limit.from_json(d) for d in payload if isinstance(d, dict)]
+
+
+def decode_history(ticker, payload):
+    """Candles oldest first, whichever order the client lists them in."""
+    if not isinstance(payload, list):
+        return []
+    candles = [Candle.from_json(ticker, d) for d in payload
+               if isinstance(d, dict) and d.get('close') is not None]
+    if len(candles) > 1 and (candles[0].tick or 0) > (candles[-1].tick or 0):
+        candles.reverse()
+    return candles
+
+
+def decode_tas(ticker, payload):
+    """Prints oldest first, whichever order the client lists them in."""
+    if not isinstance(payload, list):
+        return []
+    prints = [Print.from_json(ticker, d) for d in payload if d.get('id') is not None]
+    prints.sort(key=lambda p: p.print_id)
+    return prints
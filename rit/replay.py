@@ -0,0 +1,174 @@
+# deterministic backtest of the ALGO2 quoting logic over a recording
+#
+#   python -m rit.replay session.rec --set base_edge=0.015 --set skew_k=0.00002
+#
+# Replays the snapshots captured by rit.recorder through
+# MultiTickerEngine.step, the decision the COMP script makes each loop: every
+# ticker wide enough is quoted through rit.quoting.compute_quote under the
+# shared gross/net limits, and its orders are brought to the quote by
+# rit.reconcile (orders within REQUOTE_TOL kept oldest first, short levels
+# topped up, long ones trimmed, TTL expiry), optionally under a message
+# budget. An Estimator follows the recorded tops, so fair value, vol_edge_k
+# and the volatility-scaled skew apply once it has warmed up (the recording
+# has no history to seed it from). Simulated orders live in an OrderTracker
+# like the live ones.
+# Fills are simulated conservatively: a resting bid fills in full at its price
+# once the recorded book's best ask trades through it (ask <= bid), and
+# likewise for asks. Nothing touches the network, so a 300-tick session
+# replays in a fraction of a second. Quotes are not snapped to the tick grid
+# (that needs the client's securities limits).
+import argparse
+import time
+
+from rit.batch import ActionBatch
+from rit.budget import MessageBudget
+from rit.engine import MultiTickerEngine
+from rit.estimator import Estimator
+from rit.orders import OrderTracker
+from rit.positions import PositionCache
+from rit.quoting import QuoteParams
+from rit.recorder import read_records
+from rit.records import decode_book
+from rit.snapshot import MarketSnapshot
+
+
+class ReplayResult(object):
+    __slots__ = ('params', 'snapshots', 'fills', 'bought', 'sold', 'cash', 'positions',
+                 'marks', 'messages', 'max_abs_position', 'elapsed')
+
+    def __init__(self, params):
+        self.params = params
+        self.snapshots = 0
+        self.fills = 0
+        self.bought = 0
+        self.sold = 0
+        self.cash = 0.0
+        self.positions = {}
+        self.marks = {}
+        self.messages = 0
+        self.max_abs_position = 0
+        self.elapsed = 0.0
+
+    @property
+    def pnl(self):
+        return self.cash + sum(p * self.marks.get(t, 0.0) for t, p in self.positions.items())
+
+    def summary(self):
+        return ('pnl {:10.2f}  fills {:5d}  bought {:7d}  sold {:7d}  end pos {:7d}  '
+                'max |pos| {:6d}  messages {:5d}  ({} snapshots in {:.3f}s)').format(
+            self.pnl, self.fills, self.bought, self.sold, sum(self.positions.values()),
+            self.max_abs_position, self.messages, self.snapshots, self.elapsed)
+
+
+def load(path):
+    """Read a recording into memory once, so it can be replayed many times."""
+    return [record for record in read_records(path) if record.get('books')]
+
+
+def replay(records, params=None, rebate=0.0, depth_levels=None, size_tol=0.2,
+           messages_per_tick=None):
+    """Run the quoting logic over recorded snapshots and return a ReplayResult.
+
+    Every simulated fill is passive (PRICE_CUSHION keeps our quotes off the
+    other side), so rebate is credited per share filled. depth_levels sizes
+    off depth-weighted liquidity like main() with BOOK_DEPTH set; size_tol
+    and messages_per_tick are QUOTE_SIZE_TOL and MESSAGES_PER_TICK.
+    """
+    params = params if params is not None else QuoteParams()
+    result = ReplayResult(params)
+    positions = result.positions
+    marks = result.marks
+    tickers = sorted({t for record in records for t in record['books']})
+    cache = PositionCache()
+    cache.positions = positions  # the engine reads the simulated positions
+    tracker = OrderTracker()
+    budget = MessageBudget(messages_per_tick) if messages_per_tick else None
+    estimator = Estimator(tickers)
+    engine = MultiTickerEngine(params, tickers, cache, tracker, size_tol=size_tol,
+                               depth_levels=depth_levels, budget=budget, estimator=estimator)
+    next_id = 1
+    started = time.perf_counter()
+
+    for record in records:
+        tick = record['tick']
+        books = {t: decode_book(t, b) for t, b in record['books'].items()}
+        snapshot = MarketSnapshot(tick, None, books, None, cache, None, 0.0, 0.0)
+        tops = snapshot.tops
+        result.snapshots += 1
+
+        # fills: the recorded market traded through our resting orders
+        for order in tracker.open_orders():
+            best_bid, best_ask = tops.get(order.ticker, (None, None, 0, 0))[:2]
+            if order.side == 'BUY':
+                hit = best_ask is not None and best_ask <= order.price
+            else:
+                hit = best_bid is not None and best_bid >= order.price
+            if not hit:
+                continue
+            quantity = order.remaining
+            tracker.apply_fill(order.order_id, quantity)
+            signed = quantity if order.side == 'BUY' else -quantity
+            positions[order.ticker] = positions.get(order.ticker, 0) + signed
+            result.cash -= signed * order.price - rebate * quantity
+            result.fills += 1
+            if signed > 0:
+                result.bought += quantity
+            else:
+                result.sold += quantity
+            result.max_abs_position = max(result.max_abs_position, abs(positions[order.ticker]))
+
+        for ticker, (best_bid, best_ask, _, _) in tops.items():
+            if best_bid is not None and best_ask is not None:
+                marks[ticker] = 0.5 * (best_bid + best_ask)
+
+        estimator.update(tick, tops)
+        batch = ActionBatch()
+        engine.step(snapshot, tick, batch)
+        # every cancel and placement is taken to succeed at once
+        for order_id in batch.cancels:
+            tracker.cancelled(order_id)
+        for p in batch.places.values():
+            tracker.record(next_id, p.ticker, p.side, p.quantity, p.price, tick)
+            next_id += 1
+        result.messages += len(batch)
+
+    result.elapsed = time.perf_counter() - started
+    return result
+
+
+def parse_overrides(pairs):
+    overrides = {}
+    for pair in pairs or ():
+        name, _, value = pair.partition('=')
+        default = QuoteParams.DEFAULTS.get(name)
+        if default is None:
+            raise SystemExit('Unknown parameter {!r}; known: {}'.format(
+                name, ', '.join(sorted(QuoteParams.DEFAULTS))))
+        overrides[name] = type(default)(float(value)) if isinstance(default, int) else float(value)
+    return overrides
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Replay a RIT recording through the quoting logic.')
+    parser.add_argument('recording')
+    parser.add_argument('--set', action='append', metavar='NAME=VALUE',
+                        help='override a QuoteParams field (repeatable)')
+    parser.add_argument('--rebate', type=float, default=0.0, help='per-share passive rebate')
+    parser.add_argument('--depth', type=int, default=None,
+                        help='size off depth-weighted liquidity over this many levels')
+    parser.add_argument('--size-tol', type=float, default=0.2,
+                        help='resting size may be off the target by this fraction (QUOTE_SIZE_TOL)')
+    parser.add_argument('--messages-per-tick', type=int, default=6,
+                        help='order messages per ticker per tick (MESSAGES_PER_TICK, 0 for none)')
+    args = parser.parse_args(argv)
+
+    records = load(args.recording)
+    params = QuoteParams(**parse_overrides(args.set))
+    result = replay(records, params, rebate=args.rebate, depth_levels=args.depth,
+                    size_tol=args.size_tol, messages_per_tick=args.messages_per_tick)
+    print(params)
+    print(result.summary())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+# tick-aligned loop scheduler for the quoting loop
+#
+# The loop used to sleep a fixed SLEEP_SEC after every iteration, however long
+# the iteration itself took, and then poll again. TickScheduler instead
+# subtracts the work already done from the sleep budget, learns how long a
+# case tick lasts from the ticks it sees in /v1/case, and wakes just after
+# the next tick boundary. Within a tick it backs off while nothing changes,
+# and changed() lets the loop skip the quoting logic when neither the book nor
+# our orders moved since the last pass.
+import time
+
+
+class TickScheduler(object):
+    """Decide how long the loop sleeps between iterations.
+
+    poll_interval is the longest the loop waits between polls while the book
+    is changing. After each poll that saw no change the wait doubles, up to
+    max_idle_interval, but never past the next predicted tick boundary plus
+    guard seconds. The tick period is learned as an EWMA of the observed gaps
+    between consecutive ticks.
+    """
+
+    def __init__(self, poll_interval=0.25, guard=0.02, max_idle_interval=1.0,
+                 align=True, react_on_change=True, smoothing=0.2):
+        self.poll_interval = poll_interval
+        self.guard = guard
+        self.max_idle_interval = max(poll_interval, max_idle_interval)
+        self.align = align
+        self.react_on_change = react_on_change
+        self.smoothing = smoothing
+
+        self.period = None        # learned seconds per tick
+        self.boundary = None      # estimated monotonic time of the last tick change
+        self.last_tick = None
+        self.last_seen_at = None  # when the last tick observation was taken
+        self.woke_at = time.monotonic()
+        self.idle_polls = 0
+        self.last_state = None
+        self.forced = False
+
+        self.iterations = 0
+        self.skipped = 0
+
+    # -- learning the tick clock ------------------------------------------------
+
+    def observe(self, tick, at=None):
+        """Record the tick seen by a poll taken at monotonic time `at`; returns tick."""
+        now = time.monotonic() if at is None else at
+        if tick != self.last_tick:
+            # the change happened somewhere between the previous poll and this one
+            prev = self.last_seen_at if self.last_seen_at is not None else now
+            changed_at = now - 0.5 * (now - prev)
+            if (self.last_tick is not None and tick == self.last_tick + 1
+                    and self.boundary is not None):
+                sample = changed_at - self.boundary
+                if sample > 0 and (self.period is None or sample < 3.0 * self.period):
+                    if self.period is None:
+                        self.period = sample
+                    else:
+                        self.period += self.smoothing * (sample - self.period)
+            self.boundary = changed_at
+            self.last_tick = tick
+            self.idle_polls = 0
+        self.last_seen_at = now
+        return tick
+
+    def next_boundary(self, now=None):
+        if self.period is None or self.boundary is None:
+            return None
+        now = time.monotonic() if now is None else now
+        periods = int((now - self.boundary) / self.period) + 1
+        return self.boundary + periods * self.period
+
+    # -- react-on-change ----------------------------------------------------------
+
+    def changed(self, *state):
+        """True when state (book tops, our orders, ...) differs from the last call.
+
+        Always True when react_on_change is off or force() was called.
+        """
+        self.iterations += 1
+        if not self.react_on_change or self.forced or state != self.last_state:
+            self.last_state = state
+            self.forced = False
+            self.idle_polls = 0
+            return True
+        self.idle_polls += 1
+        self.skipped += 1
+        return False
+
+    def force(self):
+        """Run the quoting logic on the next iteration even if nothing changed."""
+        self.forced = True
+
+    # -- sleeping ---------------------------------------------------------------
+
+    def sleep_time(self, now=None):
+        now = time.monotonic() if now is None else now
+        interval = min(self.max_idle_interval, self.poll_interval * (2 ** self.idle_polls))
+        wake = self.woke_at + interval
+        if self.align:
+            boundary = self.next_boundary(now)
+            if boundary is not None and boundary + self.guard < wake:
+                wake = boundary + self.guard
+        return max(0.0, wake - now)
+
+    def wait(self):
+        delay = self.sleep_time()
+        if delay > 0:
+            time.sleep(delay)
+        self.woke_at = time.monotonic()
+        return delay
@@ -0,0 +1,491 @@
+# offline stand-in for the RIT REST API
+#
+# Lets the ALGO2 scripts run end to end, and lets us benchmark loop latency
+# and throughput, on a machine without the RIT client. It serves the
+# endpoints the scripts use on http://localhost:9999/v1 by default:
+#
+#   GET    /v1/case
+#   GET    /v1/limits
+#   GET    /v1/securities                 (?ticker=)
+#   GET    /v1/securities/book            (?ticker=&limit=)
+#   GET    /v1/securities/history         (?ticker=&limit=)
+#   GET    /v1/securities/tas             (?ticker=&after=&limit=)
+#   GET    /v1/orders                     (?status=OPEN|TRANSACTED|CANCELLED)
+#   POST   /v1/orders                     (?ticker=&type=&quantity=&action=&price=)
+#   POST   /v1/commands/cancel            (?id= | ids= | ticker= | all=1)
+#   DELETE /v1/orders/{id}
+#
+# Orders are matched in a price-time-priority book (rit.matching). Background
+# liquidity re-quotes a random-walk fair value every tick and sends random
+# market orders, which is what fills our resting quotes.
+#
+# With an order rate limit, order submissions and cancels beyond that many
+# per second are answered like the real client throttles: 429 with a
+# Retry-After header and a 'wait' field in the body. With --open-after the
+# case reports STOPPED at tick 0 for that many seconds before it starts, as a
+# client does before the case is run.
+#
+#   python -m rit.server --tick-seconds 1 --latency-ms 5 --order-rate 10
+import argparse
+import json
+import random
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from rit.matching import BUY, LIMIT, MARKET, SELL, MatchingEngine
+
+DEFAULT_API_KEY = 'EZ91106P'
+TRADER_ID = 'ALGO2'
+MAKER_ID = 'ANON'
+TAKER_ID = 'ANON-TAKER'
+
+
+class CaseClock(object):
+    """Tick/period state of the simulated case."""
+
+    def __init__(self, ticks_per_period=300, total_periods=1, start_tick=1, opened=True):
+        self.ticks_per_period = ticks_per_period
+        self.total_periods = total_periods
+        self.start_tick = start_tick
+        self.opened = opened
+        self.period = 1
+        self.tick = start_tick if opened else 0
+        self.status = 'ACTIVE' if opened else 'STOPPED'
+
+    def open(self):
+        """Start a case that was created not yet running."""
+        self.opened = True
+        self.tick = self.start_tick
+        self.status = 'ACTIVE'
+
+    def advance(self):
+        """Move one tick forward; returns True when a new period started."""
+        if self.status != 'ACTIVE':
+            return False
+        if self.tick < self.ticks_per_period:
+            self.tick += 1
+            return False
+        if self.period < self.total_periods:
+            self.period += 1
+            self.tick = 1
+            return True
+        self.status = 'STOPPED'
+        return False
+
+    def to_json(self):
+        return {
+            'name': 'RIT - Algorithmic Market Making 2 (stand-in)',
+            'period': self.period,
+            'tick': self.tick,
+            'ticks_per_period': self.ticks_per_period,
+            'total_periods': self.total_periods,
+            'status': self.status,
+            'is_enforce_trading_limits': False,
+        }
+
+
+class BackgroundLiquidity(object):
+    """Random-walk market maker plus random takers for every ticker."""
+
+    def __init__(self, engine, start_prices, seed=None, volatility=0.02, half_spread=0.03,
+                 levels=5, level_step=0.01, depth=(500, 3000), taker_orders=4,
+                 taker_size=(200, 3000)):
+        self.engine = engine
+        self.fair = dict(start_prices)
+        self.rng = random.Random(seed)
+        self.volatility = volatility
+        self.half_spread = half_spread
+        self.levels = levels
+        self.level_step = level_step
+        self.depth = depth
+        self.taker_orders = taker_orders
+        self.taker_size = taker_size
+
+    def step(self):
+        rng = self.rng
+        engine = self.engine
+        for order in engine.open_orders(MAKER_ID):
+            engine.cancel(order.order_id)
+        for ticker in engine.books:
+            fair = max(0.5, self.fair[ticker] + rng.gauss(0.0, self.volatility))
+            self.fair[ticker] = fair
+            for i in range(self.levels):
+                offset = self.half_spread + i * self.level_step
+                engine.submit(MAKER_ID, ticker, BUY, LIMIT, rng.randint(*self.depth), fair - offset)
+                engine.submit(MAKER_ID, ticker, SELL, LIMIT, rng.randint(*self.depth), fair + offset)
+            for _ in range(rng.randint(0, self.taker_orders)):
+                side = BUY if rng.random() < 0.5 else SELL
+                engine.submit(TAKER_ID, ticker, side, MARKET, rng.randint(*self.taker_size))
+
+
+class StandIn(object):
+    """The simulated case: engine, clock, liquidity and the API key it accepts."""
+
+    def __init__(self, tickers=('ALGO',), start_prices=None, api_key=DEFAULT_API_KEY,
+                 latency=0.0, jitter=0.0, tick_seconds=1.0, ticks_per_period=300,
+                 total_periods=1, start_tick=1, seed=None, trading_fee=0.02,
+                 limit_order_rebate=0.03, max_trade_size=10000, order_rate=None,
+                 gross_limit=25000, net_limit=25000, open_after=0.0):
+        tickers = list(tickers)
+        start_prices = start_prices or {t: 10.0 for t in tickers}
+        self.engine = MatchingEngine(tickers, trading_fee=trading_fee,
+                                     limit_order_rebate=limit_order_rebate)
+        self.clock = CaseClock(ticks_per_period, total_periods, start_tick,
+                               opened=not open_after)
+        self.open_after = open_after  # seconds before the case starts
+        self.liquidity = BackgroundLiquidity(self.engine, start_prices, seed=seed)
+        self.start_prices = start_prices
+        self.api_key = api_key
+        self.latency = latency
+        self.jitter = jitter
+        self.tick_seconds = tick_seconds
+        self.max_trade_size = max_trade_size
+        self.gross_limit = gross_limit
+        self.net_limit = net_limit
+        self.history = {t: [] for t in tickers}  # oldest first
+        self.lock = threading.RLock()
+        self.stopped = threading.Event()
+        self.requests = 0
+        self.order_rate = order_rate  # order/cancel messages per second, None for no limit
+        self.order_times = deque()
+        self.throttled = 0
+        with self.lock:
+            self.engine.tick = self.clock.tick
+            self.liquidity.step()
+
+    # -- case clock -------------------------------------------------------------
+
+    def step(self):
+        """Close the current tick and open the next one."""
+        with self.lock:
+            self._record_history()
+            new_period = self.clock.advance()
+            if new_period:
+                for order in list(self.engine.open_orders(TRADER_ID)):
+                    self.engine.cancel(order.order_id)
+            self.engine.tick = self.clock.tick
+            self.engine.period = self.clock.period
+            if self.clock.status == 'ACTIVE':
+                self.liquidity.step()
+
+    def _throttle(self):
+        """Seconds to wait before another order message is accepted (0 when allowed)."""
+        now = time.monotonic()
+        times = self.order_times
+        while times and now - times[0] >= 1.0:
+            times.popleft()
+        if len(times) >= self.order_rate:
+            # never 0: the caller takes 0 as accepted
+            return max(0.001, round(1.0 - (now - times[0]), 3))
+        times.append(now)
+        return 0
+
+    def _record_history(self):
+        engine = self.engine
+        tick = self.clock.tick
+        for ticker, rows in self.history.items():
+            prices = [f.price for f in engine.fills[-200:] if f.ticker == ticker and f.tick == tick]
+            close = engine.last[ticker] if engine.last[ticker] is not None else engine.mid(ticker)
+            if close is None:
+                close = self.start_prices[ticker]
+            open_ = rows[-1]['close'] if rows else close
+            rows.append({
+                'tick': tick,
+                'open': open_,
+                'high': max(prices + [open_, close]),
+                'low': min(prices + [open_, close]),
+                'close': close,
+            })
+
+    def run_clock(self):
+        if not self.clock.opened:
+            if self.stopped.wait(self.open_after):
+                return
+            with self.lock:
+                self.clock.open()
+                self.engine.tick = self.clock.tick
+        next_at = time.monotonic() + self.tick_seconds
+        while not self.stopped.is_set():
+            delay = next_at - time.monotonic()
+            if delay > 0 and self.stopped.wait(delay):
+                break
+            next_at += self.tick_seconds
+            self.step()
+            if self.clock.status != 'ACTIVE':
+                break
+
+    # -- API --------------------------------------------------------------------
+
+    def handle(self, method, path, params, headers):
+        """Dispatch one request; returns (status, json body)."""
+        with self.lock:
+            self.requests += 1
+        if self.latency or self.jitter:
+            time.sleep(self.latency + random.random() * self.jitter)
+        if self.api_key is not None and headers.get('X-API-Key') != self.api_key:
+            return 401, {'code': 'NOT_AUTHORIZED', 'message': 'Invalid API key'}
+        if not path.startswith('/v1/'):
+            return 404, {'code': 'NOT_FOUND', 'message': path}
+        route = path[len('/v1'):].rstrip('/')
+        with self.lock:
+            if method in ('POST', 'DELETE') and self.order_rate:
+                wait = self._throttle()
+                if wait:
+                    self.throttled += 1
+                    return 429, {'code': 'TOO_MANY_REQUESTS',
+                                 'message': 'Order rate limit exceeded', 'wait': wait}
+            try:
+                if method == 'GET':
+                    return self._get(route, params)
+                if method == 'POST':
+                    return self._post(route, params)
+                if method == 'DELETE' and route.startswith('/orders/'):
+                    return self._delete_order(route[len('/orders/'):])
+            except (KeyError, ValueError) as exc:
+                return 400, {'code': 'BAD_REQUEST', 'message': str(exc)}
+        return 404, {'code': 'NOT_FOUND', 'message': '{} {}'.format(method, path)}
+
+    def _get(self, route, params):
+        engine = self.engine
+        if route == '/case':
+            return 200, self.clock.to_json()
+        if route == '/limits':
+            positions = engine.account(TRADER_ID).positions
+            return 200, [{
+                'name': 'LIMIT-STOCK',
+                'gross': sum(abs(p) for p in positions.values()),
+                'net': sum(positions.values()),
+                'gross_limit': self.gross_limit,
+                'net_limit': self.net_limit,
+            }]
+        if route == '/securities':
+            tickers = [params['ticker']] if 'ticker' in params else list(engine.books)
+            return 200, [self._security(t) for t in tickers if t in engine.books]
+        if route == '/securities/book':
+            ticker = self._ticker(params)
+            limit = int(params.get('limit', 20))
+            book = engine.books[ticker]
+            return 200, {
+                'bids': [o.to_json() for o in book.orders(BUY, limit)],
+                'asks': [o.to_json() for o in book.orders(SELL, limit)],
+            }
+        if route == '/securities/history':
+            ticker = self._ticker(params)
+            rows = self.history[ticker]
+            limit = int(params.get('limit', len(rows) or 1))
+            return 200, list(reversed(rows[-limit:])) if limit > 0 else []
+        if route == '/securities/tas':
+            ticker = self._ticker(params)
+            after = int(params.get('after', 0))
+            limit = int(params.get('limit', 0)) or None
+            prints = []
+            # newest first, like /securities/history
+            for fill in reversed(engine.fills):
+                if fill.fill_id <= after or (limit is not None and len(prints) >= limit):
+                    break
+                if fill.ticker == ticker:
+                    prints.append(fill.to_json())
+            return 200, prints
+        if route == '/orders':
+            status = params.get('status', 'OPEN')
+            if status == 'OPEN':
+                orders = engine.open_orders(TRADER_ID)
+            else:
+                orders = engine.orders_for(TRADER_ID, status)
+            return 200, [o.to_json() for o in orders]
+        if route.startswith('/orders/'):
+            order = engine.orders.get(self._order_id(route[len('/orders/'):]))
+            if order is None or order.trader_id != TRADER_ID:
+                return 404, {'code': 'NOT_FOUND', 'message': 'Unknown order'}
+            return 200, order.to_json()
+        return 404, {'code': 'NOT_FOUND', 'message': route}
+
+    def _post(self, route, params):
+        engine = self.engine
+        if self.clock.status != 'ACTIVE':
+            return 400, {'code': 'CASE_NOT_ACTIVE', 'message': 'The case is not running'}
+        if route == '/orders':
+            ticker = self._ticker(params)
+            quantity = int(float(params.get('quantity', 0)))
+            if quantity > self.max_trade_size:
+                raise ValueError('Order quantity exceeds the maximum trade size')
+            price = params.get('price')
+            order = engine.submit(TRADER_ID, ticker, params.get('action'),
+                                  params.get('type', LIMIT), quantity,
+                                  float(price) if price is not None else None)
+            return 200, order.to_json()
+        if route == '/commands/cancel':
+            if params.get('all') in ('1', 'true', 'True'):
+                ids = [o.order_id for o in engine.open_orders(TRADER_ID)]
+            elif 'ticker' in params:
+                ids = [o.order_id for o in engine.open_orders(TRADER_ID, params['ticker'])]
+            elif 'ids' in params:
+                ids = [self._order_id(i) for i in params['ids'].split(',') if i.strip()]
+            elif 'id' in params:
+                ids = [self._order_id(params['id'])]
+            else:
+                raise ValueError('Nothing to cancel')
+            cancelled = [i for i in ids if engine.cancel(i, TRADER_ID)]
+            return 200, {'cancelled_order_ids': cancelled}
+        return 404, {'code': 'NOT_FOUND', 'message': route}
+
+    def _delete_order(self, raw_id):
+        if self.engine.cancel(self._order_id(raw_id), TRADER_ID):
+            return 200, {'success': True}
+        return 422, {'code': 'NOT_CANCELLABLE', 'message': 'Order is not open'}
+
+    def _security(self, ticker):
+        engine = self.engine
+        account = engine.account(TRADER_ID)
+        book = engine.books[ticker]
+        bid, ask = book.best(BUY), book.best(SELL)
+        position = account.positions.get(ticker, 0)
+        last = engine.last[ticker] if engine.last[ticker] is not None else self.start_prices[ticker]
+        return {
+            'ticker': ticker,
+            'type': 'STOCK',
+            'size': 1,
+            'position': position,
+            'last': last,
+            'bid': bid.price if bid else 0,
+            'bid_size': bid.remaining if bid else 0,
+            'ask': ask.price if ask else 0,
+            'ask_size': ask.remaining if ask else 0,
+            'volume': account.volume.get(ticker, 0),
+            'is_tradeable': True,
+            'is_shortable': True,
+            'start_price': self.start_prices[ticker],
+            'quoted_decimals': 2,
+            'trading_fee': engine.trading_fee,
+            'limit_order_rebate': engine.limit_order_rebate,
+            'min_trade_size': 1,
+            'max_trade_size': self.max_trade_size,
+        }
+
+    @staticmethod
+    def _ticker(params):
+        ticker = params.get('ticker')
+        if ticker is None:
+            raise ValueError('Missing ticker')
+        return ticker
+
+    @staticmethod
+    def _order_id(raw):
+        try:
+            return int(raw)
+        except (TypeError, ValueError):
+            raise ValueError('Invalid order id {!r}'.format(raw))
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive, so the scripts' session pool is exercised
+    disable_nagle_algorithm = True  # headers and body go out in separate writes
+
+    def _dispatch(self, method):
+        url = urlsplit(self.path)
+        params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        length = int(self.headers.get('Content-Length') or 0)
+        if length:
+            body = self.rfile.read(length).decode('utf-8', 'replace')
+            params.update({k: v[-1] for k, v in parse_qs(body).items()})
+        status, payload = self.server.standin.handle(method, url.path, params, self.headers)
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        if status == 429:
+            self.send_header('Retry-After', str(payload.get('wait', 1)))
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self._dispatch('GET')
+
+    def do_POST(self):
+        self._dispatch('POST')
+
+    def do_DELETE(self):
+        self._dispatch('DELETE')
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(standin, host='localhost', port=9999, run_clock=True):
+    """Start the HTTP server (and the case clock) on background threads.
+
+    Returns the ThreadingHTTPServer; call stop(server) to shut both down.
+    """
+    server = ThreadingHTTPServer((host, port), _Handler)
+    server.daemon_threads = True
+    server.standin = standin
+    threading.Thread(target=server.serve_forever, name='rit-standin', daemon=True).start()
+    if run_clock:
+        threading.Thread(target=standin.run_clock, name='rit-clock', daemon=True).start()
+    return server
+
+
+def stop(server):
+    server.standin.stopped.set()
+    server.shutdown()
+    server.server_close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Offline stand-in for the RIT REST API.')
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=9999)
+    parser.add_argument('--tickers', default='ALGO', help='comma-separated ticker list')
+    parser.add_argument('--api-key', default=DEFAULT_API_KEY)
+    parser.add_argument('--tick-seconds', type=float, default=1.0)
+    parser.add_argument('--ticks-per-period', type=int, default=300)
+    parser.add_argument('--periods', type=int, default=1)
+    parser.add_argument('--start-tick', type=int, default=1)
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='fixed delay per request')
+    parser.add_argument('--jitter-ms', type=float, default=0.0, help='extra uniform random delay')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--order-rate', type=float, default=None,
+                        help='order/cancel messages accepted per second (429 beyond)')
+    parser.add_argument('--gross-limit', type=int, default=25000)
+    parser.add_argument('--net-limit', type=int, default=25000)
+    parser.add_argument('--max-trade-size', type=int, default=10000)
+    parser.add_argument('--open-after', type=float, default=0.0,
+                        help='seconds the case stays STOPPED at tick 0 before it starts')
+    args = parser.parse_args(argv)
+
+    standin = StandIn(
+        tickers=[t.strip() for t in args.tickers.split(',') if t.strip()],
+        api_key=args.api_key,
+        latency=args.latency_ms / 1000.0,
+        jitter=args.jitter_ms / 1000.0,
+        tick_seconds=args.tick_seconds,
+        ticks_per_period=args.ticks_per_period,
+        total_periods=args.periods,
+        start_tick=args.start_tick,
+        seed=args.seed,
+        order_rate=args.order_rate,
+        gross_limit=args.gross_limit,
+        net_limit=args.net_limit,
+        max_trade_size=args.max_trade_size,
+        open_after=args.open_after,
+    )
+    server = serve(standin, args.host, args.port)
+    print('RIT stand-in listening on http://{}:{}/v1'.format(args.host, args.port))
+    try:
+        while standin.clock.status == 'ACTIVE' or not standin.clock.opened:
+            time.sleep(0.5)
+        print('Case finished at period {} tick {}'.format(standin.clock.period, standin.clock.tick))
+        # a client keeps answering (STOPPED) after the case, until closed
+        while True:
+            time.sleep(0.5)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop(server)
+
+
+if __name__ == '__main__':
+    main()
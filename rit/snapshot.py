@@ -0,0 +1,242 @@
+# concurrent per-iteration market snapshot for the ALGO2 quoting loop
+#
+# Every loop needs the book for each ticker, our positions, our open orders
+# and the current tick. Issuing those reads one after another costs the sum of
+# their round trips; here they go out together on a small thread pool that
+# shares the caller's pooled requests.Session, so a snapshot costs roughly the
+# slowest single call. Positions live in a PositionCache and, when a tracker
+# is given, our open orders in an OrderTracker, so the securities and
+# open-orders reads are only issued when those ask for a refresh. Responses
+# are decoded once into rit.records types.
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from rit.api import API_URL, check_auth, mount_pool
+from rit.positions import PositionCache
+from rit.records import decode_book, decode_case, decode_orders, decode_securities, parse
+
+
+def read_book(session, ticker, limit=None):
+    params = {'ticker': ticker}
+    if limit:
+        params['limit'] = limit
+    resp = check_auth(session.get(API_URL + '/securities/book', params=params))
+    return decode_book(ticker, parse(resp))
+
+
+def read_securities(session):
+    resp = check_auth(session.get(API_URL + '/securities'))
+    return decode_securities(parse(resp))
+
+
+def read_orders(session, status):
+    resp = check_auth(session.get(API_URL + '/orders', params={'status': status}))
+    return decode_orders(parse(resp))
+
+
+def read_case(session):
+    resp = check_auth(session.get(API_URL + '/case'))
+    return decode_case(parse(resp))
+
+
+def top_of_book(book):
+    """Return (best_bid, best_ask, bid_size, ask_size) from a raw book response.
+
+    Recordings store books as JSON; live snapshots use Book.top().
+    """
+    bids = book.get('bids', []) if isinstance(book, dict) else []
+    asks = book.get('asks', []) if isinstance(book, dict) else []
+    best_bid = bids[0]['price'] if bids else None
+    best_ask = asks[0]['price'] if asks else None
+    bid_size = bids[0].get('quantity', 0) if bids else 0
+    ask_size = asks[0].get('quantity', 0) if asks else 0
+    return best_bid, best_ask, bid_size, ask_size
+
+
+def select_widest(tops, min_spread):
+    """Pick the ticker with the widest spread of at least min_spread.
+
+    tops maps ticker -> (best_bid, best_ask, bid_size, ask_size); the result
+    is the dict select_ticker_to_trade returns, or None.
+    """
+    best = None
+    for ticker, (best_bid, best_ask, bid_size, ask_size) in tops.items():
+        if best_bid is None or best_ask is None or best_ask <= best_bid:
+            continue
+        spread = best_ask - best_bid
+        if spread < min_spread:
+            continue
+        if (best is None) or (spread > best['spread']):
+            best = {
+                'ticker': ticker,
+                'best_bid': best_bid,
+                'best_ask': best_ask,
+                'bid_size': bid_size,
+                'ask_size': ask_size,
+                'spread': spread,
+            }
+    return best
+
+
+class MarketSnapshot(object):
+    """Everything one quoting iteration reads from the RIT client.
+
+    All reads that make up a snapshot are issued at the same moment, so the
+    book, positions, orders and tick describe the same point in the case.
+    """
+
+    __slots__ = ('tick', 'case', 'books', 'tops', 'securities', 'positions', 'orders',
+                 'started_at', 'elapsed', 'prints', 'fills')
+
+    def __init__(self, tick, case, books, securities, positions, orders, started_at, elapsed,
+                 prints=None, fills=()):
+        self.tick = tick
+        self.case = case
+        self.books = books
+        self.tops = {ticker: book.top() for ticker, book in books.items()}
+        self.securities = securities  # None when the position cache skipped the read
+        self.positions = positions
+        self.orders = orders  # None when the order tracker skipped the read
+        self.started_at = started_at
+        self.elapsed = elapsed
+        self.prints = prints  # ticker -> new tape prints, None without a fill feed
+        self.fills = fills    # rit.tas.Fill found during this fetch
+
+    def position(self, ticker):
+        return self.positions.position(ticker)
+
+    @property
+    def gross_position(self):
+        return self.positions.gross
+
+    @property
+    def net_position(self):
+        return self.positions.net
+
+    def select_ticker(self, min_spread):
+        """Same choice as select_ticker_to_trade, made from the snapshot's books."""
+        return select_widest(self.tops, min_spread)
+
+
+class SnapshotFetcher(object):
+    """Issue the per-iteration reads concurrently and assemble a MarketSnapshot.
+
+    The fetcher owns a thread pool sized for one book read per ticker plus the
+    securities, open-orders and case reads. Use it as a context manager, or
+    call close() when done, so the worker threads are released. A recorder
+    (rit.recorder.Recorder) gets every snapshot and is closed with the fetcher.
+    book_depth bounds the book read to that many entries per side.
+
+    A fill_feed (rit.tas.FillFeed) polls the tape with the books. When a
+    print may have hit one of our orders, or the feed has not seen our
+    orders yet, the open and transacted orders are read in a second round
+    and the fills found are booked into the positions and the tracker.
+    """
+
+    def __init__(self, session, tickers, positions=None, tracker=None, recorder=None,
+                 order_status='OPEN', book_depth=None, fill_feed=None):
+        self.session = session
+        self.tickers = list(tickers)
+        self.positions = positions if positions is not None else PositionCache()
+        self.tracker = tracker
+        self.recorder = recorder
+        self.order_status = order_status
+        self.book_depth = book_depth
+        self.fill_feed = fill_feed
+        workers = len(self.tickers) * (2 if fill_feed is not None else 1) + 4
+        mount_pool(session, workers)
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='snapshot')
+
+    def fetch(self):
+        session = self.session
+        started_at = time.monotonic()
+        book_futures = {t: self.executor.submit(read_book, session, t, self.book_depth)
+                        for t in self.tickers}
+        tracker = self.tracker
+        refresh_positions = self.positions.needs_refresh()
+        securities_future = None
+        if refresh_positions:
+            securities_future = self.executor.submit(read_securities, session)
+        orders_future = None
+        # a position refresh always reads orders too, so fills are not double-booked
+        if tracker is None or refresh_positions or tracker.needs_reconcile():
+            orders_future = self.executor.submit(read_orders, session, self.order_status)
+        case_future = self.executor.submit(read_case, session)
+        feed = self.fill_feed
+        tape_futures = done_futures = None
+        if feed is not None:
+            tape_futures = {t: self.executor.submit(feed.poll, session, t) for t in self.tickers}
+            if orders_future is not None:
+                done_futures = self._read_done(feed)
+
+        case = case_future.result()
+        books = {t: f.result() for t, f in book_futures.items()}
+        prints = None
+        if feed is not None:
+            prints = {t: f.result() for t, f in tape_futures.items()}
+            if orders_future is None and (not feed.primed or feed.suspects_fill(prints, tracker)):
+                # a print at one of our prices: read our orders now rather
+                # than waiting for the next reconcile
+                orders_future = self.executor.submit(read_orders, session, self.order_status)
+                done_futures = self._read_done(feed)
+        orders = None
+        if orders_future is not None:
+            orders = orders_future.result()
+        fills = ()
+        if done_futures is not None:
+            done = [o for f in done_futures for o in f.result()]
+            fills = self._book_fills(orders, done, case.tick, booked=securities_future is None)
+        securities = None
+        if securities_future is not None:
+            securities = securities_future.result()
+            self.positions.load(securities, orders)
+        elif orders is not None:
+            self.positions.observe_orders(orders)
+        else:
+            self.positions.note_iteration()
+        if tracker is not None:
+            if orders is not None:
+                tracker.reconcile(orders, case.tick)
+            else:
+                tracker.note_iteration()
+        elapsed = time.monotonic() - started_at
+        snapshot = MarketSnapshot(case.tick, case, books, securities, self.positions, orders,
+                                  started_at, elapsed, prints, fills)
+        if self.recorder is not None:
+            self.recorder.record_snapshot(snapshot)
+        return snapshot
+
+    def _read_done(self, feed):
+        return [self.executor.submit(read_orders, self.session, status)
+                for status in feed.statuses()]
+
+    def _book_fills(self, orders, done, tick, booked):
+        """Fills on our orders since the feed last looked.
+
+        A fully filled (or cancelled) order has left the open list, hence
+        the reads of the other views. With booked, fills go into the position
+        cache; a securities read taken in the same fetch already includes them.
+        """
+        feed = self.fill_feed
+        everything = orders + done
+        if not feed.primed:
+            feed.prime(everything)
+            return ()
+        fills = feed.fills_from(everything, tick)
+        if booked:
+            for fill in fills:
+                self.positions.book_fill(fill.order_id, fill.ticker, fill.side, fill.quantity,
+                                         fill.order_quantity)
+        return fills
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        if self.recorder is not None:
+            self.recorder.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
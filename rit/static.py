@@ -0,0 +1,117 @@
+# case data that does not change during a session, read once at startup
+#
+# MAX_GROSS_POS/MAX_NET_POS were typed into main() by hand, and prices went
+# out as whatever float mid - edge - skew + BUY_PREMIUM came to, leaving the
+# client to reject or round them. StaticData reads /v1/case, /v1/limits and
+# the static fields of /v1/securities (quoted decimals, fees and rebates,
+# max trade size) once, before the loop starts, and then answers locally:
+#
+#   snap(ticker, price, side)  the price on the ticker's tick grid, rounded
+#                              away from the market (bids down, asks up) so
+#                              snapping never makes a quote more aggressive
+#   split(ticker, quantity)    the quantity in orders of at most the max
+#                              trade size
+#   apply(params)              QuoteParams with the case's gross/net limits,
+#                              and the per-ticker caps clamped under them
+import math
+
+from rit.api import API_URL, check_auth
+from rit.records import decode_limits, parse
+from rit.snapshot import read_case, read_securities
+
+BUY = 'BUY'
+
+_EPSILON = 1e-9  # prices already on the grid stay where they are
+
+
+def read_limits(session):
+    resp = check_auth(session.get(API_URL + '/limits'))
+    return decode_limits(parse(resp))
+
+
+class TickerInfo(object):
+    """Static trading data for one ticker."""
+
+    __slots__ = ('ticker', 'decimals', 'tick_size', 'steps_per_unit', 'trading_fee',
+                 'limit_order_rebate', 'max_trade_size')
+
+    def __init__(self, ticker, decimals=2, trading_fee=0.0, limit_order_rebate=0.0,
+                 max_trade_size=None):
+        self.ticker = ticker
+        self.decimals = decimals
+        self.tick_size = 10.0 ** -decimals
+        self.steps_per_unit = 10.0 ** decimals
+        self.trading_fee = trading_fee
+        self.limit_order_rebate = limit_order_rebate
+        self.max_trade_size = max_trade_size
+
+    @classmethod
+    def from_security(cls, security):
+        decimals = security.quoted_decimals
+        return cls(security.ticker, 2 if decimals is None else int(decimals),
+                   security.trading_fee, security.limit_order_rebate,
+                   security.max_trade_size or None)
+
+    def __repr__(self):
+        return 'TickerInfo({} tick {} fee {} rebate {} max {})'.format(
+            self.ticker, self.tick_size, self.trading_fee, self.limit_order_rebate,
+            self.max_trade_size)
+
+
+class StaticData(object):
+    """Limits, tick sizes, fees and max trade sizes of the running case."""
+
+    def __init__(self, case, securities, limits):
+        self.case = case
+        self.tickers = {s.ticker: TickerInfo.from_security(s) for s in securities}
+        self.limits = limits
+        gross = [l.gross_limit for l in limits if l.gross_limit]
+        net = [l.net_limit for l in limits if l.net_limit]
+        self.gross_limit = min(gross) if gross else None
+        self.net_limit = min(net) if net else None
+
+    @classmethod
+    def load(cls, session):
+        """Read the case, securities and limits (three calls, made once)."""
+        return cls(read_case(session), read_securities(session), read_limits(session))
+
+    def info(self, ticker):
+        info = self.tickers.get(ticker)
+        if info is None:
+            info = self.tickers[ticker] = TickerInfo(ticker)
+        return info
+
+    def snap(self, ticker, price, side):
+        """price on the tick grid: bids round down, asks round up."""
+        info = self.info(ticker)
+        steps = price * info.steps_per_unit
+        if side == BUY:
+            steps = math.floor(steps + _EPSILON)
+        else:
+            steps = math.ceil(steps - _EPSILON)
+        return round(steps / info.steps_per_unit, info.decimals)
+
+    def split(self, ticker, quantity):
+        """quantity as a list of order sizes no larger than the max trade size."""
+        largest = self.info(ticker).max_trade_size
+        if not largest or quantity <= largest:
+            return [quantity]
+        full, rest = divmod(quantity, largest)
+        return [largest] * full + ([rest] if rest else [])
+
+    def apply(self, params):
+        """params with the case's position limits in place of the hand-set ones."""
+        gross = self.gross_limit or params.max_gross_pos
+        net = self.net_limit or params.max_net_pos
+        return params.replace(
+            max_gross_pos=gross,
+            max_net_pos=net,
+            max_long_exposure=min(params.max_long_exposure, gross, net),
+            max_short_exposure=min(params.max_short_exposure, gross, net),
+            max_single_long=min(params.max_single_long, gross, net),
+            max_single_short=min(params.max_single_short, gross, net),
+        )
+
+    def __repr__(self):
+        return 'StaticData(gross {} net {}, {})'.format(
+            self.gross_limit, self.net_limit, ', '.join(map(repr, self.tickers.values())))
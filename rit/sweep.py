@@ -0,0 +1,383 @@
+# vectorised parameter sweep of the ALGO2 quoting and sizing model
+#
+#   python -m rit.sweep session.rec --grid base_edge=0.005:0.03:6 \
+#       --grid skew_k=0,0.00001,0.00002 --grid requote_tol=0.005,0.01,0.02
+#
+# quote_kernel() is rit.quoting.compute_quote written over NumPy arrays: one
+# call evaluates a whole grid of parameter sets against one book state,
+# with the rit.estimator estimate (fair value, vol_edge_k, volatility-scaled
+# skew) the engine would quote from, worked out once per book state.
+# simulate() steps every parameter set through a sequence of book states at
+# once, with rit.replay's trade-through fill model and the engine's order
+# handling (rit.reconcile keep/top-up/replace, TTL expiry) on one aggregate
+# level per side, and sweep() fans chunks of a grid out over a process pool.
+# Book states come from a recording (states_from_records) or from a simple
+# random-walk simulator (simulate_states). Single-ticker only: the sweep
+# tunes the quote model, not ticker selection.
+import argparse
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from rit.estimator import Estimator
+from rit.quoting import QuoteParams
+from rit.reconcile import GRID_EPS
+from rit.snapshot import top_of_book
+
+PARAM_NAMES = tuple(QuoteParams.DEFAULTS)
+# fewest parameter sets per chunk: below this, shipping the book states to
+# a worker costs more than evaluating the chunk
+MIN_CHUNK = 16
+METRICS = ('pnl', 'fills', 'bought', 'sold', 'end_position', 'max_abs_position', 'messages')
+
+
+class BookStates(object):
+    """Top-of-book sequence for one ticker; missing sides are NaN."""
+
+    __slots__ = ('ticks', 'bid', 'ask', 'bid_size', 'ask_size')
+
+    def __init__(self, ticks, bid, ask, bid_size, ask_size):
+        self.ticks = np.asarray(ticks, dtype=np.int64)
+        self.bid = np.asarray(bid, dtype=np.float64)
+        self.ask = np.asarray(ask, dtype=np.float64)
+        self.bid_size = np.asarray(bid_size, dtype=np.float64)
+        self.ask_size = np.asarray(ask_size, dtype=np.float64)
+
+    def __len__(self):
+        return len(self.ticks)
+
+
+def states_from_records(records, ticker=None):
+    """Build BookStates from rit.recorder records (first recorded ticker by default)."""
+    ticks, bids, asks, bid_sizes, ask_sizes = [], [], [], [], []
+    for record in records:
+        books = record.get('books') or {}
+        if ticker is None and books:
+            ticker = sorted(books)[0]
+        if ticker not in books:
+            continue
+        best_bid, best_ask, bid_size, ask_size = top_of_book(books[ticker])
+        ticks.append(record['tick'])
+        bids.append(np.nan if best_bid is None else best_bid)
+        asks.append(np.nan if best_ask is None else best_ask)
+        bid_sizes.append(bid_size)
+        ask_sizes.append(ask_size)
+    return BookStates(ticks, bids, asks, bid_sizes, ask_sizes)
+
+
+def simulate_states(ticks=300, polls_per_tick=4, start=10.0, volatility=0.06,
+                    half_spread=0.03, depth=(500, 3000), seed=None):
+    """Random-walk book states, polls_per_tick observations per case tick."""
+    rng = np.random.default_rng(seed)
+    n = ticks * polls_per_tick
+    mid = start + np.cumsum(rng.normal(0.0, volatility / np.sqrt(polls_per_tick), n))
+    spread = half_spread + np.abs(rng.normal(0.0, half_spread / 3.0, n))
+    bid = np.round(mid - spread, 2)
+    ask = np.round(mid + spread, 2)
+    sizes = rng.integers(depth[0], depth[1], size=(2, n))
+    tick_index = 1 + np.arange(n) // polls_per_tick
+    return BookStates(tick_index, bid, ask, sizes[0], sizes[1])
+
+
+def estimates(states):
+    """rit.estimator's (fair, vol, vol_ratio) at every book state; NaN until ready.
+
+    The estimate depends only on the books, so it is worked out once and
+    shared by every parameter set.
+    """
+    n = len(states)
+    fair = np.full(n, np.nan)
+    vol = np.full(n, np.nan)
+    ratio = np.full(n, np.nan)
+    estimator = Estimator(('X',))
+    for i in range(n):
+        best_bid = states.bid[i]
+        best_ask = states.ask[i]
+        if not (np.isfinite(best_bid) and np.isfinite(best_ask)):
+            continue
+        estimator.update(int(states.ticks[i]), {'X': (float(best_bid), float(best_ask),
+                                                     float(states.bid_size[i]),
+                                                     float(states.ask_size[i]))})
+        estimate = estimator.get('X')
+        if estimate is not None:
+            fair[i] = estimate.fair
+            vol[i] = estimate.vol
+            ratio[i] = estimate.vol_ratio
+    return fair, vol, ratio
+
+
+def param_arrays(param_sets):
+    """Turn a list of QuoteParams (or dicts of overrides) into name -> array."""
+    rows = [p.as_dict() if isinstance(p, QuoteParams) else QuoteParams(**p).as_dict()
+            for p in param_sets]
+    return {name: np.array([row[name] for row in rows], dtype=np.float64) for name in PARAM_NAMES}
+
+
+def quote_kernel(p, best_bid, best_ask, bid_size, ask_size, pos, estimate=None):
+    """compute_quote for many parameter sets at once.
+
+    p maps parameter name -> array of shape (k,); the book values are scalars
+    and pos has shape (k,). estimate is (fair, vol, vol_ratio) from
+    estimates(), ignored while fair is NaN. Returns (ok, quote_bid,
+    quote_ask, buy_qty, sell_qty, allow_buy, allow_sell) arrays; ok is False
+    where compute_quote would have returned None.
+    """
+    spread = best_ask - best_bid
+    mid = 0.5 * (best_bid + best_ask)
+    if estimate is not None and np.isnan(estimate[0]):
+        estimate = None
+    if estimate is not None:
+        mid = min(best_ask, max(best_bid, estimate[0]))
+    ok = np.isfinite(spread) & (spread > 0) & (spread >= p['min_market_spread'])
+    gross = np.abs(pos)
+    net = pos
+
+    allow_buy = ((pos < p['max_long_exposure']) & (pos < p['max_single_long'])
+                 & (gross < p['max_gross_pos']) & (net < p['max_net_pos']))
+    allow_sell = ((pos > -p['max_short_exposure']) & (pos > -p['max_single_short'])
+                  & (gross < p['max_gross_pos']) & (net > -p['max_net_pos']))
+
+    edge = np.maximum(p['base_edge'], 0.25 * spread)
+    skew = p['skew_k'] * pos
+    if estimate is not None:
+        edge = np.maximum(edge, p['vol_edge_k'] * estimate[1])
+        skew = skew * estimate[2]
+    quote_bid = np.minimum(mid - edge - skew + p['buy_premium'], best_ask - p['price_cushion'])
+    quote_ask = np.maximum(mid + edge - skew - p['sell_discount'], best_bid + p['price_cushion'])
+    ok &= quote_bid < quote_ask
+
+    # compute_trade_volumes
+    max_long = p['max_long_exposure']
+    max_short = p['max_short_exposure']
+    with np.errstate(divide='ignore', invalid='ignore'):
+        edge_ratio = np.clip(edge / spread, 0.0, 1.0)
+        liq_target = p['liquidity_target']
+        liq_ratio = np.where(liq_target > 0,
+                             np.clip(min(bid_size, ask_size) / liq_target, 0.0, p['liquidity_cap']),
+                             1.0)
+        long_scale = np.where(max_long > 0,
+                              np.minimum(1.0, np.maximum(0.0, max_long - pos) / max_long), 0.0)
+        short_scale = np.where(max_short > 0,
+                               np.minimum(1.0, np.maximum(0.0, max_short + pos) / max_short), 0.0)
+        tilt_long = np.where((pos > 0) & (max_long > 0), np.minimum(1.0, pos / max_long), 0.0)
+        tilt_short = np.where((pos < 0) & (max_short > 0), np.minimum(1.0, -pos / max_short), 0.0)
+    floor = p['size_floor']
+    base = p['base_volume'] * (floor + (1.0 - floor) * edge_ratio) * (floor + (1.0 - floor) * liq_ratio)
+    buy_base = base * (0.5 + 0.5 * long_scale)
+    sell_base = base * (0.5 + 0.5 * short_scale)
+    buy_base = buy_base * np.where(pos > 0, np.maximum(0.2, 1.0 - tilt_long), 1.0) * (1.0 + 0.3 * tilt_short)
+    sell_base = sell_base * (1.0 + 0.3 * tilt_long) * np.where(pos < 0, np.maximum(0.2, 1.0 - tilt_short), 1.0)
+    buy_qty = np.maximum(p['min_trade_volume'], np.minimum(p['max_trade_volume'], np.trunc(buy_base)))
+    sell_qty = np.maximum(p['min_trade_volume'], np.minimum(p['max_trade_volume'], np.trunc(sell_base)))
+
+    allow_buy &= ~(((gross + buy_qty) > p['max_gross_pos']) | ((net + buy_qty) > p['max_net_pos']))
+    allow_sell &= ~(((gross + sell_qty) > p['max_gross_pos']) | ((net - sell_qty) < -p['max_net_pos']))
+    return ok, quote_bid, quote_ask, buy_qty, sell_qty, allow_buy, allow_sell
+
+
+def simulate(states, p, rebate=0.0, size_tol=0.2):
+    """Run every parameter set in p over the book states; returns metric arrays.
+
+    Our orders on a side are one level (price, quantity, tick of the oldest)
+    reconciled the way rit.reconcile does it: kept while within requote_tol
+    and no more than size_tol over the target, topped up when short by more
+    than size_tol, otherwise cancelled and replaced.
+    """
+    k = len(p['base_edge'])
+    pos = np.zeros(k)
+    cash = np.zeros(k)
+    fills = np.zeros(k)
+    bought = np.zeros(k)
+    sold = np.zeros(k)
+    max_abs = np.zeros(k)
+    messages = np.zeros(k)
+    has_bid = np.zeros(k, dtype=bool)
+    has_ask = np.zeros(k, dtype=bool)
+    bid_px = np.zeros(k)
+    ask_px = np.zeros(k)
+    bid_qty = np.zeros(k)
+    ask_qty = np.zeros(k)
+    bid_tick = np.zeros(k)
+    ask_tick = np.zeros(k)
+    ttl = p['order_ttl_ticks']
+    tol = p['requote_tol'] - GRID_EPS
+    mark = np.nan
+    fair, vol, ratio = estimates(states)
+
+    for i in range(len(states)):
+        tick = states.ticks[i]
+        best_bid = states.bid[i]
+        best_ask = states.ask[i]
+
+        # fills: the market traded through our resting quotes
+        hit = has_bid & (best_ask <= bid_px)
+        if hit.any():
+            pos += np.where(hit, bid_qty, 0.0)
+            cash -= np.where(hit, bid_qty * bid_px - rebate * bid_qty, 0.0)
+            fills += hit
+            bought += np.where(hit, bid_qty, 0.0)
+            has_bid &= ~hit
+        hit = has_ask & (best_bid >= ask_px)
+        if hit.any():
+            pos -= np.where(hit, ask_qty, 0.0)
+            cash += np.where(hit, ask_qty * ask_px + rebate * ask_qty, 0.0)
+            fills += hit
+            sold += np.where(hit, ask_qty, 0.0)
+            has_ask &= ~hit
+        np.maximum(max_abs, np.abs(pos), out=max_abs)
+        if np.isfinite(best_bid) and np.isfinite(best_ask):
+            mark = 0.5 * (best_bid + best_ask)
+
+        # TTL expiry, whether or not the book can be quoted
+        expired = has_bid & ((tick - bid_tick) >= ttl)
+        messages += expired
+        has_bid &= ~expired
+        expired = has_ask & ((tick - ask_tick) >= ttl)
+        messages += expired
+        has_ask &= ~expired
+
+        ok, quote_bid, quote_ask, buy_qty, sell_qty, allow_buy, allow_sell = quote_kernel(
+            p, best_bid, best_ask, states.bid_size[i], states.ask_size[i], pos,
+            (fair[i], vol[i], ratio[i]))
+        if not ok.any():
+            continue
+
+        # BUY side: pull it, keep it (topped up when short) or replace it
+        off = ok & ~allow_buy & has_bid
+        messages += off
+        has_bid &= ~off
+        keep = (ok & allow_buy & has_bid & (np.abs(bid_px - quote_bid) < tol)
+                & (bid_qty <= buy_qty * (1.0 + size_tol)))
+        top_up = keep & (bid_qty < buy_qty * (1.0 - size_tol))
+        messages += top_up
+        bid_qty = np.where(top_up, buy_qty, bid_qty)
+        need = ok & allow_buy & ~keep
+        messages += need & has_bid
+        messages += need
+        bid_px = np.where(need, quote_bid, bid_px)
+        bid_qty = np.where(need, buy_qty, bid_qty)
+        bid_tick = np.where(need, tick, bid_tick)
+        has_bid |= need
+
+        # SELL side
+        off = ok & ~allow_sell & has_ask
+        messages += off
+        has_ask &= ~off
+        keep = (ok & allow_sell & has_ask & (np.abs(ask_px - quote_ask) < tol)
+                & (ask_qty <= sell_qty * (1.0 + size_tol)))
+        top_up = keep & (ask_qty < sell_qty * (1.0 - size_tol))
+        messages += top_up
+        ask_qty = np.where(top_up, sell_qty, ask_qty)
+        need = ok & allow_sell & ~keep
+        messages += need & has_ask
+        messages += need
+        ask_px = np.where(need, quote_ask, ask_px)
+        ask_qty = np.where(need, sell_qty, ask_qty)
+        ask_tick = np.where(need, tick, ask_tick)
+        has_ask |= need
+
+    pnl = cash + pos * (0.0 if np.isnan(mark) else mark)
+    return {'pnl': pnl, 'fills': fills, 'bought': bought, 'sold': sold,
+            'end_position': pos, 'max_abs_position': max_abs, 'messages': messages}
+
+
+def _run_chunk(args):
+    states, chunk, rebate, size_tol = args
+    return simulate(states, chunk, rebate, size_tol)
+
+
+class SweepResult(object):
+    """Parameter grid plus per-set metrics, aligned by row."""
+
+    def __init__(self, params, metrics):
+        self.params = params    # name -> array
+        self.metrics = metrics  # metric -> array
+
+    def __len__(self):
+        return len(self.metrics['pnl'])
+
+    def best(self, n=10, key='pnl'):
+        order = np.argsort(-self.metrics[key])[:n]
+        return [(self.row(i), {m: float(v[i]) for m, v in self.metrics.items()}) for i in order]
+
+    def row(self, i):
+        return {name: float(values[i]) for name, values in self.params.items()}
+
+
+def grid(**axes):
+    """Cartesian product of QuoteParams overrides, e.g. grid(base_edge=[...], skew_k=[...])."""
+    names = list(axes)
+    return [dict(zip(names, values)) for values in itertools.product(*(axes[n] for n in names))]
+
+
+def sweep(states, param_sets, processes=None, chunk_size=None, rebate=0.0, size_tol=0.2):
+    """Evaluate param_sets over states, chunked over a process pool.
+
+    processes=1 runs in-process (handy for profiling and small grids).
+    chunk_size defaults to an even share of the grid per process, at least
+    MIN_CHUNK parameter sets, so a small grid still spreads over the pool.
+    """
+    p = param_arrays(param_sets)
+    k = len(param_sets)
+    workers = 1 if processes == 1 else (processes or os.cpu_count() or 1)
+    if chunk_size is None:
+        chunk_size = max(MIN_CHUNK, -(-k // workers))
+    chunks = [{name: values[i:i + chunk_size] for name, values in p.items()}
+              for i in range(0, k, chunk_size)]
+    if workers == 1 or len(chunks) == 1:
+        results = [simulate(states, chunk, rebate, size_tol) for chunk in chunks]
+    else:
+        with ProcessPoolExecutor(max_workers=min(len(chunks), workers)) as pool:
+            results = list(pool.map(_run_chunk, [(states, c, rebate, size_tol) for c in chunks]))
+    metrics = {m: np.concatenate([r[m] for r in results]) for m in METRICS}
+    return SweepResult(p, metrics)
+
+
+def parse_axis(text):
+    """'name=a,b,c' or 'name=start:stop:count' -> (name, values)."""
+    name, _, spec = text.partition('=')
+    if name not in QuoteParams.DEFAULTS:
+        raise SystemExit('Unknown parameter {!r}; known: {}'.format(
+            name, ', '.join(sorted(QuoteParams.DEFAULTS))))
+    if ':' in spec:
+        start, stop, count = spec.split(':')
+        values = list(np.linspace(float(start), float(stop), int(count)))
+    else:
+        values = [float(v) for v in spec.split(',') if v]
+    return name, values
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Sweep QuoteParams over recorded or simulated books.')
+    parser.add_argument('recording', nargs='?', help='rit.recorder file (simulated books if omitted)')
+    parser.add_argument('--ticker', default=None)
+    parser.add_argument('--grid', action='append', metavar='NAME=SPEC', required=True,
+                        help='NAME=a,b,c or NAME=start:stop:count (repeatable)')
+    parser.add_argument('--processes', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=1, help='seed for simulated books')
+    parser.add_argument('--rebate', type=float, default=0.0)
+    parser.add_argument('--size-tol', type=float, default=0.2,
+                        help='resting size may be off the target by this fraction (QUOTE_SIZE_TOL)')
+    parser.add_argument('--top', type=int, default=10)
+    args = parser.parse_args(argv)
+
+    if args.recording:
+        from rit.replay import load
+        states = states_from_records(load(args.recording), args.ticker)
+    else:
+        states = simulate_states(seed=args.seed)
+    axes = dict(parse_axis(a) for a in args.grid)
+    param_sets = grid(**axes)
+    print('{} parameter sets x {} book states'.format(len(param_sets), len(states)))
+    result = sweep(states, param_sets, processes=args.processes, rebate=args.rebate,
+                   size_tol=args.size_tol)
+    for row, metrics in result.best(args.top):
+        shown = ' '.join('{}={:g}'.format(n, row[n]) for n in axes)
+        print('{:<50} pnl {pnl:10.2f} fills {fills:5.0f} end pos {end_position:7.0f} '
+              'max |pos| {max_abs_position:6.0f} msgs {messages:5.0f}'.format(shown, **metrics))
+
+
+if __name__ == '__main__':
+    main()
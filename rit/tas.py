@@ -0,0 +1,185 @@
+# fill detection from the time-and-sales tape instead of order polling
+#
+# We used to learn about a fill only when an order dropped out of
+# GET /v1/orders?status=OPEN, with its fill price and size lost. FillFeed
+# reads GET /v1/securities/tas with an `after` cursor each loop, so only
+# prints newer than the last one seen come back (usually none or a few).
+# Prints carry no trader ids. A print at or through the price of one of our
+# live orders means we may have traded, and only then are the open and
+# transacted order views read. Diffing quantity_filled and vwap per order
+# against what was already booked gives each fill's size and price.
+# Fills go to the position cache, the order tracker and any subscribers
+# (say a P&L ledger) inside the same SnapshotFetcher.fetch() that saw the
+# print, so the engine reacts within the tick.
+#
+# The orders endpoint has no cursor, so seen transacted orders are skipped
+# client side. The transacted view is only read when a print points at us.
+# An order we cancel after a partial fill ends up in neither the open nor the
+# transacted view, so cancelled() keeps such orders as suspects, and the
+# cancelled view is read once with the next order read.
+from rit.api import API_URL, check_auth
+from rit.records import decode_tas, parse
+
+BUY = 'BUY'
+SELL = 'SELL'
+
+
+class Fill(object):
+    """One fill of one of our orders."""
+
+    __slots__ = ('order_id', 'ticker', 'side', 'quantity', 'price', 'tick', 'order_quantity')
+
+    def __init__(self, order_id, ticker, side, quantity, price, tick, order_quantity):
+        self.order_id = order_id
+        self.ticker = ticker
+        self.side = side
+        self.quantity = quantity
+        self.price = price
+        self.tick = tick
+        self.order_quantity = order_quantity
+
+    @property
+    def signed(self):
+        return self.quantity if self.side == BUY else -self.quantity
+
+    def __repr__(self):
+        return 'Fill(#{} {} {} {} @ {}, tick={})'.format(
+            self.order_id, self.side, self.quantity, self.ticker, self.price, self.tick)
+
+
+def read_tas(session, ticker, after=None, limit=None):
+    params = {'ticker': ticker}
+    if after:
+        params['after'] = after
+    if limit:
+        params['limit'] = limit
+    resp = check_auth(session.get(API_URL + '/securities/tas', params=params))
+    return decode_tas(ticker, parse(resp))
+
+
+class TapeReader(object):
+    """Per-ticker cursor over /v1/securities/tas."""
+
+    def __init__(self, tickers, limit=200):
+        self.last_id = {t: None for t in tickers}
+        self.limit = limit
+        self.prints = 0
+
+    def poll(self, session, ticker):
+        """Prints newer than the last call, oldest first.
+
+        The first call only positions the cursor (one print is asked for)
+        and returns nothing, so history from before we started is skipped.
+        """
+        last = self.last_id.get(ticker)
+        if last is None:
+            prints = read_tas(session, ticker, limit=1)
+            self.last_id[ticker] = prints[-1].print_id if prints else 0
+            return []
+        prints = read_tas(session, ticker, after=last, limit=self.limit)
+        prints = [p for p in prints if p.print_id > last]
+        if prints:
+            self.last_id[ticker] = prints[-1].print_id
+            self.prints += len(prints)
+        return prints
+
+
+class FillFeed(object):
+    """Turns tape prints and order views into our Fills, for these tickers only."""
+
+    def __init__(self, tickers, limit=200):
+        self.tickers = frozenset(tickers)
+        self.tape = TapeReader(tickers, limit)
+        self.booked = {}  # order_id -> (quantity_filled, filled notional) already reported
+        self.unsettled = {}  # order_id -> TrackedOrder cancelled since the last order read
+        self.primed = False
+        self.subscribers = []
+        self.fills = 0
+        self.order_reads = 0
+
+    def subscribe(self, callback):
+        """callback(fill) is called for every fill, in the order they are found."""
+        self.subscribers.append(callback)
+
+    def poll(self, session, ticker):
+        return self.tape.poll(session, ticker)
+
+    def reset(self):
+        """Forget the tape cursors and booked orders, as when a new heat restarts the case."""
+        self.tape = TapeReader(self.tickers, self.tape.limit)
+        self.booked.clear()
+        self.unsettled.clear()
+        self.primed = False
+
+    def cancelled(self, orders):
+        """Orders we just cancelled (TrackedOrders): they may have filled first."""
+        for o in orders:
+            if o is not None:
+                self.unsettled[o.order_id] = o
+
+    def statuses(self):
+        """Order views to read besides the open one to find every fill."""
+        # priming takes in the cancelled view too, or an order cancelled
+        # after a partial fill before we started would be booked when it is
+        # next read
+        if self.unsettled or not self.primed:
+            return ('TRANSACTED', 'CANCELLED')
+        return ('TRANSACTED',)
+
+    def suspects_fill(self, prints, tracker):
+        """Did any print trade at or through one of our live or just-cancelled orders?"""
+        unsettled = self.unsettled.values()
+        for ticker, new in prints.items():
+            if not new:
+                continue
+            low = min(p.price for p in new)
+            high = max(p.price for p in new)
+            for orders in (tracker.open_orders(ticker), unsettled):
+                for o in orders:
+                    if o.ticker != ticker:
+                        continue
+                    if o.side == BUY and low <= o.price:
+                        return True
+                    if o.side == SELL and high >= o.price:
+                        return True
+        return False
+
+    def prime(self, orders):
+        """Take the fills already on these orders as booked, without reporting them."""
+        for o in orders:
+            if o.ticker in self.tickers:
+                self.booked[o.order_id] = (o.quantity_filled, _notional(o))
+        self.unsettled.clear()
+        self.primed = True
+
+    def fills_from(self, orders, tick):
+        """Fills on these orders (every view in statuses() plus the open one) since the last call."""
+        self.order_reads += 1
+        booked = self.booked
+        fills = []
+        tickers = self.tickers
+        for o in orders:
+            if o.ticker not in tickers:
+                continue  # another worker's order
+            filled = o.quantity_filled
+            prev_filled, prev_notional = booked.get(o.order_id, (0, 0.0))
+            if filled <= prev_filled:
+                continue
+            notional = _notional(o)
+            quantity = filled - prev_filled
+            price = (notional - prev_notional) / quantity if notional else o.price
+            booked[o.order_id] = (filled, notional)
+            fills.append(Fill(o.order_id, o.ticker, o.action, quantity, price, tick, o.quantity))
+        self.unsettled.clear()
+        self.fills += len(fills)
+        for fill in fills:
+            for callback in self.subscribers:
+                callback(fill)
+        return fills
+
+
+def _notional(order):
+    if not order.quantity_filled:
+        return 0.0
+    price = order.vwap if order.vwap is not None else order.price
+    return price * order.quantity_filled
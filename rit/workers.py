@@ -0,0 +1,247 @@
+# one quoting process per ticker (or group of tickers) under a supervisor
+#
+# With many tickers a single process spends its time in the GIL: parsing
+# books, deciding quotes and building requests for every ticker in turn.
+# Supervisor starts one worker process per group, each running the usual
+# quoting loop on its own tickers, and restarts a worker that crashes.
+#
+# The portfolio limits (MAX_GROSS_POS/MAX_NET_POS) still span every ticker.
+# Each worker publishes its positions and working order quantities into a
+# RiskTable, a fixed-layout block of shared memory with one slot per ticker,
+# and SharedRiskAggregator reads the other slots straight from memory when it
+# checks a quote, so no IPC round trip sits on the quoting path.
+#
+# Slot layout (little-endian, 56 bytes):
+#   seq      Q   even when the slot is stable, odd while its owner writes
+#   ticker   16s ticker name, NUL-padded
+#   position q
+#   buy      q   working buy quantity
+#   sell     q   working sell quantity
+#   updated  d   time.time() of the last publish
+# Every slot has a single writer; readers retry while seq is odd or changes
+# under them (a seqlock), so a row is never read half-written.
+import signal
+import struct
+import time
+from multiprocessing import get_context
+from multiprocessing import shared_memory
+
+from rit.engine import RiskAggregator
+
+_SEQ = struct.Struct('<Q')
+_ROW = struct.Struct('<16sqqqd')
+SLOT_SIZE = _SEQ.size + _ROW.size
+_READ_RETRIES = 1000
+
+
+class RiskTable(object):
+    """Per-ticker position and working quantities in shared memory.
+
+    Every process must open the table with the same ticker list, which fixes
+    the slot order. The creator owns the block and unlink()s it at the end.
+    """
+
+    def __init__(self, tickers, shm, owner):
+        self.tickers = list(tickers)
+        self.slots = {t: i * SLOT_SIZE for i, t in enumerate(self.tickers)}
+        self.shm = shm
+        self.buf = shm.buf
+        self.owner = owner
+        self.seqs = {}  # slot offset -> our last written seq, for slots we write
+
+    @classmethod
+    def create(cls, tickers):
+        tickers = list(tickers)
+        shm = shared_memory.SharedMemory(create=True, size=max(1, len(tickers)) * SLOT_SIZE)
+        table = cls(tickers, shm, owner=True)
+        for ticker in tickers:
+            table.publish(ticker, 0, 0, 0)
+        return table
+
+    @classmethod
+    def attach(cls, name, tickers):
+        # Workers share the supervisor's resource tracker, so attaching here
+        # does not hand the block's lifetime to the worker (3.13+ skips
+        # the tracker altogether).
+        try:
+            shm = shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:
+            shm = shared_memory.SharedMemory(name=name)
+        return cls(tickers, shm, owner=False)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def publish(self, ticker, position, buy, sell):
+        offset = self.slots[ticker]
+        seq = self.seqs.get(offset)
+        if seq is None:
+            (seq,) = _SEQ.unpack_from(self.buf, offset)
+            seq += seq & 1
+        _SEQ.pack_into(self.buf, offset, seq + 1)
+        _ROW.pack_into(self.buf, offset + _SEQ.size, ticker.encode('ascii')[:16],
+                       int(position), int(buy), int(sell), time.time())
+        _SEQ.pack_into(self.buf, offset, seq + 2)
+        self.seqs[offset] = seq + 2
+
+    def read(self, ticker):
+        """(position, buy, sell, updated) for one ticker."""
+        offset = self.slots[ticker]
+        buf = self.buf
+        for _ in range(_READ_RETRIES):
+            (before,) = _SEQ.unpack_from(buf, offset)
+            if before & 1:
+                continue
+            row = _ROW.unpack_from(buf, offset + _SEQ.size)
+            (after,) = _SEQ.unpack_from(buf, offset)
+            if after == before:
+                return row[1:]
+        # the owner died mid-write: take the row as it is; the restarted
+        # worker rewrites it on its first pass
+        return _ROW.unpack_from(buf, offset + _SEQ.size)[1:]
+
+    def rows(self, exclude=()):
+        return {t: self.read(t) for t in self.tickers if t not in exclude}
+
+    def close(self):
+        self.buf = None
+        self.shm.close()
+
+    def unlink(self):
+        if self.owner:
+            self.shm.unlink()
+
+
+class SharedRiskAggregator(RiskAggregator):
+    """RiskAggregator for one worker that also sees the other workers' tickers.
+
+    Filled positions of our own tickers come from the worker's PositionCache,
+    everything else from the RiskTable. Our own slots are republished at the
+    start of each pass and whenever a ticker's quotes are decided.
+    """
+
+    def __init__(self, table, tickers, positions, max_gross_pos, max_net_pos):
+        RiskAggregator.__init__(self, positions, max_gross_pos, max_net_pos)
+        self.table = table
+        self.own = list(tickers)
+        self.other_gross = 0
+        self.other_net = 0
+
+    def begin(self, orders_by_ticker):
+        RiskAggregator.begin(self, orders_by_ticker)
+        positions = self.positions
+        for ticker in self.own:
+            buy, sell = self.pending.get(ticker, (0, 0))
+            self.table.publish(ticker, positions.position(ticker), buy, sell)
+        other_gross = other_net = 0
+        for ticker, (position, buy, sell, _) in self.table.rows(exclude=self.own).items():
+            other_gross += abs(position)
+            other_net += position
+            # another worker's orders count like pending orders on our other tickers
+            RiskAggregator.commit(self, ticker, buy, sell)
+        self.other_gross = other_gross
+        self.other_net = other_net
+
+    def exposure(self):
+        positions = self.positions
+        own = [positions.position(t) for t in self.own]
+        return (sum(abs(p) for p in own) + self.other_gross,
+                sum(own) + self.other_net)
+
+    def commit(self, ticker, buy, sell):
+        RiskAggregator.commit(self, ticker, buy, sell)
+        self.table.publish(ticker, self.positions.position(ticker), buy, sell)
+
+
+def _run_worker(target, tickers, stop_event, args):
+    # Ctrl+C reaches the whole process group; only the supervisor acts on it
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    target(tickers, stop_event, *args)
+
+
+class Supervisor(object):
+    """Start a worker per ticker group, restart crashed ones, stop them all on request.
+
+    target(tickers, stop_event, *args) is the worker body; it should return
+    once stop_event is set. A worker that exits with code 0 is finished (the
+    case ended); any other exit is a crash and the worker is restarted, up to
+    max_restarts times per group. request_stop() only sets a flag, so it is
+    safe to call from a signal handler.
+    """
+
+    def __init__(self, target, groups, args=(), max_restarts=5, restart_delay=1.0,
+                 join_timeout=5.0, context=None):
+        self.target = target
+        self.groups = [list(g) for g in groups]
+        self.args = tuple(args)
+        self.max_restarts = max_restarts
+        self.restart_delay = restart_delay
+        self.join_timeout = join_timeout
+        self.context = context if context is not None else get_context()
+        self.stop_event = self.context.Event()
+        self.stopping = False
+        self.workers = {}   # group index -> Process
+        self.restarts = {}  # group index -> count
+        self.crashed_at = {}
+
+    def _spawn(self, index):
+        group = self.groups[index]
+        process = self.context.Process(
+            target=_run_worker, args=(self.target, group, self.stop_event, self.args),
+            name='quoter-' + '-'.join(group))
+        process.start()
+        self.workers[index] = process
+        return process
+
+    def start(self):
+        for index in range(len(self.groups)):
+            self._spawn(index)
+
+    def request_stop(self):
+        self.stopping = True
+
+    def run(self, poll_interval=0.5):
+        """Supervise until every worker has finished or a stop is requested."""
+        if not self.workers:
+            self.start()
+        try:
+            while self.workers and not self.stopping:
+                time.sleep(poll_interval)
+                self._check()
+        finally:
+            self.stop()
+
+    def _check(self):
+        now = time.monotonic()
+        for index, process in list(self.workers.items()):
+            if process.is_alive():
+                continue
+            if process.exitcode == 0:
+                del self.workers[index]
+                continue
+            crashed = self.crashed_at.setdefault(index, now)
+            if now - crashed < self.restart_delay:
+                continue
+            del self.crashed_at[index]
+            count = self.restarts.get(index, 0)
+            if count >= self.max_restarts:
+                print('Worker {} exited with {} too often; not restarting'.format(
+                    process.name, process.exitcode))
+                del self.workers[index]
+                continue
+            self.restarts[index] = count + 1
+            print('Worker {} exited with {}; restarting ({}/{})'.format(
+                process.name, process.exitcode, count + 1, self.max_restarts))
+            self._spawn(index)
+
+    def stop(self):
+        self.stop_event.set()
+        deadline = time.monotonic() + self.join_timeout
+        for process in self.workers.values():
+            process.join(max(0.0, deadline - time.monotonic()))
+        for process in self.workers.values():
+            if process.is_alive():
+                process.terminate()
+                process.join()
+        self.workers = {}